@@ -0,0 +1,105 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+def servo_duty(angle):
+    return 2 + (angle / 18)
+
+
+def servo_move_steps(servo, angle, settle=1.0):
+    """Steps that drive the servo to angle, then drop the pulse once it got there"""
+    return [
+        (0, lambda: servo.ChangeDutyCycle(servo_duty(angle))),
+        (settle, lambda: servo.ChangeDutyCycle(0)),
+    ]
+
+
+def led_pulse_steps(gpio, pin, duration):
+    """Steps that hold an LED on for duration seconds"""
+    return [
+        (0, lambda: gpio.output(pin, gpio.HIGH)),
+        (duration, lambda: gpio.output(pin, gpio.LOW)),
+    ]
+
+
+def led_blink_steps(gpio, pin, count, interval=0.5):
+    """Steps that blink an LED count times"""
+    steps = []
+    for i in range(int(count)):
+        steps.append((0 if i == 0 else interval, lambda: gpio.output(pin, gpio.HIGH)))
+        steps.append((interval, lambda: gpio.output(pin, gpio.LOW)))
+    return steps
+
+
+class ActuatorScheduler:
+    """Runs timed servo/LED command sequences on one timing thread so callers never sleep"""
+
+    def __init__(self, name='actuators'):
+        self.name = name
+        self.steps_run = 0
+        self.errors = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the timing thread; steps that haven't run yet are discarded"""
+        with self._cond:
+            self._running = False
+            self._queue = []
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+
+    def call_later(self, delay, action):
+        self.run_sequence([(delay, action)])
+
+    def run_sequence(self, steps, on_done=None):
+        """Schedule (delay, action) steps, each delay counted from the previous step.
+        on_done runs after the last step. Returns immediately."""
+        due = time.monotonic()
+        with self._cond:
+            for delay, action in steps:
+                due += delay
+                heapq.heappush(self._queue, (due, next(self._seq), action))
+            if on_done is not None:
+                heapq.heappush(self._queue, (due, next(self._seq), on_done))
+            self._cond.notify_all()
+        return due
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    now = time.monotonic()
+                    if self._queue and self._queue[0][0] <= now:
+                        break
+                    self._cond.wait(self._queue[0][0] - now if self._queue else None)
+                if not self._running:
+                    return
+                _, _, action = heapq.heappop(self._queue)
+
+            # A failing step must not stop later ones (e.g. closing the gate)
+            try:
+                action()
+                self.steps_run += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"[ACTUATOR] Step failed in {self.name}: {e}")
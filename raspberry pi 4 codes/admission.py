@@ -0,0 +1,115 @@
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AdmissionQueue:
+    """Validates scans in the background while the gate is cycling and admits
+    validated vehicles back-to-back as soon as the gate is free"""
+
+    def __init__(self, validate, admit, recheck, on_admitted=None, on_rejected=None,
+                 depth=3, workers=2, name='admission'):
+        self.validate = validate          # scan -> record, falsy when invalid (slow, runs in a worker)
+        self.admit = admit                # (scan, record) -> False if the gate is busy (must be fast)
+        self.recheck = recheck            # (scan, record) -> still valid at admission time (must be fast)
+        self.on_admitted = on_admitted    # (scan, record), runs in a worker after admission
+        self.on_rejected = on_rejected    # (scan, reason)
+        self.depth = depth                # scans validating or waiting for the gate
+        self.submitted = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.dropped_full = 0
+        self.duplicates = 0
+        self._validating = set()
+        self._ready = collections.deque()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+
+    def stop(self):
+        self._executor.shutdown(wait=False)
+
+    def submit(self, key, scan):
+        """Start validating scan in the background; False if it's a duplicate or the queue is full"""
+        with self._lock:
+            if key in self._validating or any(k == key for k, _, _ in self._ready):
+                self.duplicates += 1
+                return False
+            if len(self._validating) + len(self._ready) >= self.depth:
+                self.dropped_full += 1
+                return False
+            self._validating.add(key)
+            self.submitted += 1
+        self._executor.submit(self._validate, key, scan)
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._validating) + len(self._ready)
+
+    def gate_free(self):
+        """Call when a gate cycle ends so the next validated vehicle goes straight through"""
+        self.try_admit()
+
+    def try_admit(self):
+        expired = []
+        admitted = None
+        with self._lock:
+            while self._ready:
+                key, scan, record = self._ready[0]
+                if not self.recheck(scan, record):
+                    self._ready.popleft()
+                    self.expired += 1
+                    expired.append(scan)
+                    continue
+                if self.admit(scan, record):
+                    self._ready.popleft()
+                    self.admitted += 1
+                    admitted = (scan, record)
+                break
+
+        for scan in expired:
+            self._reject(scan, 'expired while waiting for the gate')
+        if admitted is not None and self.on_admitted is not None:
+            self._executor.submit(self._run_callback, self.on_admitted, *admitted)
+
+    def _validate(self, key, scan):
+        try:
+            record = self.validate(scan)
+        except Exception as e:
+            print(f"[ADMISSION] Validation error: {e}")
+            record = None
+
+        with self._lock:
+            self._validating.discard(key)
+            if record:
+                self._ready.append((key, scan, record))
+
+        if not record:
+            self.rejected += 1
+            self._reject(scan, 'validation failed')
+            return
+        self.try_admit()
+
+    def _reject(self, scan, reason):
+        if self.on_rejected is not None:
+            self._run_callback(self.on_rejected, scan, reason)
+
+    @staticmethod
+    def _run_callback(callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"[ADMISSION] Callback error: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'expired': self.expired,
+                'dropped_full': self.dropped_full,
+                'duplicates': self.duplicates,
+                'pending': len(self._validating) + len(self._ready),
+            }
@@ -0,0 +1,349 @@
+"""Scan-to-gate latency benchmark for the entry and exit controllers.
+
+Runs entryacces.py or exitpayment.py against the fakes in fakes.py (GPIO,
+Firebase with injected latency, in-process MQTT broker) and reports
+p50/p95/p99 latency from a QR payload reaching the controller to the servo
+open command, plus sustained scans per second.
+
+    python3 bench/bench_gates.py entry --scans 200 --latency 300 --jitter 100
+    python3 bench/bench_gates.py exit --scans 200 --latency 300
+    python3 bench/bench_gates.py exit --frames recording.mp4
+    python3 bench/bench_gates.py entry --set USE_QRCODE_MIRROR=False
+
+Entry latency starts when the MQTT message is handed to on_message; exit
+latency starts when handle_qr_data is called. With --frames, exit scans are
+decoded from a recorded video or image sequence (e.g. frames/%04d.png)
+through the normal capture/decode loop instead of being injected directly.
+"""
+import argparse
+import ast
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+from fakes import install_fakes, percentile, silence
+from actuators import servo_duty
+
+FAR_FUTURE = int((time.time() + 365 * 24 * 3600) * 1000)
+
+
+class LatencyRecorder:
+    """Pairs admitted scans with servo open commands, in order"""
+
+    def __init__(self, servo_pin, open_duty):
+        self.servo_pin = servo_pin
+        self.open_duty = open_duty
+        self.started = {}
+        self.latencies = []
+        self.opened_at = []
+        self.first_start = None
+        self._admitted = []
+        self._opens = []
+        self._lock = threading.Lock()
+
+    def scan_started(self, key, timestamp=None):
+        timestamp = timestamp if timestamp is not None else time.perf_counter()
+        with self._lock:
+            self.started.setdefault(key, timestamp)
+            if self.first_start is None:
+                self.first_start = timestamp
+
+    def admitted(self, key):
+        with self._lock:
+            self._admitted.append(key)
+            self._pair()
+
+    def on_duty(self, pin, duty, timestamp):
+        if pin != self.servo_pin or abs(duty - self.open_duty) > 1e-9:
+            return
+        with self._lock:
+            self._opens.append(timestamp)
+            self._pair()
+
+    def _pair(self):
+        while self._admitted and self._opens:
+            key = self._admitted.pop(0)
+            opened = self._opens.pop(0)
+            started = self.started.pop(key, None)
+            if started is not None:
+                self.latencies.append(opened - started)
+                self.opened_at.append(opened)
+
+    def summary(self):
+        with self._lock:
+            latencies = list(self.latencies)
+            span = (max(self.opened_at) - self.first_start) if self.opened_at else 0.0
+        return {
+            'admitted': len(latencies),
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'max_ms': max(latencies) * 1000 if latencies else 0.0,
+            'scans_per_second': len(latencies) / span if span > 0 else 0.0,
+        }
+
+
+def configure(controller, args, store_dir):
+    controller.GATE_HOLD_TIME = args.hold
+    controller.SERVO_SETTLE_TIME = args.settle
+    if hasattr(controller, 'LOCAL_STORE_PATH'):
+        controller.LOCAL_STORE_PATH = os.path.join(store_dir, f"{controller.__name__}.db")
+    for override in args.set:
+        name, _, value = override.partition('=')
+        if not hasattr(controller, name):
+            raise SystemExit(f"{controller.__name__} has no setting {name}")
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+        setattr(controller, name, value)
+
+
+def wrap_admit(controller, recorder):
+    original = controller.admit_vehicle
+
+    def admit_vehicle(scan, record):
+        if original(scan, record):
+            recorder.admitted(str(scan[1]))
+            return True
+        return False
+
+    controller.admit_vehicle = admit_vehicle
+
+
+class ReplayCapture:
+    """VideoCapture over a recording that, at the end, waits for queued passes to
+    clear the gate before reporting end-of-stream (which stops the scanner)"""
+
+    def __init__(self, capture, controller, grace):
+        self.capture = capture
+        self.controller = controller
+        self.grace = grace
+
+    def read(self):
+        if self.controller.startup is not None:
+            # Codes are ignored until the controller is ready; measure the warm
+            # (mirror) path, not the local store fallback
+            self.controller.startup.wait_warm(30.0)
+        ret, frame = self.capture.read()
+        if not ret:
+            while self.controller.admission and self.controller.admission.pending():
+                time.sleep(0.05)
+            time.sleep(self.grace)
+        return ret, frame
+
+    def __getattr__(self, name):
+        return getattr(self.capture, name)
+
+
+def wait_idle(controller, broker, timeout):
+    """Wait until every scan has been delivered, validated and through the gate"""
+    deadline = time.time() + timeout
+    quiet = 0
+    while time.time() < deadline and quiet < 3:
+        dispatcher = getattr(controller, 'dispatcher', None)
+        busy = (broker.backlog()
+                or (dispatcher is not None and dispatcher.depth())
+                or (controller.admission is not None and controller.admission.pending())
+                or controller.is_gate_processing
+                or controller.actuators.pending())
+        quiet = 0 if busy else quiet + 1
+        time.sleep(0.05)
+
+
+def pace(index, start, rate):
+    if rate > 0:
+        delay = start + index / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run_entry(args, gpio, database, broker, store_dir):
+    import entryacces as controller
+    if not args.verbose:
+        silence(*[m for m in sys.modules.values() if getattr(m, '__file__', None)
+                  and os.path.dirname(os.path.abspath(m.__file__)) == os.path.dirname(HERE)])
+    configure(controller, args, store_dir)
+    parking_id = controller.ASSIGNED_PARKING_ID
+
+    for i in range(args.scans):
+        database.write(f"qrcode/{parking_id}/{i}", {
+            'userId': f"user{i}", 'status': 'active', 'expiryTime': FAR_FUTURE})
+
+    recorder = LatencyRecorder(controller.SERVO_PIN, servo_duty(90))
+    gpio.on_duty = recorder.on_duty
+    wrap_admit(controller, recorder)
+
+    original_on_message = controller.on_message
+
+    def on_message(client, userdata, msg):
+        spot = str(json.loads(msg.payload.decode()).get('spotNumber'))
+        recorder.scan_started(spot)
+        original_on_message(client, userdata, msg)
+
+    controller.on_message = on_message
+
+    thread = threading.Thread(target=controller.main, daemon=True)
+    thread.start()
+    # Scans are refused until the local store and MQTT are up; wait for Firebase
+    # and the mirrors too, so the run measures the warm path
+    while controller.startup is None or not controller.startup.warm:
+        time.sleep(0.01)
+
+    start = time.perf_counter()
+    for i in range(args.scans):
+        pace(i, start, args.rate)
+        broker.publish(controller.qr_topic, json.dumps({
+            'parkingId': parking_id, 'spotNumber': i, 'userId': f"user{i}"}))
+
+    wait_idle(controller, broker, args.timeout)
+    broker.stop()
+    thread.join(timeout=5.0)
+    stats = {'admission': controller.admission.stats() if controller.admission else None}
+    for stop in ('stop_startup', 'stop_dispatcher', 'stop_admission', 'stop_qrcode_mirror', 'stop_local_store'):
+        if hasattr(controller, stop):
+            getattr(controller, stop)()
+    controller.actuators.stop()
+    return recorder, stats
+
+
+def run_exit(args, gpio, database, broker, store_dir):
+    import exitpayment as controller
+    if not args.verbose:
+        silence(*[m for m in sys.modules.values() if getattr(m, '__file__', None)
+                  and os.path.dirname(os.path.abspath(m.__file__)) == os.path.dirname(HERE)])
+    configure(controller, args, store_dir)
+    parking_id = controller.ASSIGNED_PARKING_ID
+
+    recorder = LatencyRecorder(controller.SERVO_PIN, servo_duty(90))
+    gpio.on_duty = recorder.on_duty
+    wrap_admit(controller, recorder)
+
+    def seed(spot, user):
+        database.write(f"payment_qrcodes/{parking_id}/{spot}", {
+            'userId': user, 'status': 'active', 'type': 'payment_exit',
+            'expiryTime': FAR_FUTURE, 'paymentId': f"pay-{spot}", 'moneyPaid': 1})
+
+    original_handle = controller.handle_qr_data
+
+    def handle_qr_data(qr_data):
+        try:
+            payload = json.loads(qr_data)
+            spot = str(payload.get('spotId'))
+            if args.frames and database.read(f"payment_qrcodes/{parking_id}/{spot}") is None:
+                seed(spot, payload.get('userId'))
+            recorder.scan_started(spot)
+        except ValueError:
+            pass
+        original_handle(qr_data)
+
+    controller.handle_qr_data = handle_qr_data
+
+    if args.frames:
+        # Replay a recording through the normal headless capture/decode loop
+        real_capture = controller.cv2.VideoCapture
+        grace = args.settle * 2 + args.hold + 0.2
+        controller.cv2.VideoCapture = lambda index, *rest: ReplayCapture(
+            real_capture(args.frames), controller, grace)
+        stats_holder = {}
+        original_stop = controller.stop_admission
+
+        def stop_admission():
+            if controller.admission is not None:
+                stats_holder['admission'] = controller.admission.stats()
+            original_stop()
+
+        controller.stop_admission = stop_admission
+        controller.start_qr_scanning(0, headless=True)
+        broker.stop()
+        return recorder, stats_holder
+    else:
+        for i in range(args.scans):
+            seed(i, f"user{i}")
+        controller.start_led_controller(controller.STARTING)
+        controller.actuators.start()
+        controller.start_payment_sync()
+        controller.start_admission()
+        # Starts the payment mirror; the run waits for it to sync so it measures the
+        # warm path. There's no camera here, so its startup step is completed directly
+        controller.start_startup()
+        controller.camera_opened()
+        controller.startup.wait_warm(args.timeout)
+
+        start = time.perf_counter()
+        for i in range(args.scans):
+            pace(i, start, args.rate)
+            controller.handle_qr_data(json.dumps({
+                'parkingId': parking_id, 'spotId': i, 'userId': f"user{i}",
+                'type': 'payment_exit'}))
+        wait_idle(controller, broker, args.timeout)
+
+    stats = {'admission': controller.admission.stats() if controller.admission else None}
+    controller.stop_startup()
+    controller.stop_admission()
+    controller.stop_payment_sync()
+    controller.actuators.stop()
+    controller.stop_led_controller()
+    broker.stop()
+    return recorder, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('controller', choices=['entry', 'exit'])
+    parser.add_argument('--scans', type=int, default=100, help='number of scans to send')
+    parser.add_argument('--rate', type=float, default=5.0,
+                        help='scans per second to offer (0 = as fast as possible)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='injected Firebase latency per call, ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- latency jitter, ms')
+    parser.add_argument('--hold', type=float, default=0.0, help='GATE_HOLD_TIME for the run, s')
+    parser.add_argument('--settle', type=float, default=0.0, help='SERVO_SETTLE_TIME for the run, s')
+    parser.add_argument('--frames', help='exit only: video file or image sequence to scan')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='override a controller setting, e.g. USE_LOCAL_STORE=False')
+    parser.add_argument('--timeout', type=float, default=120.0, help='give up after this many s')
+    parser.add_argument('--seed', type=int, default=1, help='jitter random seed')
+    parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    parser.add_argument('--verbose', action='store_true', help='keep controller logging')
+    args = parser.parse_args()
+
+    gpio, database, broker = install_fakes(args.latency / 1000.0, args.jitter / 1000.0, args.seed)
+    with tempfile.TemporaryDirectory() as store_dir:
+        runner = run_entry if args.controller == 'entry' else run_exit
+        recorder, stats = runner(args, gpio, database, broker, store_dir)
+
+    result = recorder.summary()
+    result.update({
+        'controller': args.controller,
+        'scans_offered': args.scans if not args.frames else None,
+        'latency_ms': args.latency,
+        'jitter_ms': args.jitter,
+        'db_calls': dict(database.calls),
+    })
+    result.update(stats)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"{args.controller} gate, {args.latency:.0f}±{args.jitter:.0f} ms injected DB latency")
+    print(f"  admitted:        {result['admitted']}"
+          + (f" of {args.scans}" if not args.frames else ''))
+    print(f"  p50 / p95 / p99: {result['p50_ms']:.1f} / {result['p95_ms']:.1f} / "
+          f"{result['p99_ms']:.1f} ms (max {result['max_ms']:.1f})")
+    print(f"  sustained:       {result['scans_per_second']:.1f} scans/s")
+    print(f"  db calls:        {result['db_calls']}")
+    if stats.get('admission'):
+        print(f"  admission:       {stats['admission']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,417 @@
+"""In-process stand-ins for RPi.GPIO, firebase_admin and paho-mqtt so the gate
+controllers and the statusspot bridge can be benchmarked without field hardware.
+
+install_fakes() must run before the controller modules are imported."""
+import copy
+import queue
+import random
+import sys
+import threading
+import time
+import types
+
+
+# --- RPi.GPIO ---------------------------------------------------------------
+
+class FakeGPIO:
+    """Records pin writes and servo duty changes with timestamps"""
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self):
+        self.events = []
+        self.on_duty = None    # callable(pin, duty, timestamp)
+        self.on_output = None  # callable(pin, level, timestamp)
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode, initial=None):
+        pass
+
+    def output(self, pin, level):
+        now = time.perf_counter()
+        self.events.append(('output', pin, level, now))
+        if self.on_output is not None:
+            self.on_output(pin, level, now)
+
+    def cleanup(self, *pins):
+        pass
+
+    def PWM(self, pin, frequency):
+        return FakePWM(self, pin)
+
+
+class FakePWM:
+    def __init__(self, gpio, pin):
+        self.gpio = gpio
+        self.pin = pin
+
+    def start(self, duty):
+        pass
+
+    def stop(self):
+        pass
+
+    def ChangeDutyCycle(self, duty):
+        now = time.perf_counter()
+        self.gpio.events.append(('duty', self.pin, duty, now))
+        if self.gpio.on_duty is not None:
+            self.gpio.on_duty(self.pin, duty, now)
+
+
+# --- firebase_admin ---------------------------------------------------------
+
+class Increment:
+    def __init__(self, amount):
+        self.amount = amount
+
+
+class TransactionAbortedError(Exception):
+    pass
+
+
+class FakeEvent:
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class FakeListenerRegistration:
+    def __init__(self, database, path, callback):
+        self.database = database
+        self.path = path
+        self.callback = callback
+
+    def close(self):
+        self.database.remove_listener(self)
+
+
+def _split(path):
+    return [k for k in str(path).split('/') if k]
+
+
+class FakeDatabase:
+    """Realtime Database tree with injected latency on every network call"""
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=None):
+        self.latency = latency    # seconds added to every get/set/update/listen round trip
+        self.jitter = jitter      # +/- seconds of uniform jitter
+        self.calls = {'get': 0, 'update': 0, 'set': 0, 'transaction': 0, 'listen': 0}
+        self._tree = {}
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._random = random.Random(seed)
+
+    def _delay(self, kind):
+        self.calls[kind] += 1
+        if self.latency or self.jitter:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            if delay > 0:
+                time.sleep(delay)
+
+    def _node(self, keys):
+        node = self._tree
+        for key in keys:
+            if not isinstance(node, dict) or key not in node:
+                return None
+            node = node[key]
+        return node
+
+    def read(self, path):
+        """Read without latency (for seeding and inspection)"""
+        with self._lock:
+            return copy.deepcopy(self._node(_split(path)))
+
+    def write(self, path, value, notify=True):
+        """Write without latency (for seeding); listeners still see the change"""
+        keys = _split(path)
+        with self._lock:
+            if isinstance(value, Increment):
+                current = self._node(keys)
+                value = (current if isinstance(current, (int, float)) else 0) + value.amount
+            if not keys:
+                self._tree = copy.deepcopy(value) if isinstance(value, dict) else {}
+            else:
+                node = self._tree
+                for key in keys[:-1]:
+                    if not isinstance(node.get(key), dict):
+                        node[key] = {}
+                    node = node[key]
+                if value is None:
+                    node.pop(keys[-1], None)
+                else:
+                    node[keys[-1]] = copy.deepcopy(value)
+            listeners = list(self._listeners)
+        if notify:
+            self._notify(keys, value, listeners)
+
+    def _notify(self, keys, value, listeners):
+        for registration in listeners:
+            base = _split(registration.path)
+            if keys[:len(base)] == base:
+                relative = '/' + '/'.join(keys[len(base):])
+                registration.callback(FakeEvent('put', relative, copy.deepcopy(value)))
+            elif base[:len(keys)] == keys:
+                registration.callback(FakeEvent('put', '/', self.read(registration.path)))
+
+    def add_listener(self, path, callback):
+        self._delay('listen')
+        registration = FakeListenerRegistration(self, path, callback)
+        with self._lock:
+            self._listeners.append(registration)
+        callback(FakeEvent('put', '/', self.read(path)))
+        return registration
+
+    def remove_listener(self, registration):
+        with self._lock:
+            if registration in self._listeners:
+                self._listeners.remove(registration)
+
+
+class FakeReference:
+    def __init__(self, database, path):
+        self.database = database
+        self.path = '/'.join(_split(path))
+        self.key = _split(path)[-1] if _split(path) else None
+
+    def child(self, path):
+        return FakeReference(self.database, f"{self.path}/{path}")
+
+    def get(self, etag=False, shallow=False):
+        self.database._delay('get')
+        value = self.database.read(self.path)
+        return (value, str(hash(repr(value)))) if etag else value
+
+    def set(self, value):
+        self.database._delay('set')
+        self.database.write(self.path, value)
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError('Value argument must be a non-empty dictionary.')
+        if None in value.values():
+            raise ValueError('Dictionary must not contain None values.')
+        self.database._delay('update')
+        for key, child in value.items():
+            self.database.write(f"{self.path}/{key}", child)
+
+    def transaction(self, transaction_update):
+        """Like firebase_admin: a GET with ETag, then a conditional PUT
+        (set_if_unchanged), both repeated when another writer got in between"""
+        self.database.calls['transaction'] += 1
+        for _ in range(25):
+            self.database._delay('get')
+            current = self.database.read(self.path)
+            new_value = transaction_update(copy.deepcopy(current))
+            self.database._delay('set')
+            with self.database._lock:
+                if self.database.read(self.path) == current:
+                    self.database.write(self.path, new_value)
+                    return new_value
+        raise TransactionAbortedError('Transaction aborted after failed retries.')
+
+    def listen(self, callback):
+        return self.database.add_listener(self.path, callback)
+
+
+def make_firebase_modules(database):
+    firebase_admin = types.ModuleType('firebase_admin')
+    credentials = types.ModuleType('firebase_admin.credentials')
+    db = types.ModuleType('firebase_admin.db')
+
+    credentials.Certificate = lambda path: path
+    db.reference = lambda path='/', app=None, url=None: FakeReference(database, path)
+    db.Increment = Increment
+    db.TransactionAbortedError = TransactionAbortedError
+    db.Event = FakeEvent
+    firebase_admin.initialize_app = lambda credential=None, options=None, name='[DEFAULT]': object()
+    firebase_admin.get_app = lambda name='[DEFAULT]': object()
+    firebase_admin.credentials = credentials
+    firebase_admin.db = db
+    return firebase_admin, credentials, db
+
+
+# --- paho-mqtt --------------------------------------------------------------
+
+def topic_matches(subscription, topic):
+    """MQTT topic filter matching with + and # wildcards"""
+    sub_parts = subscription.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(sub_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[i]:
+            return False
+    return len(sub_parts) == len(topic_parts)
+
+
+class FakeMessage:
+    def __init__(self, topic, payload, retain=False, qos=0):
+        self.topic = topic
+        self.payload = payload if isinstance(payload, bytes) else str(payload).encode()
+        self.retain = retain
+        self.qos = qos
+        self.published_at = time.perf_counter()
+
+
+class FakeBroker:
+    """Delivers messages to subscribed clients on one network thread, like paho's loop"""
+
+    def __init__(self):
+        self.clients = []
+        self.retained = {}
+        self.delivered = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='fake-broker')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        for client in self.clients:
+            client._stopped.set()
+
+    def publish(self, topic, payload, retain=False):
+        message = FakeMessage(topic, payload, retain)
+        if retain:
+            self.retained[topic] = message
+        self._queue.put(message)
+        return message
+
+    def backlog(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                break
+            for client in list(self.clients):
+                client._deliver(message)
+            self.delivered += 1
+
+
+class FakeMQTTClient:
+    def __init__(self, broker, client_id='', *args, **kwargs):
+        self.broker = broker
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+        self.subscriptions = []
+        self.published = []
+        self._stopped = threading.Event()
+        self._connect_pending = False
+
+    def connect_async(self, host, port=1883, keepalive=60):
+        self._connect_pending = True
+
+    def connect(self, host, port=1883, keepalive=60):
+        if self not in self.broker.clients:
+            self.broker.clients.append(self)
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0)
+        return 0
+
+    def subscribe(self, topic, qos=0):
+        topics = topic if isinstance(topic, list) else [(topic, qos)]
+        for name, _ in topics:
+            self.subscriptions.append(name)
+            for retained_topic, message in self.broker.retained.items():
+                if topic_matches(name, retained_topic):
+                    retained = FakeMessage(message.topic, message.payload, retain=True)
+                    self._deliver(retained)
+        return (0, 1)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published.append((topic, payload, retain))
+        self.broker.publish(topic, payload, retain)
+
+    def _deliver(self, message):
+        if self.on_message is None:
+            return
+        if any(topic_matches(sub, message.topic) for sub in self.subscriptions):
+            self.on_message(self, None, message)
+
+    def loop_forever(self, timeout=1.0, retry_first_connection=False):
+        if self._connect_pending:
+            self._connect_pending = False
+            self.connect(None)
+        self._stopped.wait()
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        self._stopped.set()
+
+    def disconnect(self):
+        self._stopped.set()
+
+
+def make_paho_modules(broker):
+    paho = types.ModuleType('paho')
+    mqtt = types.ModuleType('paho.mqtt')
+    client = types.ModuleType('paho.mqtt.client')
+    client.Client = lambda *args, **kwargs: FakeMQTTClient(broker, *args, **kwargs)
+    client.MQTTMessage = FakeMessage
+    client.topic_matches_sub = topic_matches
+    paho.mqtt = mqtt
+    mqtt.client = client
+    return paho, mqtt, client
+
+
+# --- installation -----------------------------------------------------------
+
+def install_fakes(latency=0.0, jitter=0.0, seed=None):
+    """Register the fakes in sys.modules; returns (gpio, database, broker)"""
+    gpio = FakeGPIO()
+    database = FakeDatabase(latency=latency, jitter=jitter, seed=seed)
+    broker = FakeBroker()
+
+    rpi = types.ModuleType('RPi')
+    rpi.GPIO = gpio
+    firebase_admin, credentials, db = make_firebase_modules(database)
+    paho, mqtt, client = make_paho_modules(broker)
+
+    sys.modules.update({
+        'RPi': rpi,
+        'RPi.GPIO': gpio,
+        'firebase_admin': firebase_admin,
+        'firebase_admin.credentials': credentials,
+        'firebase_admin.db': db,
+        'paho': paho,
+        'paho.mqtt': mqtt,
+        'paho.mqtt.client': client,
+    })
+    broker.start()
+    return gpio, database, broker
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def silence(*modules):
+    """Shadow print() in the given modules so controller logging doesn't skew timings"""
+    for module in modules:
+        module.print = lambda *args, **kwargs: None
@@ -0,0 +1,410 @@
+"""Synthetic spot-sensor fleet and soak test for the statusspot bridge.
+
+Simulates N ultrasonic spot sensors publishing {spotId, status, distance,
+parkingId} at a per-sensor rate with jitter.
+
+soak: runs statusspot.py in-process against the fakes in fakes.py (in-process
+broker, Firebase with injected latency) and samples, every --interval
+seconds, throughput, backlog (broker + dispatch queues + unflushed spot
+writes), end-to-end write lag (sensor publish to the spot write landing in
+the database) and process memory. The backlog growth rate at the end says
+whether the bridge keeps up with the offered load.
+
+publish: sends the same load to a real MQTT broker (needs paho-mqtt), e.g.
+to drive statusspot.py on a Pi from another machine.
+
+    python3 bench/loadgen_spots.py soak --sensors 2000 --rate 0.5 --latency 80 --jitter 40
+    python3 bench/loadgen_spots.py soak --sensors 5000 --duration 600 --set DISPATCH_WORKERS=8
+    python3 bench/loadgen_spots.py publish --host 192.168.137.86 --port 8000 --topic parking/status
+"""
+import argparse
+import ast
+import heapq
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+from fakes import install_fakes, percentile, silence
+
+
+class SensorFleet:
+    """Schedules every sensor's next reading on one heap and publishes from one thread"""
+
+    def __init__(self, publish, sensors=100, parkings=1, rate=0.5, jitter=0.2,
+                 flip=0.05, parking_prefix='parking', seed=1):
+        self.publish = publish            # callable(payload dict)
+        self.sensors = sensors
+        self.parkings = parkings
+        self.rate = rate                  # readings per second per sensor
+        self.jitter = jitter              # +/- fraction of the reading period
+        self.flip = flip                  # chance a reading changes occupied/available
+        self.parking_prefix = parking_prefix
+        self.published = 0
+        self._random = random.Random(seed)
+        self._occupied = [self._random.random() < 0.5 for _ in range(sensors)]
+        self._stop = threading.Event()
+        self._thread = None
+
+    def spot(self, index):
+        """(parkingId, spotId) for sensor index; spots are numbered from 1 per parking"""
+        return f"{self.parking_prefix}{index % self.parkings + 1}", index // self.parkings + 1
+
+    def reading(self, index):
+        if self._random.random() < self.flip:
+            self._occupied[index] = not self._occupied[index]
+        occupied = self._occupied[index]
+        distance = self._random.uniform(15, 60) if occupied else self._random.uniform(150, 300)
+        parking_id, spot_id = self.spot(index)
+        return {
+            'spotId': spot_id,
+            'status': 'occupied' if occupied else 'available',
+            'distance': round(distance, 1),
+            'parkingId': parking_id,
+        }
+
+    def start(self, duration):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(duration,), name='sensor-fleet')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _period(self):
+        period = 1.0 / self.rate
+        return period * (1 + self._random.uniform(-self.jitter, self.jitter))
+
+    def _run(self, duration):
+        start = time.perf_counter()
+        end = start + duration
+        # Sensors boot at random points in their first period so readings don't arrive in lockstep
+        schedule = [(start + self._random.uniform(0, 1.0 / self.rate), i) for i in range(self.sensors)]
+        heapq.heapify(schedule)
+        while schedule and not self._stop.is_set():
+            due, index = schedule[0]
+            if due >= end:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            heapq.heapreplace(schedule, (due + self._period(), index))
+            self.publish(self.reading(index))
+            self.published += 1
+
+
+class SoakProbe:
+    """Measures publish-to-handler and publish-to-database lag per spot"""
+
+    def __init__(self):
+        self.handled = 0
+        self.node_writes = 0
+        self._sent = {}          # spot path -> (distance, publish time) of its newest published reading
+        self._latest = {}        # spot path -> publish time of the newest reading handed to statusspot
+        self._dispatch_lags = []
+        self._write_lags = []
+        self._lock = threading.Lock()
+
+    def published(self, payload):
+        """Note the publish time of a reading; call just before publishing it"""
+        path = f"spots/{payload['parkingId']}/{payload['spotId']}"
+        with self._lock:
+            self._sent[path] = (float(payload['distance']), time.perf_counter())
+
+    def wrap_handler(self, controller):
+        original = controller.handle_status_message
+
+        def handle_status_message(message):
+            now = time.perf_counter()
+            path = f"spots/{message.parking_id}/{message.spot_id}"
+            with self._lock:
+                # The handler gets a decoded SpotStatus, so readings are matched by spot and distance
+                distance, sent_at = self._sent.get(path, (None, None))
+                if sent_at is not None and distance == message.distance:
+                    del self._sent[path]
+                    self.handled += 1
+                    self._dispatch_lags.append(now - sent_at)
+                    self._latest[path] = sent_at
+            original(message)
+
+        controller.handle_status_message = handle_status_message
+
+    def on_event(self, event):
+        """Listener on spots/; one lag sample per spot node written"""
+        keys = [k for k in (event.path or '/').split('/') if k]
+        if len(keys) < 2:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            sent_at = self._latest.pop(f"spots/{keys[0]}/{keys[1]}", None)
+            if sent_at is not None:
+                self.node_writes += 1
+                self._write_lags.append(now - sent_at)
+
+    def take_lags(self):
+        with self._lock:
+            dispatch, self._dispatch_lags = self._dispatch_lags, []
+            write, self._write_lags = self._write_lags, []
+        return dispatch, write
+
+
+def rss_mb():
+    """Current resident set size; peak RSS where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def slope(points):
+    """Least-squares slope of (x, y) points"""
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    if var == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var
+
+
+def apply_overrides(controller, overrides):
+    for override in overrides:
+        name, _, value = override.partition('=')
+        if not hasattr(controller, name):
+            raise SystemExit(f"{controller.__name__} has no setting {name}")
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+        setattr(controller, name, value)
+
+
+def backlog(controller, broker):
+    """Readings published but not yet written: broker queue, dispatch queues, unflushed spots"""
+    parts = {'broker': broker.backlog(), 'dispatch': 0, 'writer': 0}
+    if controller.dispatcher is not None:
+        parts['dispatch'] = controller.dispatcher.depth()
+    if controller.spot_writer is not None:
+        parts['writer'] = controller.spot_writer.pending()
+    return parts
+
+
+def run_soak(args, history_dir):
+    gpio, database, broker = install_fakes(args.latency / 1000.0, args.jitter / 1000.0, args.seed)
+    import statusspot as controller
+    if not args.verbose:
+        silence(*[m for m in sys.modules.values() if getattr(m, '__file__', None)
+                  and os.path.dirname(os.path.abspath(m.__file__)) == os.path.dirname(HERE)])
+    controller.HISTORY_DIR = history_dir
+    apply_overrides(controller, args.set)
+
+    probe = SoakProbe()
+    probe.wrap_handler(controller)
+    database.add_listener('spots', probe.on_event)
+
+    if args.tracemalloc:
+        import tracemalloc
+        tracemalloc.start()
+
+    thread = threading.Thread(target=controller.main, daemon=True)
+    thread.start()
+    while not broker.clients:
+        time.sleep(0.01)
+
+    topic = controller.status_topic
+
+    def publish(payload):
+        probe.published(payload)
+        broker.publish(topic, json.dumps(payload))
+
+    fleet = SensorFleet(publish, sensors=args.sensors, parkings=args.parkings, rate=args.rate,
+                        jitter=args.rate_jitter, flip=args.flip, seed=args.seed)
+
+    samples = []
+    offered = args.sensors * args.rate
+    if not args.json:
+        print(f"statusspot soak: {args.sensors} sensors x {args.rate:g}/s = {offered:.0f} msg/s offered, "
+              f"{args.latency:.0f}±{args.jitter:.0f} ms DB latency, {args.duration:.0f} s")
+        print(f"{'t(s)':>6} {'pub/s':>8} {'handled/s':>10} {'writes/s':>9} {'updates/s':>10} "
+              f"{'backlog':>8} {'write lag p50/p95/max ms':>26} {'rss MB':>8}")
+
+    start = time.perf_counter()
+    fleet.start(args.duration)
+    last = {'t': start, 'published': 0, 'handled': 0, 'writes': 0, 'updates': 0}
+    all_write_lags = []
+    all_dispatch_lags = []
+    while True:
+        time.sleep(args.interval)
+        now = time.perf_counter()
+        pending = backlog(controller, broker)
+        depth = sum(pending.values())
+        dispatch_lags, write_lags = probe.take_lags()
+        all_dispatch_lags.extend(dispatch_lags)
+        all_write_lags.extend(write_lags)
+
+        current = {'t': now, 'published': fleet.published, 'handled': probe.handled,
+                   'writes': probe.node_writes, 'updates': database.calls['update']}
+        span = now - last['t']
+        sample = {
+            't': round(now - start, 2),
+            'published_per_s': (current['published'] - last['published']) / span,
+            'handled_per_s': (current['handled'] - last['handled']) / span,
+            'writes_per_s': (current['writes'] - last['writes']) / span,
+            'updates_per_s': (current['updates'] - last['updates']) / span,
+            'backlog': depth,
+            'backlog_parts': pending,
+            'dispatch_lag_p95_ms': percentile(dispatch_lags, 95) * 1000,
+            'write_lag_p50_ms': percentile(write_lags, 50) * 1000,
+            'write_lag_p95_ms': percentile(write_lags, 95) * 1000,
+            'write_lag_max_ms': max(write_lags) * 1000 if write_lags else 0.0,
+            'rss_mb': rss_mb(),
+        }
+        if args.tracemalloc:
+            sample['traced_mb'] = tracemalloc.get_traced_memory()[0] / 1e6
+        samples.append(sample)
+        last = current
+
+        if not args.json:
+            lag = (f"{sample['write_lag_p50_ms']:.0f} / {sample['write_lag_p95_ms']:.0f} / "
+                   f"{sample['write_lag_max_ms']:.0f}")
+            print(f"{sample['t']:>6.0f} {sample['published_per_s']:>8.0f} {sample['handled_per_s']:>10.0f} "
+                  f"{sample['writes_per_s']:>9.0f} {sample['updates_per_s']:>10.1f} {depth:>8} "
+                  f"{lag:>26} {sample['rss_mb']:>8.1f}")
+
+        if not fleet.running() and (depth == 0 or now - start > args.duration + args.drain):
+            break
+
+    fleet.stop()
+    broker.stop()
+    thread.join(timeout=10.0)
+
+    loaded = [s for s in samples if s['t'] <= args.duration]
+    growth = slope([(s['t'], s['backlog']) for s in loaded]) * 60
+    summary = {
+        'sensors': args.sensors,
+        'offered_per_s': offered,
+        'latency_ms': args.latency,
+        'jitter_ms': args.jitter,
+        'published': fleet.published,
+        'handled': probe.handled,
+        'spot_writes': probe.node_writes,
+        'db_calls': dict(database.calls),
+        'handled_per_s': probe.handled / args.duration,
+        'backlog_growth_per_min': growth,
+        'peak_backlog': max((s['backlog'] for s in samples), default=0),
+        'final_backlog': samples[-1]['backlog'] if samples else 0,
+        'dispatch_lag_p95_ms': percentile(all_dispatch_lags, 95) * 1000,
+        'write_lag_p50_ms': percentile(all_write_lags, 50) * 1000,
+        'write_lag_p95_ms': percentile(all_write_lags, 95) * 1000,
+        'write_lag_p99_ms': percentile(all_write_lags, 99) * 1000,
+        'peak_rss_mb': max((s['rss_mb'] for s in samples), default=0.0),
+        'dispatcher': controller.dispatcher.stats() if controller.dispatcher is not None else None,
+    }
+    # Keeping up means the backlog stays flat under load and drains afterwards
+    summary['keeps_up'] = (summary['final_backlog'] == 0
+                           and growth < max(1.0, 0.01 * offered * 60))
+
+    if args.json:
+        print(json.dumps({'samples': samples, 'summary': summary}, indent=2))
+        return
+
+    print(f"\n  published / handled / spot writes: {summary['published']} / "
+          f"{summary['handled']} / {summary['spot_writes']}")
+    print(f"  db calls:          {summary['db_calls']}")
+    print(f"  backlog growth:    {growth:+.1f} msgs/min (peak {summary['peak_backlog']}, "
+          f"final {summary['final_backlog']})")
+    print(f"  write lag:         p50 {summary['write_lag_p50_ms']:.0f} / p95 "
+          f"{summary['write_lag_p95_ms']:.0f} / p99 {summary['write_lag_p99_ms']:.0f} ms")
+    print(f"  peak rss:          {summary['peak_rss_mb']:.1f} MB")
+    if summary['dispatcher']:
+        print(f"  dispatcher:        {summary['dispatcher']}")
+    print(f"  keeps up:          {'yes' if summary['keeps_up'] else 'NO'}")
+
+
+def run_publish(args):
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client()
+    client.connect(args.host, args.port, 60)
+    client.loop_start()
+    fleet = SensorFleet(lambda payload: client.publish(args.topic, json.dumps(payload)),
+                        sensors=args.sensors, parkings=args.parkings, rate=args.rate,
+                        jitter=args.rate_jitter, flip=args.flip, seed=args.seed)
+    print(f"Publishing {args.sensors} sensors x {args.rate:g}/s to {args.host}:{args.port} "
+          f"{args.topic} for {args.duration:.0f} s")
+
+    start = time.perf_counter()
+    fleet.start(args.duration)
+    published = 0
+    try:
+        while fleet.running():
+            time.sleep(args.interval)
+            rate = (fleet.published - published) / args.interval
+            published = fleet.published
+            print(f"{time.perf_counter() - start:>6.0f} s  {rate:>8.0f} msg/s  {published} sent  "
+                  f"{rss_mb():.1f} MB")
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        fleet.stop()
+        client.loop_stop()
+        client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('mode', choices=['soak', 'publish'])
+    parser.add_argument('--sensors', type=int, default=200, help='number of simulated sensors')
+    parser.add_argument('--parkings', type=int, default=1, help='parkings the sensors are spread over')
+    parser.add_argument('--rate', type=float, default=0.5, help='readings per second per sensor')
+    parser.add_argument('--rate-jitter', type=float, default=0.2,
+                        help='+/- fraction of the reading period')
+    parser.add_argument('--flip', type=float, default=0.05,
+                        help='chance a reading changes occupied/available')
+    parser.add_argument('--duration', type=float, default=60.0, help='seconds of load')
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between samples')
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    soak = parser.add_argument_group('soak')
+    soak.add_argument('--latency', type=float, default=50.0, help='injected Firebase latency per call, ms')
+    soak.add_argument('--jitter', type=float, default=20.0, help='+/- latency jitter, ms')
+    soak.add_argument('--drain', type=float, default=30.0,
+                      help='seconds to wait for the backlog to clear after the load stops')
+    soak.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                      help='override a statusspot setting, e.g. DISPATCH_WORKERS=8')
+    soak.add_argument('--tracemalloc', action='store_true', help='also report traced Python heap')
+    soak.add_argument('--json', action='store_true', help='print samples and summary as JSON')
+    soak.add_argument('--verbose', action='store_true', help='keep statusspot logging')
+    publish = parser.add_argument_group('publish')
+    publish.add_argument('--host', default='localhost', help='MQTT broker host')
+    publish.add_argument('--port', type=int, default=1883, help='MQTT broker port')
+    publish.add_argument('--topic', default='parking/status', help='status topic to publish on')
+    args = parser.parse_args()
+
+    if args.rate <= 0:
+        raise SystemExit('--rate must be positive')
+    if args.mode == 'soak':
+        with tempfile.TemporaryDirectory() as history_dir:
+            run_soak(args, history_dir)
+    else:
+        run_publish(args)
+
+
+if __name__ == '__main__':
+    main()
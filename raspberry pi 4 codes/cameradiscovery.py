@@ -0,0 +1,169 @@
+import fcntl
+import glob
+import json
+import os
+import re
+import struct
+from concurrent.futures import ThreadPoolExecutor, wait
+import cv2
+
+VIDIOC_QUERYCAP = 0x80685600        # _IOR('V', 0, struct v4l2_capability)
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_VIDEO_CAPTURE_MPLANE = 0x00001000
+V4L2_CAP_VIDEO_M2M = 0x00008000
+V4L2_CAP_VIDEO_M2M_MPLANE = 0x00004000
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+
+def _read_sysfs(index, name):
+    try:
+        with open(f"/sys/class/video4linux/video{index}/{name}") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _query_caps(path):
+    """(card, bus_info, device_caps) from VIDIOC_QUERYCAP, or None if the device won't answer"""
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return None
+    try:
+        buf = bytearray(104)
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, buf)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    _, card, bus_info, _, capabilities, device_caps = struct.unpack_from('16s32s32sIII', buf)
+    if not capabilities & V4L2_CAP_DEVICE_CAPS:
+        device_caps = capabilities
+    return (card.split(b'\0', 1)[0].decode(errors='replace'),
+            bus_info.split(b'\0', 1)[0].decode(errors='replace'),
+            device_caps)
+
+
+def enumerate_devices():
+    """Capture-capable V4L2 devices as dicts with index, name and bus, without opening
+    them through OpenCV. Metadata nodes and the Pi's codec/ISP (M2M) nodes are skipped."""
+    devices = []
+    for path in glob.glob('/dev/video*'):
+        match = re.fullmatch(r'/dev/video(\d+)', path)
+        if not match:
+            continue
+        index = int(match.group(1))
+        caps = _query_caps(path)
+        if caps is None:
+            continue
+        card, bus_info, device_caps = caps
+        if device_caps & (V4L2_CAP_VIDEO_M2M | V4L2_CAP_VIDEO_M2M_MPLANE):
+            continue
+        if not device_caps & (V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_VIDEO_CAPTURE_MPLANE):
+            continue
+        devices.append({'index': index, 'name': _read_sysfs(index, 'name') or card, 'bus': bus_info})
+    return sorted(devices, key=lambda d: d['index'])
+
+
+def probe_camera(index):
+    """Open the camera and read one frame; returns its config dict or None"""
+    cap = cv2.VideoCapture(index)
+    try:
+        if not cap.isOpened():
+            return None
+        ret, frame = cap.read()
+        if not ret:
+            return None
+        return {
+            'index': index,
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': int(cap.get(cv2.CAP_PROP_FPS)),
+        }
+    finally:
+        cap.release()
+
+
+class CameraDiscovery:
+    """Finds working cameras fast: the cameras that worked last time are tried
+    first, then capture devices enumerated from /dev/video* and sysfs are probed
+    in parallel, and indices 0..max_index-1 are probed only as a last resort"""
+
+    def __init__(self, cache_path, probe_timeout=3.0, max_index=10, workers=4):
+        self.cache_path = cache_path
+        self.probe_timeout = probe_timeout  # seconds before a camera that won't deliver a frame is skipped
+        self.max_index = max_index
+        self.workers = workers
+
+    def discover(self):
+        devices = {d['index']: d for d in enumerate_devices()}
+
+        cached = self._load_cache()
+        # Only trust the cache if the same camera still sits at each cached index
+        if cached and all(self._same_device(cam, devices.get(cam['index'])) for cam in cached):
+            cameras = self._probe([cam['index'] for cam in cached], devices)
+            if len(cameras) == len(cached):
+                print(f"⚡ Using cached camera config: {[cam['index'] for cam in cameras]}")
+                return cameras
+            print("🔍 Cached camera config is out of date - rediscovering")
+
+        cameras = self._probe(sorted(devices), devices) if devices else []
+        if not cameras:
+            print(f"🔍 {'No working capture device' if devices else 'No capture devices'} "
+                  f"enumerated - probing indices 0-{self.max_index - 1}")
+            cameras = self._probe([i for i in range(self.max_index) if i not in devices], devices)
+
+        if cameras:
+            self._save_cache(cameras)
+        return cameras
+
+    def _probe(self, indices, devices):
+        """Probe indices in parallel; cameras that don't answer within probe_timeout are skipped"""
+        if not indices:
+            return []
+        pool = ThreadPoolExecutor(max_workers=min(self.workers, len(indices)),
+                                  thread_name_prefix='camera-probe')
+        futures = {pool.submit(probe_camera, index): index for index in indices}
+        done, not_done = wait(futures, timeout=self.probe_timeout)
+        # A hung driver call can't be interrupted; leave those probes behind
+        pool.shutdown(wait=False, cancel_futures=True)
+        for future in not_done:
+            print(f"⏱️  Camera {futures[future]} did not answer within {self.probe_timeout}s")
+
+        cameras = []
+        for future in done:
+            try:
+                camera = future.result()
+            except Exception as e:
+                print(f"❌ Camera {futures[future]} probe failed: {e}")
+                continue
+            if camera is not None:
+                device = devices.get(camera['index']) or {}
+                camera['name'] = device.get('name')
+                camera['bus'] = device.get('bus')
+                cameras.append(camera)
+        return sorted(cameras, key=lambda cam: cam['index'])
+
+    @staticmethod
+    def _same_device(cached, device):
+        if device is None:
+            # Nothing enumerated (no V4L2 on this system); the probe will tell
+            return cached.get('bus') is None
+        return cached.get('name') == device['name'] and cached.get('bus') == device['bus']
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                cameras = json.load(f)
+            return cameras if isinstance(cameras, list) and cameras else None
+        except (OSError, ValueError):
+            return None
+
+    def _save_cache(self, cameras):
+        try:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(cameras, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"⚠️  Could not save camera cache {self.cache_path}: {e}")
@@ -0,0 +1,75 @@
+import collections
+import hashlib
+import threading
+import time
+
+
+def payload_key(payload):
+    """Short digest of a raw payload (bytes or str), cheap enough to check before parsing"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return hashlib.blake2b(payload, digest_size=8).digest()
+
+
+class SeenCache:
+    """Bounded LRU of recently seen keys, each remembered for ttl seconds. By default
+    a repeat does not extend the window, so a pass held in front of a reader counts
+    again once ttl has passed; with refresh, every repeat restarts the window and
+    the pass counts again only after it has been out of sight for ttl."""
+
+    def __init__(self, ttl=5.0, maxsize=1024, refresh=False):
+        self.ttl = ttl              # seconds a key suppresses repeats
+        self.maxsize = maxsize      # keys kept; the least recently seen are evicted first
+        self.refresh = refresh      # whether a repeat restarts the key's window
+        self.repeats = 0
+        self.evicted = 0
+        self._seen = collections.OrderedDict()     # key -> start of its window
+        self._lock = threading.Lock()
+
+    def seen(self, *keys):
+        """True if any of keys was seen within ttl; otherwise remember them all and return False"""
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                first_seen = self._seen.get(key)
+                if first_seen is not None and now - first_seen < self.ttl:
+                    if self.refresh:
+                        self._seen[key] = now
+                    self._seen.move_to_end(key)
+                    self.repeats += 1
+                    return True
+
+            for key in keys:
+                self._seen[key] = now
+                self._seen.move_to_end(key)
+            while len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+                self.evicted += 1
+        return False
+
+    def touch(self, key):
+        """Whether key was seen within ttl, restarting its window if so and the cache
+        refreshes; unlike seen() an unknown key is not recorded"""
+        now = time.monotonic()
+        with self._lock:
+            first_seen = self._seen.get(key)
+            if first_seen is None or now - first_seen >= self.ttl:
+                return False
+            if self.refresh:
+                self._seen[key] = now
+            self._seen.move_to_end(key)
+        return True
+
+    def __contains__(self, key):
+        """Whether key was seen within ttl, without recording it"""
+        with self._lock:
+            first_seen = self._seen.get(key)
+        return first_seen is not None and time.monotonic() - first_seen < self.ttl
+
+    def __len__(self):
+        with self._lock:
+            return len(self._seen)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._seen), 'repeats': self.repeats, 'evicted': self.evicted}
@@ -0,0 +1,107 @@
+import queue
+import threading
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+OVERFLOW_MODES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+_STOP = object()
+
+
+class KeyedDispatcher:
+    """Bounded worker pool; items sharing a key always go to the same worker, in order"""
+
+    def __init__(self, handler, workers=4, maxsize=1000, overflow=BLOCK, name='dispatch'):
+        if overflow not in OVERFLOW_MODES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_MODES}, got {overflow!r}")
+        self.handler = handler
+        self.overflow = overflow
+        self.name = name
+        self.submitted = 0
+        self.processed = 0
+        self.errors = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.max_depth = 0
+        per_worker = max(1, maxsize // workers)
+        self._queues = [queue.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        for i, q in enumerate(self._queues):
+            thread = threading.Thread(target=self._worker, args=(q,), name=f"{self.name}-{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        """Let the workers drain their queues, then stop them"""
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, key, item):
+        """Queue item for its key's worker; returns False if it was dropped"""
+        q = self._queues[hash(key) % len(self._queues)]
+
+        if self.overflow == BLOCK:
+            q.put(item)
+        elif self.overflow == DROP_NEWEST:
+            try:
+                q.put_nowait(item)
+            except queue.Full:
+                with self._lock:
+                    self.dropped_newest += 1
+                return False
+        else:
+            while True:
+                try:
+                    q.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                        with self._lock:
+                            self.dropped_oldest += 1
+                    except queue.Empty:
+                        pass
+
+        with self._lock:
+            self.submitted += 1
+            depth = self.depth()
+            if depth > self.max_depth:
+                self.max_depth = depth
+        return True
+
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'processed': self.processed,
+                'errors': self.errors,
+                'dropped_oldest': self.dropped_oldest,
+                'dropped_newest': self.dropped_newest,
+                'depth': self.depth(),
+                'max_depth': self.max_depth,
+            }
+
+    def _worker(self, q):
+        while True:
+            item = q.get()
+            if item is _STOP:
+                break
+            try:
+                self.handler(item)
+                with self._lock:
+                    self.processed += 1
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"[DISPATCH] Handler error in {self.name}: {e}")
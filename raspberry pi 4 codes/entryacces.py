@@ -1,10 +1,20 @@
 import paho.mqtt.client as mqtt
 import firebase_admin
 from firebase_admin import credentials, db
-import json
 import time
 import RPi.GPIO as GPIO
 import threading
+from rtdbmirror import RTDBMirror
+from dispatcher import KeyedDispatcher
+from actuators import ActuatorScheduler, servo_move_steps, led_pulse_steps
+from admission import AdmissionQueue
+from localstore import LocalStore
+from gatelane import GateLane
+from dedup import SeenCache, payload_key
+from payloads import EntryScan, PayloadError, decode
+from passconsume import PassRejected, ConsumedPass, ConsumeUnavailable, PassConsumer, CONSUME_TOKEN_FIELD
+from startup import WarmStartup
+from metrics import MetricsRegistry, CYCLE_BUCKETS
 
 # Hardware Configuration
 SERVO_PIN = 18       # GPIO pin for servo motor
@@ -14,6 +24,7 @@ LED_RED_PIN = 23     # GPIO pin for red LED
 broker = '192.168.137.86'
 port = 8000
 qr_topic = "parking/paymentQR"
+LOG_SCANS = False       # print every decoded scan in full, user ID included (debugging only)
 
 # Firebase Configuration
 firebase_credentials_path = '/home/pi/Desktop/test/smartparking-4025c-firebase-adminsdk-fbsvc-020fd53803.json'
@@ -22,153 +33,592 @@ database_url = 'https://smartparking-4025c-default-rtdb.europe-west1.firebasedat
 # This Raspberry Pi's Assigned Parking
 ASSIGNED_PARKING_ID = "GnNyv7AD32nUPqtp9tvR"
 
+# Entry validation mirror (serves qrcode/{ASSIGNED_PARKING_ID} from memory)
+USE_QRCODE_MIRROR = True
+QRCODE_MIRROR_MAX_AGE = 300     # seconds without a sync before falling back to direct reads
+QRCODE_MIRROR_RESYNC = 120      # seconds between full snapshot refreshes
+qrcode_mirrors = {}             # parking ID -> RTDBMirror
+
+# Atomic validate-and-consume: a valid pass is checked and its access recorded in
+# one RTDB transaction on qrcode/{parking}/{spot}, so it can't be admitted twice
+# by racing lanes. A fresh mirror still rejects invalid passes without a round
+# trip; while the mirror is stale (uplink down), or a transaction gets no answer
+# within CONSUME_TIMEOUT, scans are validated locally and their access journaled
+# instead. Off by default: the transaction is a GET plus a conditional PUT on
+# every admission, where the mirror answers from memory. Turn it on where lanes
+# share passes and a double admission costs more than two round trips.
+ATOMIC_CONSUME = False
+CONSUME_TIMEOUT = 2         # seconds before a transaction is abandoned and the pass validated locally
+CONSUME_BACKOFF = 30        # seconds transactions are skipped after a timeout
+PASS_REUSE_WINDOW = 10      # seconds after an access during which the pass is refused
+pass_consumer = PassConsumer(timeout=CONSUME_TIMEOUT, backoff=CONSUME_BACKOFF)
+
+# Offline-first local store: reservations persisted from the mirror (SQLite, WAL)
+# and an access journal replayed to Firebase when the uplink is available
+USE_LOCAL_STORE = True
+LOCAL_STORE_PATH = '/home/pi/Desktop/test/entry_store.db'
+JOURNAL_REPLAY_INTERVAL = 5     # seconds between journal replays
+local_store = None
+
+# Repeated scans (same payload, or same parking/spot/user) within the window and
+# retained redeliveries of the reader's last message are dropped before any
+# Firebase traffic
+SCAN_REPEAT_WINDOW = 5      # seconds
+SCAN_CACHE_SIZE = 1024      # recent scans remembered
+IGNORE_RETAINED = True
+
+# Dispatch stage between paho's network thread and the Firebase handlers
+DISPATCH_WORKERS = 2
+DISPATCH_QUEUE_SIZE = 32
+DISPATCH_OVERFLOW = 'drop_oldest'   # 'block', 'drop_oldest' or 'drop_newest'
+dispatcher = None
+
 # Gate access control
+GATE_HOLD_TIME = 10       # seconds the gate stays open
+SERVO_SETTLE_TIME = 1     # seconds the servo gets to reach its position
 gate_access_lock = threading.Lock()
+
+# A pass held in view keeps restarting its repeat window, which lasts at least a
+# gate cycle plus the reuse window; otherwise it would be resubmitted while the
+# gate is open (an error blink) and admitted again once the reuse window ends
+scan_cache = SeenCache(ttl=max(SCAN_REPEAT_WINDOW,
+                               GATE_HOLD_TIME + 2 * SERVO_SETTLE_TIME + PASS_REUSE_WINDOW),
+                       maxsize=SCAN_CACHE_SIZE, refresh=True)
 is_gate_processing = False
 
+# Scans arriving during a gate cycle are validated right away and admitted
+# back-to-back once the gate is free
+ADMISSION_QUEUE_DEPTH = 3     # scans validating or waiting for the gate
+ADMISSION_WORKERS = 2
+admission = None
+
+# Multi-gate mode: one process, one MQTT connection and one Firebase app drive
+# several lanes, each with its own topic, parking, pins, gate cycle and admission
+# queue. Leave LANES empty to run the single gate configured above.
+LANES = [
+    # {'name': 'north', 'parking_id': 'GnNyv7AD32nUPqtp9tvR',
+    #  'topic': 'parking/north/paymentQR', 'servo_pin': 18, 'led_red_pin': 23},
+    # {'name': 'south', 'parking_id': 'GnNyv7AD32nUPqtp9tvR',
+    #  'topic': 'parking/south/paymentQR', 'servo_pin': 12, 'led_red_pin': 24},
+]
+LANE_SUBSCRIPTIONS = ['parking/+/paymentQR']    # topic filters covering every lane topic
+lanes = {}      # lane topic -> GateLane
+
+# Startup: the red LED(s) stay on until the local dependencies (local store, MQTT
+# connection) are up; the controller is ready then, even with the uplink down,
+# since passes are checked against the local store. Firebase (TLS handshake and
+# OAuth token) and the reservation mirrors warm up alongside; until they have, the
+# red LED(s) flash briefly every DEGRADED_FLASH_INTERVAL. A cheap read every
+# FIREBASE_KEEPALIVE_INTERVAL then keeps the Firebase connection and token warm
+# for the first car after a quiet night.
+STARTUP_RETRY_INTERVAL = 5          # seconds between attempts of a failed startup step
+FIREBASE_KEEPALIVE_INTERVAL = 240   # seconds; below typical idle-connection timeouts
+DEGRADED_FLASH_INTERVAL = 2         # seconds between flashes while Firebase isn't warm
+DEGRADED_FLASH_TIME = 0.2           # seconds each flash lasts
+startup = None
+
+# Servo and LED commands run on their own timing thread
+actuators = ActuatorScheduler(name='entry-actuators')
+gate_started_at = 0.0
+led_busy_until = {}     # pin -> time.monotonic() its error blink ends
+
+# Local metrics endpoint (Prometheus text) at http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9101     # 0 disables the endpoint
+metrics = MetricsRegistry('entry')
+json_decode_time = metrics.stage('json_decode')
+firebase_get_time = metrics.stage('firebase_get')
+firebase_update_time = metrics.stage('firebase_update')
+firebase_consume_time = metrics.stage('firebase_consume')
+servo_cycle_time = metrics.stage('servo_cycle', buckets=CYCLE_BUCKETS)
+scans_received = metrics.counter('scans_total', 'QR scans received')
+scans_rejected = metrics.counter('rejects_total', 'Scans rejected by validation or expiry')
+dispatch_drops = metrics.counter('drops_total', 'Scans dropped', reason='dispatch_full')
+admission_drops = metrics.counter('drops_total', 'Scans dropped', reason='admission')
+repeat_drops = metrics.counter('drops_total', 'Scans dropped', reason='repeat')
+retained_drops = metrics.counter('drops_total', 'Scans dropped', reason='retained')
+not_ready_drops = metrics.counter('drops_total', 'Scans dropped', reason='not_ready')
+scan_errors = metrics.counter('errors_total', 'Errors while handling scans')
+metrics.register_stats('consume', pass_consumer.stats, 'Atomic consume counters')
+metrics.register_stats('startup', lambda: startup.stats() if startup else None,
+                       'Startup readiness')
+metrics.register_stats('dispatcher', lambda: dispatcher.stats() if dispatcher else None,
+                       'Dispatch stage counters')
+metrics.register_stats('scan_cache', scan_cache.stats, 'Seen-scan cache counters')
+metrics.register_stats('admission', lambda: admission.stats() if admission else None,
+                       'Admission queue counters')
+metrics.register_stats('mirror', lambda: {
+    'hits': sum(m.hits for m in qrcode_mirrors.values()),
+    'misses': sum(m.misses for m in qrcode_mirrors.values()),
+    'fallback_hits': sum(m.fallback_hits for m in qrcode_mirrors.values()),
+    'records': sum(len(m) for m in qrcode_mirrors.values())} if qrcode_mirrors else None,
+    'Reservation mirror counters')
+metrics.register_stats('journal', lambda: {'depth': local_store.journal_depth(),
+                                           'replayed': local_store.replayed,
+                                           'reconciled': local_store.reconciled,
+                                           'replay_errors': local_store.replay_errors}
+                       if local_store else None,
+                       'Access journal counters')
+
 # Initialize GPIO
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(SERVO_PIN, GPIO.OUT)
 GPIO.setup(LED_RED_PIN, GPIO.OUT)
 servo = GPIO.PWM(SERVO_PIN, 50)  # 50Hz PWM frequency
 servo.start(0)
+servos = {SERVO_PIN: servo}     # one PWM per servo pin, shared with the lanes
 
 # Initialize Firebase
 cred = credentials.Certificate(firebase_credentials_path)
 firebase_admin.initialize_app(cred, {'databaseURL': database_url})
 
-def move_servo(angle):
-    duty = 2 + (angle / 18)
-    servo.ChangeDutyCycle(duty)
-    time.sleep(1)
-    servo.ChangeDutyCycle(0)
-
 def blink_led(pin, duration):
-    GPIO.output(pin, GPIO.HIGH)
-    time.sleep(duration)
-    GPIO.output(pin, GPIO.LOW)
-    
-def gate_access_sequence():
-    """Handle the complete gate access sequence with 10-second blocking"""
-    global is_gate_processing
+    """Light the LED for duration seconds without blocking the caller"""
+    led_busy_until[pin] = time.monotonic() + duration
+    actuators.run_sequence(led_pulse_steps(GPIO, pin, duration),
+                           on_done=lambda: GPIO.output(pin, idle_led_level(pin)))
+
+def controller_ready_now():
+    return startup is None or startup.ready
+
+def idle_led_level(pin):
+    """Level a status LED returns to: the red LEDs stay on until the controller is ready"""
+    if pin in status_led_pins() and not controller_ready_now():
+        return GPIO.HIGH
+    return GPIO.LOW
+
+def start_gate_sequence():
+    """Open, hold and close the gate on the actuator thread.
+    Returns False if a gate sequence is already running."""
+    global is_gate_processing, gate_started_at
     
     with gate_access_lock:
+        if is_gate_processing:
+            return False
         is_gate_processing = True
-        print("Gate access sequence started - blocking new requests for 10 seconds")
+        gate_started_at = time.perf_counter()
+    
+    print(f"Gate access sequence started - blocking new requests for {GATE_HOLD_TIME} seconds")
+    print("Opening gate...")
+    steps = (servo_move_steps(servo, 90, SERVO_SETTLE_TIME) +
+             [(0, lambda: print(f"Gate open - waiting {GATE_HOLD_TIME} seconds...")),
+              (GATE_HOLD_TIME, lambda: print("Closing gate..."))] +
+             servo_move_steps(servo, 0, SERVO_SETTLE_TIME))
+    actuators.run_sequence(steps, on_done=gate_sequence_done)
+    return True
+
+def gate_sequence_done():
+    global is_gate_processing
+    
+    is_gate_processing = False
+    servo_cycle_time.observe(time.perf_counter() - gate_started_at)
+    print("Gate access sequence completed - ready for new requests")
+    if admission is not None:
+        admission.gate_free()
+
+def spot_rejection(parking_id, spot_number, user_id, spot_data):
+    """Reason the spot record doesn't admit user_id, or None when it does"""
+    if not spot_data:
+        return f"Spot {spot_number} not found in parking {parking_id}"
         
-        try:
-            # Open gate
-            print("Opening gate...")
-            move_servo(90)
-            
-            # Wait 10 seconds (gate stays open and blocks new requests)
-            print("Gate open - waiting 10 seconds...")
-            time.sleep(10)
-            
-            # Close gate
-            print("Closing gate...")
-            move_servo(0)
-            
-        except Exception as e:
-            print(f"Error in gate sequence: {e}")
-            # Ensure gate closes even if there's an error
-            move_servo(0)
+    # Check if user matches
+    if spot_data.get('userId') != user_id:
+        return "User ID doesn't match spot reservation"
         
-        finally:
-            is_gate_processing = False
-            print("Gate access sequence completed - ready for new requests")
- 
-def validate_parking_spot(parking_id, spot_number, user_id):
-    """Validate spot directly in parking structure"""
+    # Check if spot is active
+    if spot_data.get('status') != 'active':
+        return "Spot is not active"
+        
+    # Check expiry time
+    current_time = int(time.time() * 1000)
+    if current_time > spot_data.get('expiryTime', current_time + 10000):
+        return "Reservation has expired"
+    
+    # Check the pass wasn't just used (at this or another lane)
+    if current_time - spot_data.get('lastAccess', 0) < PASS_REUSE_WINDOW * 1000:
+        return "Pass was used moments ago"
+        
+    return None
+
+def mark_entry_access(spot_data):
+    spot_data['lastAccess'] = int(time.time() * 1000)
+    spot_data['accessCount'] = spot_data.get('accessCount', 0) + 1
+
+def consume_entry_pass(parking_id, spot_number, user_id, mirror):
+    """Validate the pass and record the access in one transaction. Returns the
+    consumed spot data, False when the pass is refused, or None when the
+    transaction failed and the pass has to be validated locally."""
+    if mirror is not None:
+        # The mirror turns invalid passes away without a round trip
+        reason = spot_rejection(parking_id, spot_number, user_id, mirror.get(spot_number))
+        if reason:
+            print(reason)
+            return False
+    try:
+        with firebase_consume_time.time():
+            return pass_consumer.consume(f"qrcode/{parking_id}/{spot_number}",
+                                         check=lambda data: spot_rejection(parking_id, spot_number, user_id, data),
+                                         record=mark_entry_access)
+    except PassRejected as e:
+        print(e)
+        return False
+    except ConsumeUnavailable as e:
+        print(f"{e} - validating locally")
+        return None
+    except Exception as e:
+        scan_errors.inc()
+        print(f"Atomic consume failed ({e}) - validating locally")
+        return None
+
+def validate_parking_spot(parking_id, spot_number, user_id, assigned_parking_id=None):
+    """Validate spot directly in parking structure.
+    Returns the spot data when valid, otherwise False."""
+    assigned_parking_id = assigned_parking_id or ASSIGNED_PARKING_ID
     try:
         # Check if this is the correct parking
-        if parking_id != ASSIGNED_PARKING_ID:
-            print(f"Wrong parking ID. Expected {ASSIGNED_PARKING_ID}, got {parking_id}")
+        if parking_id != assigned_parking_id:
+            print(f"Wrong parking ID. Expected {assigned_parking_id}, got {parking_id}")
             return False
-            
-        # Get spot data from Firebase
-        spot_ref = db.reference(f"qrcode/{parking_id}/{spot_number}")
-        spot_data = spot_ref.get()
         
-        if not spot_data:
-            print(f"Spot {spot_number} not found in parking {parking_id}")
-            return False
+        mirror = qrcode_mirrors.get(parking_id)
+        if ATOMIC_CONSUME and (mirror is None or mirror.is_fresh()):
+            spot_data = consume_entry_pass(parking_id, spot_number, user_id, mirror)
+            if spot_data is not None:
+                return spot_data
             
-        # Check if user matches
-        if spot_data.get('userId') != user_id:
-            print("User ID doesn't match spot reservation")
-            return False
-            
-        # Check if spot is active
-        if spot_data.get('status') != 'active':
-            print("Spot is not active")
-            return False
-            
-        # Check expiry time
-        current_time = int(time.time() * 1000)
-        if current_time > spot_data.get('expiryTime', current_time + 10000):
-            print("Reservation has expired")
+        # Get spot data from the live mirror, or from Firebase when it's disabled
+        # (the mirror times its own direct reads)
+        if mirror is not None:
+            spot_data = mirror.get(spot_number)
+        else:
+            with firebase_get_time.time():
+                spot_data = db.reference(f"qrcode/{parking_id}/{spot_number}").get()
+        
+        reason = spot_rejection(parking_id, spot_number, user_id, spot_data)
+        if reason:
+            print(reason)
             return False
             
-        return True
+        return spot_data
         
     except Exception as e:
+        scan_errors.inc()
         print(f"Validation error: {e}")
         return False
 
-def handle_qr_message(msg):
-    global is_gate_processing
-    
-    # Check if gate is currently processing
+def reservation_still_valid(scan, spot_data):
+    """Expiry re-check when a scan validated earlier reaches the gate"""
+    current_time = int(time.time() * 1000)
+    return current_time <= spot_data.get('expiryTime', current_time + 10000)
+
+def admit_vehicle(scan, spot_data):
     if is_gate_processing:
-        print("Gate is currently processing - ignoring new QR scan")
+        return False
+    print("Valid spot - initiating gate access sequence")
+    return start_gate_sequence()
+
+def record_entry_access(scan, spot_data):
+    """Record the access while the gate is opening"""
+    if isinstance(spot_data, ConsumedPass):
+        return      # recorded by the validating transaction
+    
+    parking_id, spot_number, _ = scan
+    path = f"qrcode/{parking_id}/{spot_number}"
+    # A timed-out transaction may still have recorded this access
+    token = pass_consumer.abandoned_token(path)
+    if local_store is not None:
+        local_store.journal_access(path,
+                                   sets={'lastAccess': int(time.time() * 1000)},
+                                   increments={'accessCount': 1},
+                                   unless=(CONSUME_TOKEN_FIELD, token) if token else None)
         return
     
     try:
-        payload = json.loads(msg.payload.decode())
-        print(f"Received QR data: {payload}")
+        with firebase_update_time.time():
+            if token and db.reference(f"{path}/{CONSUME_TOKEN_FIELD}").get() == token:
+                return
+            db.reference(path).update({
+                'lastAccess': int(time.time() * 1000),
+                'accessCount': firebase_admin.db.Increment(1)
+            })
+    except Exception as e:
+        scan_errors.inc()
+        print(f"Error updating Firebase: {e}")
+
+def reject_scan(scan, reason, led_pin=LED_RED_PIN):
+    scans_rejected.inc()
+    print(f"Invalid spot ({reason}) - showing error")
+    blink_led(led_pin, 3)
+
+def handle_qr_message(scan_msg, lane=None):
+    """Queue a decoded scan for validation, for the given lane in multi-gate mode"""
+    queue = lane.admission if lane is not None else admission
+    led_pin = lane.led_red_pin if lane is not None else LED_RED_PIN
+    try:
+        if LOG_SCANS:
+            print(f"Received QR data: {scan_msg}")
         
-        # Extract required fields
-        parking_id = payload.get('parkingId')
-        spot_number = payload.get('spotNumber')
-        user_id = payload.get('userId')
+        # The same pass scanned again (even with a different payload) is a repeat
+        scan = (scan_msg.parking_id, scan_msg.spot_id, scan_msg.user_id)
+        if scan_cache.seen(scan):
+            repeat_drops.inc()
+            print("Repeated scan - ignoring QR scan")
+            return
         
-        if validate_parking_spot(parking_id, spot_number, user_id):
-            print("Valid spot - initiating gate access sequence")
-            
-            # Update spot access time before starting gate sequence
-            try:
-                db.reference(f"qrcode/{parking_id}/{spot_number}").update({
-                    'lastAccess': int(time.time() * 1000),
-                    'accessCount': firebase_admin.db.Increment(1)
-                })
-            except Exception as e:
-                print(f"Error updating Firebase: {e}")
-            
-            # Start gate access sequence in a separate thread to avoid blocking MQTT
-            gate_thread = threading.Thread(target=gate_access_sequence)
-            gate_thread.daemon = True
-            gate_thread.start()
-            
-        else:
-            print("Invalid spot - showing error")
-            blink_led(LED_RED_PIN, 3)
+        # Validation starts right away, even while the gate is cycling
+        if not queue.submit(scan, scan):
+            admission_drops.inc()
+            print("Scan already pending or admission queue full - ignoring QR scan")
             
     except Exception as e:
+        scan_errors.inc()
         print(f"Error processing QR: {e}")
-        blink_led(LED_RED_PIN, 3)
+        blink_led(led_pin, 3)
 
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
         print("Connected to MQTT Broker!")
-        client.subscribe(qr_topic)
-        print(f"Subscribed to topic: {qr_topic}")
+        topics = (LANE_SUBSCRIPTIONS or list(lanes)) if lanes else [qr_topic]
+        for topic in topics:
+            client.subscribe(topic)
+            print(f"Subscribed to topic: {topic}")
+        if startup is not None:
+            startup.done('mqtt')
     else:
         print(f"Failed to connect, return code {rc}")
 
+def lane_for_topic(topic):
+    """Lane a message belongs to: exact lane topic first, then lane topic filters"""
+    lane = lanes.get(topic)
+    if lane is None:
+        for candidate in lanes.values():
+            if mqtt.topic_matches_sub(candidate.topic, topic):
+                return candidate
+    return lane
+
+def dispatch_scan(item):
+    lane, scan_msg = item
+    handle_qr_message(scan_msg, lane)
+
 def on_message(client, userdata, msg):
-    if msg.topic == qr_topic:
-        handle_qr_message(msg)
+    if lanes:
+        lane = lane_for_topic(msg.topic)
+        if lane is None:
+            return
+    elif msg.topic == qr_topic:
+        lane = None
+    else:
+        return
+    
+    scans_received.inc()
+    if IGNORE_RETAINED and msg.retain:
+        retained_drops.inc()
+        print("Ignoring retained QR message (redelivered on subscribe)")
+        return
+    # Checked before the repeat cache, so a pass rescanned once the controller
+    # is ready isn't dropped as a repeat
+    if not controller_ready_now():
+        not_ready_drops.inc()
+        print("Controller still starting - ignoring QR scan, scan again when the red LED goes off")
+        return
+    if scan_cache.seen(payload_key(msg.payload)):
+        repeat_drops.inc()
+        return
+    
+    # Malformed scans are rejected here, before they reach a dispatch worker
+    try:
+        with json_decode_time.time():
+            scan_msg = decode(EntryScan, msg.payload)
+    except PayloadError as e:
+        scans_rejected.inc()
+        print(f"Invalid QR payload: {e}")
+        blink_led(lane.led_red_pin if lane is not None else LED_RED_PIN, 3)
+        return
+    
+    if dispatcher is not None:
+        # Scans for the same spot on the same lane share a key so they are handled in order
+        key = f"{msg.topic}/{scan_msg.parking_id}/{scan_msg.spot_id}"
+        if not dispatcher.submit(key, (lane, scan_msg)):
+            dispatch_drops.inc()
+            print("Dispatch queue full - dropped QR scan")
+    else:
+        handle_qr_message(scan_msg, lane)
+
+def start_dispatcher():
+    global dispatcher
+    
+    if DISPATCH_WORKERS > 0:
+        dispatcher = KeyedDispatcher(dispatch_scan, workers=DISPATCH_WORKERS,
+                                     maxsize=DISPATCH_QUEUE_SIZE,
+                                     overflow=DISPATCH_OVERFLOW, name='entryacces')
+        dispatcher.start()
+
+def stop_dispatcher():
+    if dispatcher is not None:
+        dispatcher.stop()
+        print(f"Dispatcher stats: {dispatcher.stats()}")
+
+def start_admission():
+    global admission
+    
+    admission = AdmissionQueue(validate=lambda scan: validate_parking_spot(*scan),
+                               admit=admit_vehicle,
+                               recheck=reservation_still_valid,
+                               on_admitted=record_entry_access,
+                               on_rejected=reject_scan,
+                               depth=ADMISSION_QUEUE_DEPTH,
+                               workers=ADMISSION_WORKERS,
+                               name='entry-admission')
+
+def stop_admission():
+    if admission is not None:
+        admission.stop()
+        print(f"Admission stats: {admission.stats()}")
+
+def start_lane(config):
+    """Build one lane of multi-gate mode from its LANES entry"""
+    name = config['name']
+    parking_id = config['parking_id']
+    servo_pin = config['servo_pin']
+    led_pin = config['led_red_pin']
+    
+    if servo_pin not in servos:
+        GPIO.setup(servo_pin, GPIO.OUT)
+        servos[servo_pin] = GPIO.PWM(servo_pin, 50)
+        servos[servo_pin].start(0)
+    GPIO.setup(led_pin, GPIO.OUT)
+    
+    lane = GateLane(name, parking_id, config['topic'], servos[servo_pin], actuators,
+                    validate=lambda scan: validate_parking_spot(*scan, assigned_parking_id=parking_id),
+                    recheck=reservation_still_valid,
+                    on_admitted=record_entry_access,
+                    on_rejected=lambda scan, reason: reject_scan(scan, reason, led_pin),
+                    led_red_pin=led_pin,
+                    hold_time=GATE_HOLD_TIME,
+                    settle_time=SERVO_SETTLE_TIME,
+                    depth=ADMISSION_QUEUE_DEPTH,
+                    workers=ADMISSION_WORKERS)
+    lane.on_cycle = servo_cycle_time.observe
+    metrics.register_stats(f"lane_{name}_admission", lane.admission.stats,
+                           f"Admission queue counters for lane {name}")
+    print(f"Lane {name}: parking {parking_id} on {config['topic']} "
+          f"(servo GPIO {servo_pin}, LED GPIO {led_pin})")
+    return lane
+
+def start_lanes():
+    for config in LANES:
+        lane = start_lane(config)
+        lanes[lane.topic] = lane
+
+def stop_lanes():
+    for lane in lanes.values():
+        lane.stop()
+        print(f"Lane {lane.name} admission stats: {lane.admission.stats()}")
+
+def served_parking_ids():
+    if LANES:
+        return sorted({config['parking_id'] for config in LANES})
+    return [ASSIGNED_PARKING_ID]
+
+def start_local_store():
+    global local_store
+    
+    if USE_LOCAL_STORE:
+        local_store = LocalStore(LOCAL_STORE_PATH, replay_interval=JOURNAL_REPLAY_INTERVAL)
+        local_store.start()
+
+def stop_local_store():
+    if local_store is not None:
+        local_store.stop()
+
+def start_qrcode_mirror():
+    """Mirror qrcode/{parking} for every parking this controller serves"""
+    if USE_QRCODE_MIRROR:
+        for parking_id in served_parking_ids():
+            if parking_id in qrcode_mirrors:
+                continue
+            mirror = RTDBMirror(f"qrcode/{parking_id}",
+                                max_age=QRCODE_MIRROR_MAX_AGE,
+                                resync_interval=QRCODE_MIRROR_RESYNC)
+            mirror.read_stage = firebase_get_time
+            if local_store is not None:
+                local_store.attach(f"qrcode/{parking_id}", mirror)
+            # Published before start(), which can block with the uplink down: until
+            # the mirror syncs, passes are checked against the local store
+            qrcode_mirrors[parking_id] = mirror
+            mirror.start()
+
+def warm_qrcode_mirrors():
+    """Startup step: start the mirrors and wait for their initial snapshots"""
+    start_qrcode_mirror()
+    return all(mirror.wait_ready(STARTUP_RETRY_INTERVAL) for mirror in list(qrcode_mirrors.values()))
+
+def stop_qrcode_mirror():
+    for mirror in qrcode_mirrors.values():
+        mirror.stop()
+
+def warm_firebase():
+    """Read a node that doesn't exist: pays for the TLS handshake and the OAuth
+    token without downloading anything"""
+    db.reference(f"qrcode/{served_parking_ids()[0]}/_warmup").get()
+
+def status_led_pins():
+    return {LED_RED_PIN} | {config['led_red_pin'] for config in LANES}
+
+def local_store_open():
+    return not USE_LOCAL_STORE or local_store is not None
+
+def controller_warm_now():
+    return startup is None or startup.warm
+
+def flash_degraded():
+    """Flash the red LED(s) every DEGRADED_FLASH_INTERVAL while ready but not warm"""
+    if controller_ready_now() and not controller_warm_now():
+        for pin in status_led_pins():
+            # Not over an error blink, which it would cut short
+            if time.monotonic() >= led_busy_until.get(pin, 0.0):
+                actuators.run_sequence(led_pulse_steps(GPIO, pin, DEGRADED_FLASH_TIME))
+        actuators.call_later(DEGRADED_FLASH_INTERVAL, flash_degraded)
+
+def controller_ready():
+    for pin in status_led_pins():
+        GPIO.output(pin, GPIO.LOW)
+    if controller_warm_now():
+        print("Controller ready")
+    else:
+        print("Controller ready (degraded) - Firebase not warm yet, passes checked locally")
+        flash_degraded()
+
+def controller_warm():
+    print("Firebase and mirrors are warm")
+
+def start_startup():
+    """Bring the local store and MQTT up, red LED on until they're ready, with
+    Firebase and the mirrors warming up concurrently"""
+    global startup
+    
+    startup = WarmStartup(retry_interval=STARTUP_RETRY_INTERVAL,
+                          keepalive_interval=FIREBASE_KEEPALIVE_INTERVAL,
+                          name='entry-startup')
+    startup.step('store', local_store_open)
+    startup.step('mqtt')    # completed by on_connect
+    startup.step('firebase', warm_firebase, required=False)
+    if USE_QRCODE_MIRROR:
+        startup.step('mirrors', warm_qrcode_mirrors, required=False)
+    startup.keepalive('firebase', warm_firebase)
+    startup.on_ready = controller_ready
+    startup.on_warm = controller_warm
+    for pin in status_led_pins():
+        GPIO.output(pin, GPIO.HIGH)
+    startup.start()
+
+def stop_startup():
+    if startup is not None:
+        startup.stop()
+
+def start_metrics():
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT, METRICS_HOST)
 
 def main():
     client = mqtt.Client()
@@ -176,17 +626,44 @@ def main():
     client.on_message = on_message
     
     try:
-        print(f"Parking Controller for: {ASSIGNED_PARKING_ID}")
+        print(f"Parking Controller for: {', '.join(served_parking_ids())}")
+        start_metrics()
+        actuators.start()
+        start_local_store()
+        if LANES:
+            start_lanes()
+        else:
+            start_admission()
+        start_dispatcher()
+        start_startup()
         print("Starting MQTT client...")
-        client.connect(broker, port, 60)
-        client.loop_forever()
+        client.connect_async(broker, port, 60)
+        client.loop_forever(retry_first_connection=True)
     except KeyboardInterrupt:
         print("\nShutting down...")
-        servo.stop()
+        stop_startup()
+        stop_dispatcher()
+        stop_lanes()
+        stop_admission()
+        stop_qrcode_mirror()
+        stop_local_store()
+        actuators.stop()
+        metrics.stop()
+        for pwm in servos.values():
+            pwm.stop()
         GPIO.cleanup()
     except Exception as e:
         print(f"Error: {e}")
-        servo.stop()
+        stop_startup()
+        stop_dispatcher()
+        stop_lanes()
+        stop_admission()
+        stop_qrcode_mirror()
+        stop_local_store()
+        actuators.stop()
+        metrics.stop()
+        for pwm in servos.values():
+            pwm.stop()
         GPIO.cleanup()
 
 if __name__ == "__main__":
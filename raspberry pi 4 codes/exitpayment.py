@@ -1,13 +1,26 @@
 import cv2
-from pyzbar import pyzbar
 import firebase_admin
 from firebase_admin import credentials, db
-import json
 import time
 import RPi.GPIO as GPIO
 import threading
 import numpy as np
 import sys
+from framecapture import LatestFrameCapture
+from qrdecoder import QRDecoder
+from multicamera import CameraWorker
+from cameradiscovery import CameraDiscovery
+from dedup import SeenCache, payload_key
+from passtracker import PassTracker, PENDING, ADMITTED, REFUSED
+from payloads import ExitPass, PayloadError, decode
+from passconsume import PassRejected, ConsumedPass, ConsumeUnavailable, PassConsumer, CONSUME_TOKEN_FIELD
+from gateindicator import GateIndicator, STARTING, STANDBY, ACCESS, DEGRADED
+from actuators import ActuatorScheduler, servo_move_steps
+from admission import AdmissionQueue
+from rtdbmirror import RTDBMirror
+from localstore import LocalStore
+from metrics import MetricsRegistry, CYCLE_BUCKETS
+from startup import WarmStartup
 
 # Hardware Configuration
 SERVO_PIN = 18       # GPIO pin for servo motor
@@ -18,21 +31,139 @@ LED_BLUE_PIN = 24    # GPIO pin for blue LED (add this pin)
 firebase_credentials_path = 'Your Firebase Admin SDK JSON file path here'
 database_url = 'Your Firebase Realtime Database URL here'
 
+# QR decode path
+QR_DECODE_ROI = None            # (x, y, width, height) where drivers present phones, None = full frame
+QR_DECODE_DOWNSCALE = 0.5       # first-pass scale, misses are retried at full resolution
+QR_SKIP_STATIC_FRAMES = True    # skip decoding when frame differencing shows a static scene
+QR_MOTION_THRESHOLD = 2.0       # mean gray-level change that counts as motion
+QR_STATIC_REFRESH = 10          # static frames skipped at most before decoding anyway
+LOG_SCANS = False               # print every decoded pass in full, user ID included (debugging only)
+
+# Headless mode (no preview window) reports a stats line at this interval
+HEADLESS_STATS_INTERVAL = 30    # seconds
+
+# Multi-camera scanning: each camera is captured on its own thread and decoded in
+# its own process; all results share the repeat debounce, admission queue and gate
+SCAN_CAMERAS = []       # camera indices to scan together, e.g. [0, 2]; 'all' = every camera found
+
+# Camera discovery: cameras that worked last time are tried first, then the
+# /dev/video* capture devices are probed in parallel
+CAMERA_CACHE_PATH = 'camera_cache.json'
+CAMERA_PROBE_TIMEOUT = 3.0      # seconds before a camera that won't deliver a frame is skipped
+
 # This Raspberry Pi's Assigned Parking
 ASSIGNED_PARKING_ID = "Your_Assigned_Parking_ID_Here"
 
+# Exit validation mirror (serves payment_qrcodes/{ASSIGNED_PARKING_ID} from memory)
+USE_PAYMENT_MIRROR = True
+PAYMENT_MIRROR_MAX_AGE = 300    # seconds without a sync before falling back to direct reads
+PAYMENT_MIRROR_RESYNC = 120     # seconds between full snapshot refreshes
+payment_mirror = None
+
+# Atomic validate-and-consume: a valid pass is checked and its exit recorded in
+# one RTDB transaction on payment_qrcodes/{parking}/{spot}, so it can't open the
+# gate twice. A fresh mirror still rejects invalid passes without a round trip;
+# while the mirror is stale (uplink down), or a transaction gets no answer within
+# CONSUME_TIMEOUT, passes are validated locally and their exit journaled instead.
+# Off by default: the transaction is a GET plus a conditional PUT on every exit,
+# where the mirror answers from memory. Turn it on where several gates share
+# passes and a double exit costs more than two round trips.
+ATOMIC_CONSUME = False
+CONSUME_TIMEOUT = 2         # seconds before a transaction is abandoned and the pass validated locally
+CONSUME_BACKOFF = 30        # seconds transactions are skipped after a timeout
+PASS_REUSE_WINDOW = 10      # seconds after an exit during which the pass is refused
+pass_consumer = PassConsumer(timeout=CONSUME_TIMEOUT, backoff=CONSUME_BACKOFF)
+
+# Offline-first local store: payments persisted from the mirror (SQLite, WAL)
+# and an exit journal replayed to Firebase when the uplink is available
+USE_LOCAL_STORE = True
+LOCAL_STORE_PATH = 'exit_store.db'
+JOURNAL_REPLAY_INTERVAL = 5     # seconds between journal replays
+local_store = None
+
+# Startup: both LEDs are lit until the local dependencies (local store, camera)
+# are up; the gate is ready then, even with the uplink down, since passes are
+# checked against the local store. The Firebase connection (TLS handshake and
+# OAuth token) and the payment mirror warm up alongside; until they have, the red
+# LED flashes (degraded). A cheap read every FIREBASE_KEEPALIVE_INTERVAL then
+# keeps the connection and token warm for the first car after a quiet night.
+STARTUP_RETRY_INTERVAL = 5          # seconds between attempts of a failed startup step
+FIREBASE_KEEPALIVE_INTERVAL = 240   # seconds; below typical idle-connection timeouts
+startup = None
+
 # Gate access control
+GATE_HOLD_TIME = 10       # seconds the gate stays open
+SERVO_SETTLE_TIME = 1     # seconds the servo gets to reach its position
 gate_access_lock = threading.Lock()
 is_gate_processing = False
 
-# QR Code scanning control
-last_qr_data = None
-last_detection_time = 0
+# Passes scanned during a gate cycle are validated right away and admitted
+# back-to-back once the gate is free
+ADMISSION_QUEUE_DEPTH = 3     # passes validating or waiting for the gate
+ADMISSION_WORKERS = 2
+admission = None
+
+# Servo commands run on their own timing thread
+actuators = ActuatorScheduler(name='exit-actuators')
+gate_started_at = 0.0
+
+# QR decoder (single camera) or camera workers (multi-camera) of the running scanner
+qr_decoder = None
+camera_workers = []
 
-# LED status control
-led_status_lock = threading.Lock()
-led_status_thread = None
-stop_led_thread = False
+# Local metrics endpoint (Prometheus text) at http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9102     # 0 disables the endpoint
+metrics = MetricsRegistry('exit')
+json_decode_time = metrics.stage('json_decode')
+qr_decode_time = metrics.stage('qr_decode')
+firebase_get_time = metrics.stage('firebase_get')
+firebase_update_time = metrics.stage('firebase_update')
+firebase_consume_time = metrics.stage('firebase_consume')
+servo_cycle_time = metrics.stage('servo_cycle', buckets=CYCLE_BUCKETS)
+scans_received = metrics.counter('scans_total', 'QR scans handled (after the repeat debounce)')
+scans_rejected = metrics.counter('rejects_total', 'Passes rejected by validation or expiry')
+admission_drops = metrics.counter('drops_total', 'Passes dropped', reason='admission')
+repeat_drops = metrics.counter('drops_total', 'Passes dropped', reason='repeat')
+not_ready_drops = metrics.counter('drops_total', 'Passes dropped', reason='not_ready')
+scan_errors = metrics.counter('errors_total', 'Errors while handling passes')
+metrics.register_stats('scan_cache', lambda: scan_cache.stats(), 'Seen-pass cache counters')
+metrics.register_stats('admission', lambda: admission.stats() if admission else None,
+                       'Admission queue counters')
+metrics.register_stats('decoder', lambda: scanner_decoder_stats(), 'QR decoder counters')
+metrics.register_stats('consume', pass_consumer.stats, 'Atomic consume counters')
+metrics.register_stats('startup', lambda: startup.stats() if startup else None,
+                       'Startup readiness')
+metrics.register_stats('mirror', lambda: {'hits': payment_mirror.hits, 'misses': payment_mirror.misses,
+                                          'fallback_hits': payment_mirror.fallback_hits,
+                                          'records': len(payment_mirror)} if payment_mirror else None,
+                       'Payment mirror counters')
+metrics.register_stats('journal', lambda: {'depth': local_store.journal_depth(),
+                                           'replayed': local_store.replayed,
+                                           'reconciled': local_store.reconciled,
+                                           'replay_errors': local_store.replay_errors}
+                       if local_store else None,
+                       'Exit journal counters')
+
+# QR Code scanning control: a pass seen again within the window (same QR text,
+# or same parking/spot/user) is ignored, whichever camera saw it. Every sighting
+# restarts the window, which lasts at least a gate cycle plus the reuse window, so
+# a phone held in view isn't resubmitted while the gate is open or admitted twice
+SCAN_REPEAT_WINDOW = 5.0    # seconds
+SCAN_CACHE_SIZE = 256       # recent passes remembered
+scan_cache = SeenCache(ttl=max(SCAN_REPEAT_WINDOW,
+                               GATE_HOLD_TIME + 2 * SERVO_SETTLE_TIME + PASS_REUSE_WINDOW),
+                       maxsize=SCAN_CACHE_SIZE, refresh=True)
+
+# Validation runs on the admission workers; the camera loop only submits passes.
+# A code whose pass is still being validated is not submitted again, and the
+# preview colours each code by its pass's outcome (yellow pending, blue admitted,
+# red refused)
+PASS_OUTCOME_TTL = 10.0     # seconds an outcome stays on the preview
+PASS_PENDING_TIMEOUT = 30.0  # seconds before a pass with no outcome can be submitted again
+pass_tracker = PassTracker(ttl=PASS_OUTCOME_TTL, pending_timeout=PASS_PENDING_TIMEOUT)
+# Overlay colours (BGR) by pass state; codes that aren't tracked stay green
+PASS_COLORS = {None: (0, 255, 0), PENDING: (0, 255, 255), ADMITTED: (255, 0, 0), REFUSED: (0, 0, 255)}
 
 # Initialize GPIO
 GPIO.setmode(GPIO.BCM)
@@ -42,106 +173,138 @@ GPIO.setup(LED_BLUE_PIN, GPIO.OUT)
 servo = GPIO.PWM(SERVO_PIN, 50)  # 50Hz PWM frequency
 servo.start(0)
 
+# LED status control (red = standby, blue = gate open)
+indicator = GateIndicator(GPIO, LED_RED_PIN, LED_BLUE_PIN)
+
 # Initialize Firebase
 cred = credentials.Certificate(firebase_credentials_path)
 firebase_admin.initialize_app(cred, {'databaseURL': database_url})
 
-def led_status_controller():
-    """Control LED status - red by default, blue for 10 seconds on access"""
-    global stop_led_thread, is_gate_processing
-    
-    print("🔴 Starting LED status controller - Red LED active")
-    
-    while not stop_led_thread:
-        with led_status_lock:
-            if is_gate_processing:
-                # Turn on blue LED, turn off red LED
-                GPIO.output(LED_BLUE_PIN, GPIO.HIGH)
-                GPIO.output(LED_RED_PIN, GPIO.LOW)
-            else:
-                # Turn on red LED, turn off blue LED
-                GPIO.output(LED_RED_PIN, GPIO.HIGH)
-                GPIO.output(LED_BLUE_PIN, GPIO.LOW)
-        
-        time.sleep(0.1)  # Check status every 100ms
-    
-    # Turn off both LEDs when stopping
-    GPIO.output(LED_RED_PIN, GPIO.LOW)
-    GPIO.output(LED_BLUE_PIN, GPIO.LOW)
-    print("🔴 LED status controller stopped")
+def scanner_decoder_stats():
+    """Decoder counters of the running scanner, summed over cameras in multi-camera mode"""
+    if qr_decoder is not None:
+        return qr_decoder.stats()
+    if not camera_workers:
+        return None
+    totals = {}
+    for worker in camera_workers:
+        for key, value in worker.decoder_stats.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
 
-def start_led_controller():
-    """Start the LED status controller thread"""
-    global led_status_thread, stop_led_thread
-    
-    stop_led_thread = False
-    led_status_thread = threading.Thread(target=led_status_controller)
-    led_status_thread.daemon = True
-    led_status_thread.start()
+def start_led_controller(state=STANDBY):
+    """Start the LED status state machine in state"""
+    if state == STARTING:
+        print("🟣 Starting LED status controller - Red and blue LEDs active until the gate is ready")
+    else:
+        print("🔴 Starting LED status controller - Red LED active")
+    indicator.start(state)
 
 def stop_led_controller():
-    """Stop the LED status controller thread"""
-    global stop_led_thread, led_status_thread
-    
-    stop_led_thread = True
-    if led_status_thread and led_status_thread.is_alive():
-        led_status_thread.join(timeout=1.0)
-
-def move_servo(angle):
-    """Move servo to specified angle"""
-    duty = 2 + (angle / 18)
-    servo.ChangeDutyCycle(duty)
-    time.sleep(1)
-    servo.ChangeDutyCycle(0)
+    """Stop the LED status state machine and switch both LEDs off"""
+    indicator.stop()
+    print("🔴 LED status controller stopped")
 
 def blink_led(pin, duration):
-    """Blink LED for specified duration (for error indication)"""
-    # Temporarily override LED controller for error indication
-    with led_status_lock:
-        GPIO.output(LED_RED_PIN, GPIO.LOW)
-        GPIO.output(LED_BLUE_PIN, GPIO.LOW)
-        
-        # Blink the specified LED
-        for _ in range(int(duration)):
-            GPIO.output(pin, GPIO.HIGH)
-            time.sleep(0.5)
-            GPIO.output(pin, GPIO.LOW)
-            time.sleep(0.5)
-    
-def gate_access_sequence():
-    """Handle the complete gate access sequence with 10-second blocking"""
-    global is_gate_processing
+    """Blink LED for specified duration (for error indication) without blocking"""
+    # The indicator overrides the status LEDs for the blink, then restores them
+    indicator.blink(pin, int(duration))
+    
+def start_gate_sequence():
+    """Open, hold and close the exit gate on the actuator thread.
+    Returns False if a gate sequence is already running."""
+    global is_gate_processing, gate_started_at
     
     with gate_access_lock:
+        if is_gate_processing:
+            return False
         is_gate_processing = True
-        print("🚪 Exit gate access sequence started - LED changing to BLUE")
-        print("🔵 Blue LED active - blocking new requests for 10 seconds")
+        gate_started_at = time.perf_counter()
+    
+    indicator.set_state(ACCESS)
+    print("🚪 Exit gate access sequence started - LED changing to BLUE")
+    print(f"🔵 Blue LED active - blocking new requests for {GATE_HOLD_TIME} seconds")
+    print("🔓 Opening exit gate...")
+    steps = (servo_move_steps(servo, 90, SERVO_SETTLE_TIME) +
+             [(0, lambda: print(f"⏳ Exit gate open - waiting {GATE_HOLD_TIME} seconds...")),
+              (GATE_HOLD_TIME, lambda: print("🔒 Closing exit gate..."))] +
+             servo_move_steps(servo, 0, SERVO_SETTLE_TIME))
+    actuators.run_sequence(steps, on_done=gate_sequence_done)
+    return True
+
+def gate_sequence_done():
+    global is_gate_processing
+    
+    is_gate_processing = False
+    servo_cycle_time.observe(time.perf_counter() - gate_started_at)
+    indicator.set_state(idle_state())
+    print("✅ Exit gate access sequence completed - LED returning to RED")
+    print("🔴 Red LED active - ready for new requests")
+    if admission is not None:
+        admission.gate_free()
+ 
+def payment_rejection(parking_id, spot_id, user_id, payment_data):
+    """Reason the payment record doesn't let user_id out, or None when it does"""
+    if not payment_data:
+        return f"Payment data not found for spot {spot_id} in parking {parking_id}"
         
-        try:
-            # Open gate
-            print("🔓 Opening exit gate...")
-            move_servo(90)
-            
-            # Wait 10 seconds (gate stays open, LED stays blue)
-            print("⏳ Exit gate open - waiting 10 seconds...")
-            time.sleep(10)
-            
-            # Close gate
-            print("🔒 Closing exit gate...")
-            move_servo(0)
-            
-        except Exception as e:
-            print(f"❌ Error in exit gate sequence: {e}")
-            # Ensure gate closes even if there's an error
-            move_servo(0)
+    # Check if user matches
+    if payment_data.get('userId') != user_id:
+        return f"User ID doesn't match. Expected {payment_data.get('userId')}, got {user_id}"
         
-        finally:
-            is_gate_processing = False
-            print("✅ Exit gate access sequence completed - LED returning to RED")
-            print("🔴 Red LED active - ready for new requests")
- 
+    # Check if payment is active
+    if payment_data.get('status') != 'active':
+        return f"Payment status is not active: {payment_data.get('status')}"
+    
+    # Check if payment type matches
+    if payment_data.get('type') != 'payment_exit':
+        return f"Payment type mismatch. Expected 'payment_exit', got {payment_data.get('type')}"
+        
+    # Check expiry time
+    current_time = int(time.time() * 1000)
+    expiry_time = payment_data.get('expiryTime', 0)
+    if current_time > expiry_time:
+        return f"Payment has expired. Current: {current_time}, Expiry: {expiry_time}"
+    
+    # Check the pass didn't just open the gate
+    if current_time - payment_data.get('lastExitAccess', 0) < PASS_REUSE_WINDOW * 1000:
+        return "Pass was used moments ago"
+        
+    return None
+
+def mark_exit_access(payment_data):
+    payment_data['lastExitAccess'] = int(time.time() * 1000)
+    payment_data['exitAccessCount'] = payment_data.get('exitAccessCount', 0) + 1
+
+def consume_exit_pass(parking_id, spot_id, user_id):
+    """Validate the pass and record the exit in one transaction. Returns the
+    consumed payment data, False when the pass is refused, or None when the
+    transaction failed and the pass has to be validated locally."""
+    if payment_mirror is not None:
+        # The mirror turns invalid passes away without a round trip
+        reason = payment_rejection(parking_id, spot_id, user_id, payment_mirror.get(spot_id))
+        if reason:
+            print(f"❌ {reason}")
+            return False
+    try:
+        with firebase_consume_time.time():
+            return pass_consumer.consume(f"payment_qrcodes/{parking_id}/{spot_id}",
+                                         check=lambda data: payment_rejection(parking_id, spot_id, user_id, data),
+                                         record=mark_exit_access)
+    except PassRejected as e:
+        print(f"❌ {e}")
+        return False
+    except ConsumeUnavailable as e:
+        print(f"⚠️  {e} - validating locally")
+        return None
+    except Exception as e:
+        scan_errors.inc()
+        print(f"⚠️  Atomic consume failed ({e}) - validating locally")
+        return None
+
 def validate_exit_payment(parking_id, spot_id, user_id, payment_type):
-    """Validate exit payment in payment_qrcodes structure"""
+    """Validate exit payment in payment_qrcodes structure.
+    Returns the payment data when valid, otherwise False."""
     try:
         # Check if this is the correct parking
         if parking_id != ASSIGNED_PARKING_ID:
@@ -152,122 +315,154 @@ def validate_exit_payment(parking_id, spot_id, user_id, payment_type):
         if payment_type != "payment_exit":
             print(f"❌ Wrong payment type. Expected 'payment_exit', got '{payment_type}'")
             return False
-            
-        # Get payment data from Firebase using the new path structure
-        payment_ref = db.reference(f"payment_qrcodes/{parking_id}/{spot_id}")
-        payment_data = payment_ref.get()
         
-        if not payment_data:
-            print(f"❌ Payment data not found for spot {spot_id} in parking {parking_id}")
-            return False
-            
-        # Check if user matches
-        if payment_data.get('userId') != user_id:
-            print(f"❌ User ID doesn't match. Expected {payment_data.get('userId')}, got {user_id}")
-            return False
+        payment_data = None
+        if ATOMIC_CONSUME and (payment_mirror is None or payment_mirror.is_fresh()):
+            payment_data = consume_exit_pass(parking_id, spot_id, user_id)
+        
+        if payment_data is None:
+            # Get payment data from the live mirror, or from Firebase when it's disabled
+            # (the mirror times its own direct reads)
+            if payment_mirror is not None:
+                payment_data = payment_mirror.get(spot_id)
+            else:
+                with firebase_get_time.time():
+                    payment_data = db.reference(f"payment_qrcodes/{parking_id}/{spot_id}").get()
             
-        # Check if payment is active
-        if payment_data.get('status') != 'active':
-            print(f"❌ Payment status is not active: {payment_data.get('status')}")
+            reason = payment_rejection(parking_id, spot_id, user_id, payment_data)
+            if reason:
+                print(f"❌ {reason}")
+                return False
+        elif not payment_data:
             return False
         
-        # Check if payment type matches
-        if payment_data.get('type') != 'payment_exit':
-            print(f"❌ Payment type mismatch. Expected 'payment_exit', got {payment_data.get('type')}")
-            return False
-            
-        # Check expiry time
         current_time = int(time.time() * 1000)
         expiry_time = payment_data.get('expiryTime', 0)
-        
-        if current_time > expiry_time:
-            print(f"❌ Payment has expired. Current: {current_time}, Expiry: {expiry_time}")
-            return False
-        
         print(f"✅ Valid exit payment found:")
         print(f"  - Payment ID: {payment_data.get('paymentId')}")
         print(f"  - Money Paid: {payment_data.get('moneyPaid')}")
         print(f"  - Expiry Time: {expiry_time}")
         print(f"  - Time remaining: {(expiry_time - current_time) / 1000 / 60:.1f} minutes")
         
-        return True
+        return payment_data
         
     except Exception as e:
+        scan_errors.inc()
         print(f"❌ Exit validation error: {e}")
         return False
 
-def handle_qr_data(qr_data):
-    """Process QR code data and execute gate control"""
-    global is_gate_processing, last_qr_data, last_detection_time
-    
-    current_time = time.time()
-    
-    # Check if gate is currently processing
+def payment_still_valid(scan, payment_data):
+    """Expiry re-check when a pass validated earlier reaches the gate"""
+    return int(time.time() * 1000) <= payment_data.get('expiryTime', 0)
+
+def admit_vehicle(scan, payment_data):
     if is_gate_processing:
-        print("🚪 Exit gate is currently processing - ignoring new QR scan")
+        return False
+    print("✅ Valid exit payment - initiating gate access sequence")
+    if not start_gate_sequence():
+        return False
+    pass_tracker.resolved(scan, ADMITTED)
+    return True
+
+def record_exit_access(scan, payment_data):
+    """Record the exit while the gate is opening"""
+    if isinstance(payment_data, ConsumedPass):
+        print("📝 Exit access recorded with the validation")
         return
     
-    # Check if this is the same QR code scanned recently (within 5 seconds)
-    if (qr_data == last_qr_data and 
-        current_time - last_detection_time < 5.0):
-        return  # Ignore duplicate scans
+    parking_id, spot_id, _, _ = scan
+    path = f"payment_qrcodes/{parking_id}/{spot_id}"
+    # A timed-out transaction may still have recorded this exit
+    token = pass_consumer.abandoned_token(path)
+    if local_store is not None:
+        local_store.journal_access(path,
+                                   sets={'lastExitAccess': int(time.time() * 1000)},
+                                   increments={'exitAccessCount': 1},
+                                   unless=(CONSUME_TOKEN_FIELD, token) if token else None)
+        print("📝 Exit access journaled for Firebase")
+        return
+    
+    try:
+        with firebase_update_time.time():
+            if token and db.reference(f"{path}/{CONSUME_TOKEN_FIELD}").get() == token:
+                print("📝 Exit access already recorded by the timed-out validation")
+                return
+            db.reference(path).update({
+                'lastExitAccess': int(time.time() * 1000),
+                'exitAccessCount': firebase_admin.db.Increment(1)
+            })
+        print("📝 Updated exit access timestamp in Firebase")
+    except Exception as e:
+        scan_errors.inc()
+        print(f"❌ Error updating Firebase: {e}")
+
+def reject_pass(scan, reason):
+    pass_tracker.resolved(scan, REFUSED)
+    scans_rejected.inc()
+    print(f"❌ Invalid exit payment ({reason}) - showing error")
+    blink_led(LED_RED_PIN, 3)
+
+def handle_qr_data(qr_data):
+    """Process QR code data and queue it for validation and gate control"""
+    # Ignore the same QR code scanned recently; error blinks no longer block,
+    # so every outcome counts toward the repeat window
+    code_key = payload_key(qr_data)
+    # Until the gate is ready (both LEDs on) codes are ignored, before the
+    # repeat cache so the same code is picked up as soon as it is
+    if not gate_ready_now():
+        not_ready_drops.inc()
+        return
+    if scan_cache.seen(code_key):
+        repeat_drops.inc()
+        return
+    scans_received.inc()
     
     try:
-        # Try to parse QR data as JSON
-        payload = json.loads(qr_data)
-        print(f"🎯 Received exit QR data: {payload}")
+        # Parse and check the QR data against the exit pass schema
+        with json_decode_time.time():
+            exit_pass = decode(ExitPass, qr_data)
+        if LOG_SCANS:
+            print(f"🎯 Received exit QR data: {exit_pass}")
         
-        # Extract required fields for exit
-        parking_id = payload.get('parkingId')
-        spot_id = payload.get('spotId')  # Note: spotId instead of spotNumber
-        user_id = payload.get('userId')
-        payment_type = payload.get('type')
+        parking_id = exit_pass.parking_id
+        spot_id = exit_pass.spot_id
+        user_id = exit_pass.user_id
+        payment_type = exit_pass.type
         
-        # Validate required fields
-        if not all([parking_id, spot_id, user_id, payment_type]):
-            print("❌ Missing required fields in QR data")
-            blink_led(LED_RED_PIN, 3)
+        # The same pass shown again (even as a different QR code) is a repeat
+        if scan_cache.seen((parking_id, spot_id, user_id)):
+            repeat_drops.inc()
+            print("🚦 Pass seen moments ago - ignoring QR scan")
             return
         
-        if validate_exit_payment(parking_id, spot_id, user_id, payment_type):
-            print("✅ Valid exit payment - initiating gate access sequence")
-            
-            # Update payment access time before starting gate sequence
-            try:
-                db.reference(f"payment_qrcodes/{parking_id}/{spot_id}").update({
-                    'lastExitAccess': int(time.time() * 1000),
-                    'exitAccessCount': firebase_admin.db.Increment(1)
-                })
-                print("📝 Updated exit access timestamp in Firebase")
-            except Exception as e:
-                print(f"❌ Error updating Firebase: {e}")
-            
-            # Update last detection time and data
-            last_qr_data = qr_data
-            last_detection_time = current_time
-            
-            # Start gate access sequence in a separate thread to avoid blocking camera
-            gate_thread = threading.Thread(target=gate_access_sequence)
-            gate_thread.daemon = True
-            gate_thread.start()
-            
+        # Validation starts right away, even while the gate is cycling
+        scan = (parking_id, spot_id, user_id, payment_type)
+        pass_tracker.submitted(code_key, scan)
+        if admission.submit(scan, scan):
+            if is_gate_processing:
+                print("🚦 Exit gate busy - pass queued for validation and admission")
         else:
-            print("❌ Invalid exit payment - showing error")
-            blink_led(LED_RED_PIN, 3)
-            last_qr_data = qr_data
-            last_detection_time = current_time
+            pass_tracker.forget(code_key)
+            admission_drops.inc()
+            print("🚦 Pass already pending or admission queue full - ignoring QR scan")
             
-    except json.JSONDecodeError as e:
-        print(f"❌ QR data is not valid JSON: {qr_data}")
-        print(f"❌ JSON decode error: {e}")
+    except PayloadError as e:
+        scans_rejected.inc()
+        print(f"❌ Invalid QR data: {qr_data if LOG_SCANS else code_key.hex()}")
+        print(f"❌ {e}")
         blink_led(LED_RED_PIN, 3)
     except Exception as e:
+        scan_errors.inc()
         print(f"❌ Error processing QR code: {e}")
         blink_led(LED_RED_PIN, 3)
 
 def draw_qr_overlay(frame, qr_codes):
-    """Draw bounding boxes and data on detected QR codes"""
+    """Draw bounding boxes and data on detected QR codes, coloured by pass outcome"""
     for qr_code in qr_codes:
+        # Decode the QR code data
+        qr_data = qr_code.data.decode('utf-8')
+        color = PASS_COLORS[pass_tracker.state(payload_key(qr_data))]
+        
         # Get the bounding box coordinates
         points = qr_code.polygon
         
@@ -278,14 +473,11 @@ def draw_qr_overlay(frame, qr_codes):
             pts = pts.reshape((-1, 1, 2))
             
             # Draw the bounding polygon
-            cv2.polylines(frame, [pts], True, (0, 255, 0), 3)
+            cv2.polylines(frame, [pts], True, color, 3)
         else:
             # Fallback to rectangle if polygon is not available
             x, y, w, h = qr_code.rect
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 3)
-        
-        # Decode the QR code data
-        qr_data = qr_code.data.decode('utf-8')
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 3)
         
         # Position for text (top-left of bounding box)
         x, y, w, h = qr_code.rect
@@ -295,7 +487,7 @@ def draw_qr_overlay(frame, qr_codes):
         preview_text = qr_data[:30] + "..." if len(qr_data) > 30 else qr_data
         text_size = cv2.getTextSize(preview_text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
         cv2.rectangle(frame, (x, text_y - text_size[1] - 10), 
-                     (x + text_size[0] + 10, text_y + 5), (0, 255, 0), -1)
+                     (x + text_size[0] + 10, text_y + 5), color, -1)
         
         # Draw the QR code data preview as text
         cv2.putText(frame, preview_text, (x + 5, text_y), 
@@ -304,175 +496,453 @@ def draw_qr_overlay(frame, qr_codes):
 def list_cameras():
     """List available cameras"""
     print("🔍 Scanning for available cameras...")
-    available_cameras = []
-    
-    # Test camera indices 0-9
-    for i in range(10):
-        cap = cv2.VideoCapture(i)
-        if cap.isOpened():
-            # Try to read a frame to confirm camera works
-            ret, frame = cap.read()
-            if ret:
-                # Get camera properties
-                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                fps = int(cap.get(cv2.CAP_PROP_FPS))
-                
-                available_cameras.append({
-                    'index': i,
-                    'width': width,
-                    'height': height,
-                    'fps': fps
-                })
-                print(f"📷 Camera {i}: {width}x{height} @ {fps}fps")
-        cap.release()
+    discovery = CameraDiscovery(CAMERA_CACHE_PATH, probe_timeout=CAMERA_PROBE_TIMEOUT)
+    available_cameras = discovery.discover()
+    
+    for cam in available_cameras:
+        name = f" ({cam['name']})" if cam.get('name') else ""
+        print(f"📷 Camera {cam['index']}: {cam['width']}x{cam['height']} @ {cam['fps']}fps{name}")
     
     return available_cameras
 
-def start_qr_scanning(camera_index=0):
-    """Start QR code scanning with live camera stream"""
-    global last_qr_data, last_detection_time
+def show_preview(frame, qr_codes, camera_index, frame_count, start_time, capture, height,
+                 window='Exit Gate QR Scanner'):
+    """Draw status text, show the preview window and handle key presses.
+    Returns False when the user asked to quit."""
+    # Add status text to frame
+    status_text = f"Exit Gate Controller | Camera {camera_index} | Frame: {frame_count}"
+    if is_gate_processing:
+        status_text += " | GATE ACTIVE - BLUE LED"
+    elif qr_codes:
+        status_text += f" | QR Codes: {len(qr_codes)} - RED LED"
+    else:
+        status_text += " | Scanning... - RED LED"
+    
+    # Calculate capture and decode FPS
+    if frame_count % 30 == 0:  # Update every 30 frames
+        elapsed = time.time() - start_time
+        decode_fps = frame_count / elapsed
+        status_text += f" | Cap FPS: {capture.fps():.1f} | Dec FPS: {decode_fps:.1f}"
+    
+    # Draw status text
+    cv2.putText(frame, status_text, (10, 30), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+    cv2.putText(frame, "Press 'q' to quit, 's' to save screenshot", 
+               (10, height - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    
+    # Add gate and LED status indicator
+    if is_gate_processing:
+        gate_status = "GATE: ACTIVE | LED: BLUE"
+        gate_color = (255, 255, 0)  # Cyan for blue LED indication
+    else:
+        gate_status = "GATE: READY | LED: RED"
+        gate_color = (0, 0, 255)  # Red for red LED indication
+        
+    cv2.putText(frame, gate_status, (10, 60), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, gate_color, 2)
+    
+    # Display the frame
+    cv2.imshow(window, frame)
+    
+    # Check for key presses
+    key = cv2.waitKey(1) & 0xFF
+    if key == ord('q'):
+        return False
+    elif key == ord('s'):
+        # Save screenshot
+        timestamp = time.strftime('%Y%m%d_%H%M%S')
+        filename = f"gate_screenshot_{timestamp}.jpg"
+        cv2.imwrite(filename, frame)
+        print(f"📸 Screenshot saved: {filename}")
+    
+    return True
+
+def start_payment_sync():
+    """Start the local store; the payment_qrcodes mirror that feeds it is started
+    by the startup step (see warm_payment_mirror)"""
+    global local_store
+    
+    if USE_LOCAL_STORE:
+        local_store = LocalStore(LOCAL_STORE_PATH, replay_interval=JOURNAL_REPLAY_INTERVAL)
+        local_store.save('payment_qrcodes', {}, replace=True)     # rows kept under the old collection key
+        local_store.start()
+
+def warm_payment_mirror():
+    """Startup step: start the payment_qrcodes mirror and wait for its first snapshot"""
+    global payment_mirror
+    
+    if payment_mirror is None:
+        mirror = RTDBMirror(f"payment_qrcodes/{ASSIGNED_PARKING_ID}",
+                            max_age=PAYMENT_MIRROR_MAX_AGE,
+                            resync_interval=PAYMENT_MIRROR_RESYNC)
+        mirror.read_stage = firebase_get_time
+        if local_store is not None:
+            local_store.attach(f"payment_qrcodes/{ASSIGNED_PARKING_ID}", mirror)
+        # Published before start(), which can block with the uplink down: until
+        # the mirror syncs, passes are checked against the local store
+        payment_mirror = mirror
+        mirror.start()
+    return payment_mirror.wait_ready(STARTUP_RETRY_INTERVAL)
+
+def warm_firebase():
+    """Read a node that doesn't exist: pays for the TLS handshake and the OAuth
+    token without downloading anything"""
+    db.reference(f"payment_qrcodes/{ASSIGNED_PARKING_ID}/_warmup").get()
+
+def local_store_open():
+    return not USE_LOCAL_STORE or local_store is not None
+
+def camera_opened():
+    """Called once a camera delivers frames; completes the camera startup step"""
+    if startup is not None:
+        startup.done('camera')
+
+def gate_ready_now():
+    return startup is None or startup.ready
+
+def idle_state():
+    """LED state while the gate is closed: STARTING until ready, DEGRADED until warm"""
+    if not gate_ready_now():
+        return STARTING
+    if startup is not None and not startup.warm:
+        return DEGRADED
+    return STANDBY
+
+def show_idle_state():
+    # A gate still cycling returns to the idle state itself when it closes
+    with gate_access_lock:
+        if not is_gate_processing:
+            indicator.set_state(idle_state())
+
+def gate_ready():
+    show_idle_state()
+    if startup.warm:
+        print("🔴 Gate ready")
+    else:
+        print("🟠 Gate ready (degraded) - Firebase not warm yet, passes checked locally")
+
+def gate_warm():
+    if gate_ready_now():
+        show_idle_state()
+        print("🔴 Firebase and payment mirror are warm")
+
+def start_startup():
+    """Bring the local store and camera up, both LEDs on until they're ready, with
+    Firebase and the payment mirror warming up concurrently"""
+    global startup
+    
+    startup = WarmStartup(retry_interval=STARTUP_RETRY_INTERVAL,
+                          keepalive_interval=FIREBASE_KEEPALIVE_INTERVAL,
+                          name='exit-startup')
+    startup.step('store', local_store_open)
+    startup.step('camera')      # completed by camera_opened()
+    startup.step('firebase', warm_firebase, required=False)
+    if USE_PAYMENT_MIRROR:
+        startup.step('mirror', warm_payment_mirror, required=False)
+    startup.keepalive('firebase', warm_firebase)
+    startup.on_ready = gate_ready
+    startup.on_warm = gate_warm
+    indicator.set_state(STARTING)
+    startup.start()
+
+def stop_startup():
+    if startup is not None:
+        startup.stop()
+
+def stop_payment_sync():
+    global payment_mirror, local_store
+    
+    if payment_mirror is not None:
+        payment_mirror.stop()
+        payment_mirror = None
+    if local_store is not None:
+        local_store.stop()
+        local_store = None
+
+def start_admission():
+    global admission
+    
+    admission = AdmissionQueue(validate=lambda scan: validate_exit_payment(*scan),
+                               admit=admit_vehicle,
+                               recheck=payment_still_valid,
+                               on_admitted=record_exit_access,
+                               on_rejected=reject_pass,
+                               depth=ADMISSION_QUEUE_DEPTH,
+                               workers=ADMISSION_WORKERS,
+                               name='exit-admission')
+
+def stop_admission():
+    if admission is not None:
+        admission.stop()
+        print(f"🚦 Admission stats: {admission.stats()}")
+
+def start_gate_services():
+    """Start the metrics endpoint, LED controller, actuator timing thread,
+    payment sync, admission queue and the warm startup"""
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT, METRICS_HOST)
+    start_led_controller(STARTING)     # start_startup() below switches it to STANDBY or DEGRADED when ready
+    actuators.start()
+    start_payment_sync()
+    start_admission()
+    start_startup()
+
+def stop_gate_services():
+    stop_startup()
+    stop_admission()
+    stop_payment_sync()
+    actuators.stop()
+    stop_led_controller()
+    metrics.stop()
+
+def configure_camera(cap):
+    """Set camera properties for better performance; returns the actual (width, height, fps)"""
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    cap.set(cv2.CAP_PROP_FPS, 30)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Don't let stale frames queue up in the driver
+    return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            int(cap.get(cv2.CAP_PROP_FPS)))
+
+def start_qr_scanning(camera_index=0, headless=False):
+    """Start QR code scanning with live camera stream (no preview window when headless)"""
+    global qr_decoder
     
     print(f"🎥 Starting QR scanner with camera {camera_index}...")
     print(f"🏢 Monitoring parking: {ASSIGNED_PARKING_ID}")
     
-    # Start LED controller
-    start_led_controller()
+    # Start LED controller, actuator timing thread and metrics endpoint
+    start_gate_services()
     
     # Initialize camera
     cap = cv2.VideoCapture(camera_index)
     
     if not cap.isOpened():
         print(f"❌ Error: Could not open camera {camera_index}")
-        stop_led_controller()
+        stop_gate_services()
         return False
     
-    # Set camera properties for better performance
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    cap.set(cv2.CAP_PROP_FPS, 30)
-    
-    # Get actual camera properties
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    width, height, fps = configure_camera(cap)
+    camera_opened()
     
     print(f"✅ Camera initialized: {width}x{height} @ {fps}fps")
     print("🎯 Point camera at exit payment QR codes")
-    print("🔑 Press 'q' to quit, 's' to save screenshot")
-    print("🔴 Red LED: Standby | 🔵 Blue LED: Access Granted")
+    if headless:
+        print(f"🖥️  Headless mode - stats every {HEADLESS_STATS_INTERVAL}s, Ctrl+C to quit")
+    else:
+        print("🔑 Press 'q' to quit, 's' to save screenshot")
+    print("🔴 Red LED: Standby (flashing: Firebase not warm) | 🔵 Blue LED: Access Granted")
     print("-" * 60)
     
     frame_count = 0
     start_time = time.time()
+    last_stats_time = start_time
+    
+    # Capture runs on its own thread; the loop below always decodes the newest frame
+    capture = LatestFrameCapture(cap)
+    capture.start()
+    frame_seq = 0
+    
+    qr_decoder = QRDecoder(roi=QR_DECODE_ROI, downscale=QR_DECODE_DOWNSCALE,
+                           skip_static=QR_SKIP_STATIC_FRAMES,
+                           motion_threshold=QR_MOTION_THRESHOLD,
+                           static_refresh=QR_STATIC_REFRESH)
     
     try:
         while True:
-            # Read frame from camera
-            ret, frame = cap.read()
-            if not ret:
-                print("❌ Error: Could not read frame from camera")
-                break
+            # Wait for the most recent frame from the capture thread
+            frame_seq, frame = capture.read(frame_seq)
+            if frame is None:
+                if capture.failed:
+                    break
+                continue
             
             frame_count += 1
             
-            # Convert BGR to RGB for pyzbar
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Decode QR codes
-            qr_codes = pyzbar.decode(frame_rgb)
+            # Decode QR codes (grayscale, cropped, small pass first)
+            with qr_decode_time.time():
+                qr_codes = qr_decoder.decode(frame)
             
             # Process detected QR codes
             current_time = time.time()
             if qr_codes:
                 # Draw overlays
-                draw_qr_overlay(frame, qr_codes)
+                if not headless:
+                    draw_qr_overlay(frame, qr_codes)
                 
                 # Process QR code data
-                for qr_code in qr_codes:
-                    qr_data = qr_code.data.decode('utf-8')
-                    qr_type = qr_code.type
-                    
-                    # Only process if it's a new QR code or enough time has passed
-                    if (qr_data != last_qr_data or 
-                        current_time - last_detection_time > 5.0):
-                        
-                        print(f"\n🎯 QR Code Detected!")
-                        print(f"Type: {qr_type}")
-                        print(f"Data: {qr_data}")
-                        print(f"Time: {time.strftime('%H:%M:%S')}")
-                        print("-" * 50)
-                        
-                        # Process the QR code for gate control
-                        handle_qr_data(qr_data)
-            
-            # Add status text to frame
-            status_text = f"Exit Gate Controller | Camera {camera_index} | Frame: {frame_count}"
-            if is_gate_processing:
-                status_text += " | GATE ACTIVE - BLUE LED"
-            elif qr_codes:
-                status_text += f" | QR Codes: {len(qr_codes)} - RED LED"
-            else:
-                status_text += " | Scanning... - RED LED"
-            
-            # Calculate FPS
-            if frame_count % 30 == 0:  # Update every 30 frames
-                elapsed = time.time() - start_time
-                actual_fps = frame_count / elapsed
-                status_text += f" | FPS: {actual_fps:.1f}"
-            
-            # Draw status text
-            cv2.putText(frame, status_text, (10, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-            cv2.putText(frame, "Press 'q' to quit, 's' to save screenshot", 
-                       (10, height - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                process_qr_codes(qr_codes)
             
-            # Add gate and LED status indicator
-            if is_gate_processing:
-                gate_status = "GATE: ACTIVE | LED: BLUE"
-                gate_color = (255, 255, 0)  # Cyan for blue LED indication
-            else:
-                gate_status = "GATE: READY | LED: RED"
-                gate_color = (0, 0, 255)  # Red for red LED indication
-                
-            cv2.putText(frame, gate_status, (10, 60), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, gate_color, 2)
-            
-            # Display the frame
-            cv2.imshow('Exit Gate QR Scanner', frame)
-            
-            # Check for key presses
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
+            if headless:
+                # No window to draw; just report a stats line now and then
+                if current_time - last_stats_time >= HEADLESS_STATS_INTERVAL:
+                    last_stats_time = current_time
+                    elapsed = current_time - start_time
+                    gate_state = "ACTIVE" if is_gate_processing else "READY"
+                    print(f"📊 [{time.strftime('%H:%M:%S')}] Gate: {gate_state} | "
+                          f"Frames: {frame_count} | Cap FPS: {capture.fps():.1f} | "
+                          f"Dec FPS: {frame_count / elapsed:.1f}")
+            elif not show_preview(frame, qr_codes, camera_index, frame_count,
+                                  start_time, capture, height):
                 break
-            elif key == ord('s'):
-                # Save screenshot
-                timestamp = time.strftime('%Y%m%d_%H%M%S')
-                filename = f"gate_screenshot_{timestamp}.jpg"
-                cv2.imwrite(filename, frame)
-                print(f"📸 Screenshot saved: {filename}")
             
     except KeyboardInterrupt:
         print("\n⏹️  Stopping QR scanner...")
     
     finally:
         # Clean up
+        capture.stop()
         cap.release()
-        cv2.destroyAllWindows()
-        stop_led_controller()
+        if not headless:
+            cv2.destroyAllWindows()
+        stop_gate_services()
         
         # Print statistics
         elapsed = time.time() - start_time
         avg_fps = frame_count / elapsed if elapsed > 0 else 0
+        capture_fps = capture.frames_captured / elapsed if elapsed > 0 else 0
         print(f"\n📊 Session Statistics:")
-        print(f"   Frames processed: {frame_count}")
+        print(f"   Frames captured: {capture.frames_captured}")
+        print(f"   Frames decoded: {frame_count}")
         print(f"   Duration: {elapsed:.1f} seconds")
-        print(f"   Average FPS: {avg_fps:.1f}")
+        print(f"   Average capture FPS: {capture_fps:.1f}")
+        print(f"   Average decode FPS: {avg_fps:.1f}")
+        print(f"   Decoder: {qr_decoder.stats()}")
+        print("Thanks for using the Exit Gate Controller!")
+    
+    return True
+
+def process_qr_codes(qr_codes, camera_index=None):
+    """Hand newly seen QR codes to the gate logic (shared by every camera)"""
+    for qr_code in qr_codes:
+        qr_data = qr_code.data.decode('utf-8')
+        
+        # Only process if it's a new QR code or the repeat window has passed
+        # (each sighting restarts it), and its pass isn't still being validated
+        # or just admitted
+        code_key = payload_key(qr_data)
+        if not scan_cache.touch(code_key) and pass_tracker.state(code_key) not in (PENDING, ADMITTED):
+            
+            print(f"\n🎯 QR Code Detected!" +
+                  (f" (camera {camera_index})" if camera_index is not None else ""))
+            print(f"Type: {qr_code.type}")
+            print(f"Data: {qr_data if LOG_SCANS else code_key.hex()}")
+            print(f"Time: {time.strftime('%H:%M:%S')}")
+            print("-" * 50)
+            
+            # Process the QR code for gate control
+            handle_qr_data(qr_data)
+
+def start_multi_camera_scanning(camera_indices, headless=False):
+    """Scan several cameras at once. Each camera decodes in its own process;
+    detections from every camera go through the same debounce, admission queue and gate."""
+    global camera_workers
+    
+    print(f"🎥 Starting multi-camera QR scanner with cameras {camera_indices}...")
+    print(f"🏢 Monitoring parking: {ASSIGNED_PARKING_ID}")
+    
+    # Fork the decode processes before any of the controller's threads exist
+    decoder_options = {'roi': QR_DECODE_ROI, 'downscale': QR_DECODE_DOWNSCALE,
+                       'skip_static': QR_SKIP_STATIC_FRAMES,
+                       'motion_threshold': QR_MOTION_THRESHOLD,
+                       'static_refresh': QR_STATIC_REFRESH}
+    workers = [CameraWorker(index, decoder_options) for index in camera_indices]
+    for worker in workers:
+        worker.warm_up()
+    
+    camera_workers = []
+    for worker in workers:
+        cap = cv2.VideoCapture(worker.index)
+        if not cap.isOpened():
+            print(f"❌ Error: Could not open camera {worker.index}")
+            cap.release()
+            worker.stop()
+            continue
+        width, height, fps = configure_camera(cap)
+        print(f"✅ Camera {worker.index} initialized: {width}x{height} @ {fps}fps")
+        worker.start(cap)
+        camera_workers.append(worker)
+    
+    if not camera_workers:
+        print("❌ Error: None of the cameras could be opened")
+        return False
+    
+    start_gate_services()
+    camera_opened()
+    print("🎯 Point cameras at exit payment QR codes")
+    if headless:
+        print(f"🖥️  Headless mode - stats every {HEADLESS_STATS_INTERVAL}s, Ctrl+C to quit")
+    else:
+        print("🔑 Press 'q' to quit, 's' to save screenshot")
+    print("🔴 Red LED: Standby (flashing: Firebase not warm) | 🔵 Blue LED: Access Granted")
+    print("-" * 60)
+    
+    start_time = time.time()
+    last_stats_time = start_time
+    active = list(camera_workers)
+    
+    try:
+        while active:
+            decoded = False
+            for worker in list(active):
+                result = worker.poll()
+                if worker.failed:
+                    print(f"❌ Camera {worker.index} stopped - scanning with the remaining cameras")
+                    active.remove(worker)
+                    continue
+                if result is None:
+                    continue
+                
+                decoded = True
+                frame, qr_codes, seconds = result
+                qr_decode_time.observe(seconds)
+                if qr_codes:
+                    if not headless:
+                        draw_qr_overlay(frame, qr_codes)
+                    process_qr_codes(qr_codes, worker.index)
+                
+                if not headless and not show_preview(
+                        frame, qr_codes, worker.index, worker.frames_decoded, start_time,
+                        worker.capture, frame.shape[0],
+                        window=f"Exit Gate QR Scanner - Camera {worker.index}"):
+                    active = []
+                    break
+            
+            current_time = time.time()
+            if headless and current_time - last_stats_time >= HEADLESS_STATS_INTERVAL:
+                last_stats_time = current_time
+                elapsed = current_time - start_time
+                gate_state = "ACTIVE" if is_gate_processing else "READY"
+                cameras = " | ".join(
+                    f"Cam {w.index}: {w.capture.fps():.1f}/{w.frames_decoded / elapsed:.1f} FPS"
+                    for w in camera_workers)
+                print(f"📊 [{time.strftime('%H:%M:%S')}] Gate: {gate_state} | {cameras}")
+            
+            if not decoded:
+                # Every camera is waiting for a frame or a decode; don't spin
+                time.sleep(0.002)
+    
+    except KeyboardInterrupt:
+        print("\n⏹️  Stopping QR scanner...")
+    
+    finally:
+        for worker in camera_workers:
+            worker.stop()
+        if not headless:
+            cv2.destroyAllWindows()
+        stop_gate_services()
+        
+        elapsed = time.time() - start_time
+        print(f"\n📊 Session Statistics ({elapsed:.1f} seconds):")
+        for worker in camera_workers:
+            print(f"   Camera {worker.index}: {worker.capture.frames_captured} captured, "
+                  f"{worker.frames_decoded} decoded, decoder {worker.decoder_stats}")
         print("Thanks for using the Exit Gate Controller!")
     
     return True
 
-def main():
+def main(headless=False):
     print("🚪 Exit Gate Controller with QR Scanner & LED Status")
     print("=" * 50)
     print(f"🏢 Assigned Parking ID: {ASSIGNED_PARKING_ID}")
@@ -489,8 +959,23 @@ def main():
             print("Make sure a camera is connected and try again.")
             return
         
-        # Select camera
-        if len(cameras) == 1:
+        # Scan several cameras at once when configured
+        if SCAN_CAMERAS:
+            found = [cam['index'] for cam in cameras]
+            indices = found if SCAN_CAMERAS == 'all' else [i for i in SCAN_CAMERAS if i in found]
+            missing = [] if SCAN_CAMERAS == 'all' else [i for i in SCAN_CAMERAS if i not in found]
+            if missing:
+                print(f"⚠️  Cameras not found: {missing}")
+            if len(indices) > 1:
+                start_multi_camera_scanning(indices, headless=headless)
+                return
+            if len(indices) == 1:
+                print(f"📷 Using camera {indices[0]}")
+                start_qr_scanning(indices[0], headless=headless)
+                return
+        
+        # Select camera (headless units have nobody to ask, so take the first one)
+        if len(cameras) == 1 or headless:
             camera_index = cameras[0]['index']
             print(f"📷 Using camera {camera_index}")
         else:
@@ -509,7 +994,7 @@ def main():
                     print("❌ Please enter a valid number!")
         
         # Start QR scanning
-        start_qr_scanning(camera_index)
+        start_qr_scanning(camera_index, headless=headless)
         
     except KeyboardInterrupt:
         print("\n⏹️  Shutting down exit gate controller...")
@@ -527,22 +1012,34 @@ def main():
 
 if __name__ == "__main__":
     # Handle command line arguments
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ['-h', '--help']:
+    args = sys.argv[1:]
+    headless = '--headless' in args
+    for arg in args:
+        if arg.startswith('--cameras='):
+            value = arg.split('=', 1)[1]
+            SCAN_CAMERAS = 'all' if value == 'all' else [int(i) for i in value.split(',') if i]
+    args = [arg for arg in args if arg != '--headless' and not arg.startswith('--cameras=')]
+    
+    if args:
+        if args[0] in ['-h', '--help']:
             print("Exit Gate Controller with QR Scanner & LED Status")
-            print("Usage: python3 gate_controller.py [camera_index]")
+            print("Usage: python3 gate_controller.py [camera_index] [--headless] [--cameras=0,2|all]")
             print("Example: python3 gate_controller.py 0")
+            print("         python3 gate_controller.py --headless")
+            print("         python3 gate_controller.py --cameras=0,2 --headless")
+            print("\n--headless: no preview window, overlays or key polling (field units)")
+            print("--cameras: scan several cameras at once, one decode process per camera")
             print("\nLED Status:")
             print("🔴 Red LED: Continuous operation (standby/ready)")
             print("🔵 Blue LED: Access granted (10 seconds)")
             sys.exit(0)
         else:
             try:
-                camera_index = int(sys.argv[1])
+                camera_index = int(args[0])
                 print(f"🎥 Using specified camera: {camera_index}")
-                start_qr_scanning(camera_index)
+                start_qr_scanning(camera_index, headless=headless)
             except ValueError:
                 print("❌ Invalid camera index!")
                 sys.exit(1)
     else:
-        main()
\ No newline at end of file
+        main(headless=headless)
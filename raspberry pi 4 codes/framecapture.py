@@ -0,0 +1,60 @@
+import threading
+import time
+
+
+class LatestFrameCapture:
+    """Reads a cv2.VideoCapture on its own thread and keeps only the most recent frame"""
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.frames_captured = 0
+        self.failed = False
+        self._frame = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._started_at = 0.0
+
+    def start(self):
+        self._running = True
+        self._started_at = time.time()
+        self._thread = threading.Thread(target=self._capture_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+
+    def read(self, last_seq=0, timeout=1.0):
+        """Wait for a frame newer than last_seq; returns (seq, frame), frame is None on timeout"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._seq != last_seq or self.failed or not self._running, timeout)
+            if self._seq == last_seq:
+                return last_seq, None
+            return self._seq, self._frame
+
+    def fps(self):
+        elapsed = time.time() - self._started_at
+        return self.frames_captured / elapsed if elapsed > 0 else 0.0
+
+    def _capture_loop(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            if not ret:
+                print("❌ Error: Could not read frame from camera")
+                with self._cond:
+                    self.failed = True
+                    self._cond.notify_all()
+                break
+
+            with self._cond:
+                self._frame = frame
+                self._seq += 1
+                self.frames_captured += 1
+                self._cond.notify_all()
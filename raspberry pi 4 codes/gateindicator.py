@@ -0,0 +1,103 @@
+import threading
+import time
+
+STANDBY = 'standby'   # red LED on
+ACCESS = 'access'     # blue LED on
+STARTING = 'starting' # both LEDs on, until the controller's dependencies are ready
+DEGRADED = 'degraded' # red LED flashing: ready, but Firebase isn't warm (passes checked locally)
+OFF = 'off'           # both LEDs off
+
+
+class GateIndicator:
+    """Red/blue LED state machine; pins are only written when the wanted level changes"""
+
+    def __init__(self, gpio, red_pin, blue_pin, blink_interval=0.5):
+        self.gpio = gpio
+        self.red_pin = red_pin
+        self.blue_pin = blue_pin
+        self.blink_interval = blink_interval
+        self.pin_writes = 0
+        self._state = STANDBY
+        self._blink_pin = None
+        self._blink_started = 0.0
+        self._blink_count = 0
+        self._levels = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self, state=STANDBY):
+        """Start the indicator thread showing state (STARTING while the controller
+        isn't ready yet, so the LEDs never briefly signal ready at boot)"""
+        with self._cond:
+            self._running = True
+            self._state = state
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the indicator thread and switch both LEDs off"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+
+    def set_state(self, state):
+        with self._cond:
+            if state != self._state:
+                self._state = state
+                self._cond.notify_all()
+
+    def blink(self, pin, count):
+        """Blink pin count times over the other LEDs; returns immediately"""
+        with self._cond:
+            self._blink_pin = pin
+            self._blink_count = int(count)
+            self._blink_started = time.monotonic()
+            self._cond.notify_all()
+
+    def _wanted_levels(self, now):
+        """Pin levels for the current state and blink phase, plus seconds until they next change"""
+        if not self._running:
+            return {self.red_pin: False, self.blue_pin: False}, None
+
+        if self._blink_pin is not None:
+            phase_time = now - self._blink_started
+            phase = int(phase_time / self.blink_interval)
+            if phase < 2 * self._blink_count:
+                levels = {self.red_pin: False, self.blue_pin: False}
+                levels[self._blink_pin] = phase % 2 == 0
+                return levels, (phase + 1) * self.blink_interval - phase_time
+            self._blink_pin = None
+
+        if self._state == OFF:
+            return {self.red_pin: False, self.blue_pin: False}, None
+        if self._state == STARTING:
+            return {self.red_pin: True, self.blue_pin: True}, None
+        if self._state == DEGRADED:
+            # Mostly on like STANDBY, off for one interval in every four
+            period = 4 * self.blink_interval
+            phase_time = now % period
+            on = phase_time < period - self.blink_interval
+            next_change = (period - self.blink_interval if on else period) - phase_time
+            return {self.red_pin: on, self.blue_pin: False}, next_change
+        access = self._state == ACCESS
+        return {self.red_pin: not access, self.blue_pin: access}, None
+
+    def _apply(self, levels):
+        for pin, on in levels.items():
+            if self._levels.get(pin) != on:
+                self.gpio.output(pin, self.gpio.HIGH if on else self.gpio.LOW)
+                self._levels[pin] = on
+                self.pin_writes += 1
+
+    def _run(self):
+        with self._cond:
+            while True:
+                levels, timeout = self._wanted_levels(time.monotonic())
+                self._apply(levels)
+                if not self._running:
+                    break
+                self._cond.wait(timeout)
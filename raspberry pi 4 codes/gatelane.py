@@ -0,0 +1,60 @@
+import threading
+import time
+from actuators import servo_move_steps
+from admission import AdmissionQueue
+
+
+class GateLane:
+    """Gate state machine for one lane of a multi-gate controller: the lane's
+    scans are validated in its own admission queue and admitted one gate cycle
+    at a time on its own servo, while the actuator thread is shared"""
+
+    def __init__(self, name, parking_id, topic, servo, actuators, validate, recheck,
+                 on_admitted=None, on_rejected=None, led_red_pin=None,
+                 hold_time=10, settle_time=1, depth=3, workers=2):
+        self.name = name
+        self.parking_id = parking_id
+        self.topic = topic              # MQTT topic (or topic filter) the lane's scanner publishes on
+        self.servo = servo
+        self.actuators = actuators
+        self.led_red_pin = led_red_pin
+        self.hold_time = hold_time      # seconds the gate stays open
+        self.settle_time = settle_time  # seconds the servo gets to reach its position
+        self.on_cycle = None            # callable(seconds) after each completed gate cycle
+        self.is_processing = False
+        self._started_at = 0.0
+        self._lock = threading.Lock()
+        self.admission = AdmissionQueue(validate=validate, admit=self._admit, recheck=recheck,
+                                        on_admitted=on_admitted, on_rejected=on_rejected,
+                                        depth=depth, workers=workers, name=f"{name}-admission")
+
+    def stop(self):
+        self.admission.stop()
+
+    def _admit(self, scan, record):
+        if self.is_processing:
+            return False
+        print(f"[{self.name}] Valid spot - initiating gate access sequence")
+        return self.start_gate_sequence()
+
+    def start_gate_sequence(self):
+        """Open, hold and close this lane's gate; False if it's already cycling"""
+        with self._lock:
+            if self.is_processing:
+                return False
+            self.is_processing = True
+            self._started_at = time.perf_counter()
+
+        print(f"[{self.name}] Opening gate for {self.hold_time} seconds...")
+        steps = (servo_move_steps(self.servo, 90, self.settle_time) +
+                 [(self.hold_time, lambda: print(f"[{self.name}] Closing gate..."))] +
+                 servo_move_steps(self.servo, 0, self.settle_time))
+        self.actuators.run_sequence(steps, on_done=self._sequence_done)
+        return True
+
+    def _sequence_done(self):
+        self.is_processing = False
+        print(f"[{self.name}] Gate access sequence completed - ready for new requests")
+        if self.on_cycle is not None:
+            self.on_cycle(time.perf_counter() - self._started_at)
+        self.admission.gate_free()
@@ -0,0 +1,167 @@
+import json
+import sqlite3
+import threading
+import time
+from firebase_admin import db
+
+
+class LocalStore:
+    """SQLite (WAL) copy of the records a controller validates against, plus an
+    append-only journal of access updates that is replayed to Firebase in batches"""
+
+    def __init__(self, path, replay_interval=5.0, replay_batch=500):
+        self.path = path
+        self.replay_interval = replay_interval  # seconds between journal replays
+        self.replay_batch = replay_batch        # journal rows sent per update()
+        self.replayed = 0
+        self.replay_errors = 0
+        self.reconciled = 0     # guarded entries dropped because the pass already had the update
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    collection TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    synced_at REAL NOT NULL,
+                    PRIMARY KEY (collection, key)
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT NOT NULL,
+                    sets TEXT NOT NULL,
+                    increments TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    unless_match TEXT
+                )""")
+            try:
+                # Journals created before guarded entries existed
+                self._conn.execute("ALTER TABLE journal ADD COLUMN unless_match TEXT")
+            except sqlite3.OperationalError:
+                pass
+
+    def start(self):
+        """Start the journal replay thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._replay_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop replaying, try one last replay and close the database"""
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        self.replay()
+        with self._lock:
+            self._conn.close()
+
+    def attach(self, collection, mirror):
+        """Persist every change the mirror sees and serve as its fallback while it's cold or stale"""
+        mirror.on_change = lambda changes, replace: self.save(collection, changes, replace)
+        mirror.fallback = lambda key: self.get(collection, key)
+
+    def save(self, collection, changes, replace=False):
+        """Upsert changed records (None deletes); replace drops everything else in the collection"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if replace:
+                    self._conn.execute("DELETE FROM records WHERE collection = ?", (collection,))
+                for key, value in changes.items():
+                    if value is None:
+                        self._conn.execute("DELETE FROM records WHERE collection = ? AND key = ?",
+                                           (collection, str(key)))
+                    else:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO records (collection, key, data, synced_at) "
+                            "VALUES (?, ?, ?, ?)",
+                            (collection, str(key), json.dumps(value), now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, collection, key):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM records WHERE collection = ? AND key = ?",
+                                     (collection, str(key))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def journal_access(self, path, sets=None, increments=None, unless=None):
+        """Append field sets and counter increments for path; replayed later in one batch.
+        unless=(field, value) drops the entry at replay if path/field already holds value."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO journal (path, sets, increments, created_at, unless_match) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (path.strip('/'), json.dumps(sets or {}), json.dumps(increments or {}), time.time(),
+                 json.dumps(list(unless)) if unless else None))
+
+    def journal_depth(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+    def replay(self):
+        """Send pending journal entries as one multi-path update(); returns entries replayed"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, path, sets, increments, unless_match FROM journal ORDER BY id LIMIT ?",
+                (self.replay_batch,)).fetchall()
+        if not rows:
+            return 0
+
+        # Guarded entries whose update already landed (e.g. a timed-out transaction) are dropped
+        landed = set()
+        try:
+            for row_id, path, _, _, unless_match in rows:
+                if unless_match:
+                    field, value = json.loads(unless_match)
+                    if db.reference(f"{path}/{field}").get() == value:
+                        landed.add(row_id)
+        except Exception as e:
+            self.replay_errors += 1
+            print(f"[STORE] Journal replay check failed: {e}")
+            return 0
+
+        # Later sets win, increments for the same counter add up
+        sets = {}
+        increments = {}
+        for row_id, path, row_sets, row_increments, _ in rows:
+            if row_id in landed:
+                continue
+            for field, value in json.loads(row_sets).items():
+                sets[f"{path}/{field}"] = value
+            for field, amount in json.loads(row_increments).items():
+                key = f"{path}/{field}"
+                increments[key] = increments.get(key, 0) + amount
+
+        updates = dict(sets)
+        for key, amount in increments.items():
+            updates[key] = db.Increment(amount)
+
+        try:
+            if updates:
+                db.reference('/').update(updates)
+        except Exception as e:
+            self.replay_errors += 1
+            print(f"[STORE] Journal replay of {len(rows)} entries failed: {e}")
+            return 0
+
+        with self._lock:
+            self._conn.execute("DELETE FROM journal WHERE id <= ?", (rows[-1][0],))
+        self.replayed += len(rows) - len(landed)
+        self.reconciled += len(landed)
+        return len(rows)
+
+    def _replay_loop(self):
+        while not self._stop.wait(self.replay_interval):
+            while self.replay() == self.replay_batch:
+                pass
@@ -0,0 +1,186 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CYCLE_BUCKETS = (1.0, 2.0, 3.0, 5.0, 8.0, 10.0, 12.0, 15.0, 20.0, 30.0, 60.0)
+
+
+def _labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class Counter:
+    """Monotonic count"""
+
+    def __init__(self, labels=()):
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name):
+        return [f"{name}{_labels(self.labels)} {_number(self.value)}"]
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, labels=()):
+        self.buckets = tuple(sorted(buckets))
+        self.labels = labels
+        self.count = 0
+        self.sum = 0.0
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    @contextmanager
+    def time(self):
+        """Observe how long the with-block took, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_labels(self.labels, ('le', _number(bound)))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(self.labels)} {_number(total)}")
+        lines.append(f"{name}_count{_labels(self.labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Counters, histograms and component stats for one script, served as
+    Prometheus text on a local HTTP endpoint"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._families = {}    # name -> (type, help, {labels: metric})
+        self._stats = []       # (name, help, source)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _metric(self, kind, name, help_text, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(f"{self.prefix}_{name}", (kind, help_text, {}))
+            if family[0] != kind:
+                raise ValueError(f"{name} is already registered as a {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory(key)
+        return metric
+
+    def counter(self, name, help_text, **labels):
+        return self._metric('counter', name, help_text, labels, lambda key: Counter(key))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, **labels):
+        return self._metric('histogram', name, help_text, labels,
+                            lambda key: Histogram(buckets, key))
+
+    def stage(self, stage, buckets=LATENCY_BUCKETS):
+        """Histogram for one processing stage of the stage_seconds family"""
+        return self.histogram('stage_seconds', 'Seconds spent per processing stage',
+                              buckets=buckets, stage=stage)
+
+    def register_stats(self, name, source, help_text=''):
+        """Export the numeric values of source() (a stats() dict, or None while
+        the component isn't running) as gauges named <prefix>_<name>_<key>"""
+        with self._lock:
+            self._stats.append((name, help_text, source))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            families = sorted((name, kind, help_text, list(metrics.values()))
+                              for name, (kind, help_text, metrics) in self._families.items())
+            stats = list(self._stats)
+
+        for name, kind, help_text, metrics in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                lines.extend(metric.render(name))
+
+        for name, help_text, source in stats:
+            try:
+                values = source()
+            except Exception as e:
+                print(f"[METRICS] Stats source {name} failed: {e}")
+                continue
+            for key, value in sorted((values or {}).items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                gauge = f"{self.prefix}_{name}_{key}"
+                if help_text:
+                    lines.append(f"# HELP {gauge} {help_text}")
+                lines.append(f"# TYPE {gauge} gauge")
+                lines.append(f"{gauge} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve render() at http://host:port/metrics from a background thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"[METRICS] Could not serve metrics on {host}:{port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        thread = threading.Thread(target=self._server.serve_forever, name=f"{self.prefix}-metrics")
+        thread.daemon = True
+        thread.start()
+        print(f"[METRICS] Serving http://{host}:{port}/metrics")
+        return True
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
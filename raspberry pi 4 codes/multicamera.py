@@ -0,0 +1,87 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from framecapture import LatestFrameCapture
+from qrdecoder import QRDecoder
+
+_decoder = None     # the QRDecoder of a decode worker process
+
+
+def _init_decoder(options):
+    global _decoder
+    cv2.setNumThreads(1)    # one core per camera; the pool provides the parallelism
+    _decoder = QRDecoder(**options)
+
+
+def _decode(frame):
+    return _decoder.decode(frame), _decoder.stats()
+
+
+class CameraWorker:
+    """One camera of a multi-camera scanner: a capture thread plus a single-process
+    decode pool, so each camera decodes on its own core and keeps its own
+    static-frame reference"""
+
+    def __init__(self, index, decoder_options):
+        self.index = index
+        self.cap = None
+        self.capture = None
+        self.frames_decoded = 0
+        self.decoder_stats = {}
+        self.broken = False
+        self._frame = None      # frame whose decode is in flight
+        self._future = None
+        self._submitted_at = 0.0
+        self._seq = 0
+        # fork, so the worker doesn't re-run the controller script's GPIO and Firebase setup
+        self._pool = ProcessPoolExecutor(max_workers=1,
+                                         mp_context=multiprocessing.get_context('fork'),
+                                         initializer=_init_decoder, initargs=(decoder_options,))
+
+    def warm_up(self):
+        """Fork the decode process now, before the controller starts its own threads"""
+        self._pool.submit(int).result()
+
+    def start(self, cap):
+        self.cap = cap
+        self.capture = LatestFrameCapture(cap)
+        self.capture.start()
+
+    @property
+    def failed(self):
+        return self.broken or (self.capture is not None and self.capture.failed)
+
+    def poll(self):
+        """Collect a finished decode and hand the newest frame to the decode process.
+        Returns (frame, qr_codes, seconds) for a finished decode, otherwise None."""
+        result = None
+        if self._future is not None and self._future.done():
+            try:
+                qr_codes, self.decoder_stats = self._future.result()
+                result = (self._frame, qr_codes, time.perf_counter() - self._submitted_at)
+                self.frames_decoded += 1
+            except Exception as e:
+                print(f"❌ Camera {self.index} decode error: {e}")
+                self.broken = True
+            self._future = None
+
+        if self._future is None and not self.broken:
+            seq, frame = self.capture.read(self._seq, timeout=0)
+            if frame is not None:
+                self._seq = seq
+                self._frame = frame
+                self._submitted_at = time.perf_counter()
+                try:
+                    self._future = self._pool.submit(_decode, frame)
+                except Exception as e:
+                    print(f"❌ Camera {self.index} decode worker failed: {e}")
+                    self.broken = True
+        return result
+
+    def stop(self):
+        if self.capture is not None:
+            self.capture.stop()
+        if self.cap is not None:
+            self.cap.release()
+        self._pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,170 @@
+import threading
+import time
+
+
+class OccupancyTracker:
+    """Per-parking and per-zone spot counts by status, kept up to date on every
+    status transition and published (only the aggregates that changed) from a
+    background thread"""
+
+    def __init__(self, publish, load=None, zone_of=None, publish_interval=1.0,
+                 seed_retry=5.0, seed_retry_max=300.0):
+        self.publish = publish                  # callable(parking_id, aggregate) for each changed parking
+        self.load = load                        # callable(parking_id) -> {spot_id: status}, seeds a new parking
+        self.zone_of = zone_of                  # callable(parking_id, spot_id) -> zone name or None
+        self.publish_interval = publish_interval  # seconds between publishes
+        self.seed_retry = seed_retry            # seconds before a failed load is retried, doubling
+        self.seed_retry_max = seed_retry_max    # longest wait between load retries
+        self.transitions = 0
+        self.publishes = 0
+        self.errors = 0
+        self.seed_errors = 0
+        self._spots = {}        # parking ID -> {spot ID: status}
+        self._counts = {}       # parking ID -> aggregate (see snapshot())
+        self._seeding = set()   # parkings whose spots have been (or are being) loaded
+        self._unseeded = {}     # parking ID -> (failed loads, monotonic time of the next attempt)
+        self._dirty = set()
+        self._published = {}    # parking ID -> last aggregate published
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._publish_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the publish thread and publish whatever changed since the last round"""
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        self.publish_changes()
+
+    def update(self, parking_id, spot_id, status):
+        """Apply one spot reading; returns True if it changed the parking's counts"""
+        spot_id = str(spot_id)
+        if parking_id not in self._seeding:
+            self._seed(parking_id)
+        with self._lock:
+            return self._apply(parking_id, spot_id, status)
+
+    def snapshot(self, parking_id):
+        """The parking's aggregate: {'total': n, <status>: n, ..., 'zones': {zone: {...}}}"""
+        with self._lock:
+            return self._copy(self._counts.get(parking_id))
+
+    def publish_changes(self):
+        """Publish the aggregates that changed since they were last published; returns how many.
+        A parking whose spots couldn't be loaded yet is held back: its counts are partial."""
+        with self._publish_lock:
+            with self._lock:
+                changed = {parking_id: self._copy(self._counts.get(parking_id))
+                           for parking_id in self._dirty if parking_id not in self._unseeded}
+                self._dirty.intersection_update(self._unseeded)
+
+            published = 0
+            for parking_id, aggregate in changed.items():
+                # A spot that flipped and flipped back leaves nothing to publish
+                if aggregate == self._published.get(parking_id):
+                    continue
+                try:
+                    self.publish(parking_id, aggregate)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[OCCUPANCY] Publish for {parking_id} failed: {e}")
+                    with self._lock:
+                        self._dirty.add(parking_id)
+                    continue
+                self._published[parking_id] = aggregate
+                published += 1
+            self.publishes += published
+            return published
+
+    def stats(self):
+        with self._lock:
+            return {
+                'parkings': len(self._counts),
+                'spots': sum(len(spots) for spots in self._spots.values()),
+                'transitions': self.transitions,
+                'publishes': self.publishes,
+                'errors': self.errors,
+                'seed_errors': self.seed_errors,
+                'unseeded': len(self._unseeded),
+                'dirty': len(self._dirty),
+            }
+
+    def _seed(self, parking_id):
+        """Count the spots already in the database the first time a parking is seen.
+        A failed load is retried with backoff, from the publish thread and on the
+        parking's next reading."""
+        with self._lock:
+            if parking_id in self._seeding:
+                return
+            failures, retry_at = self._unseeded.get(parking_id, (0, 0.0))
+            if time.monotonic() < retry_at:
+                return
+            self._seeding.add(parking_id)
+
+        spots = {}
+        if self.load is not None:
+            try:
+                spots = self.load(parking_id) or {}
+            except Exception as e:
+                delay = min(self.seed_retry * 2 ** failures, self.seed_retry_max)
+                print(f"[OCCUPANCY] Could not load spots for {parking_id}: {e} - retrying in {delay:.0f}s")
+                with self._lock:
+                    self.seed_errors += 1
+                    self._seeding.discard(parking_id)
+                    self._unseeded[parking_id] = (failures + 1, time.monotonic() + delay)
+                return
+        with self._lock:
+            self._unseeded.pop(parking_id, None)
+            known = self._spots.get(parking_id, {})
+            for spot_id, status in spots.items():
+                # Readings that arrived while loading are newer than the snapshot
+                if str(spot_id) not in known and status is not None:
+                    self._apply(parking_id, str(spot_id), status)
+
+    def _apply(self, parking_id, spot_id, status):
+        """Move one spot between status counters (must hold self._lock)"""
+        spots = self._spots.setdefault(parking_id, {})
+        old_status = spots.get(spot_id)
+        if old_status == status:
+            return False
+        spots[spot_id] = status
+
+        counts = self._counts.setdefault(parking_id, {'total': 0, 'zones': {}})
+        targets = [counts]
+        zone = self.zone_of(parking_id, spot_id) if self.zone_of is not None else None
+        if zone is not None:
+            targets.append(counts['zones'].setdefault(zone, {'total': 0}))
+        for target in targets:
+            if old_status is None:
+                target['total'] += 1
+            else:
+                target[old_status] -= 1
+            target[status] = target.get(status, 0) + 1
+
+        self.transitions += 1
+        self._dirty.add(parking_id)
+        return True
+
+    @staticmethod
+    def _copy(counts):
+        if counts is None:
+            return None
+        aggregate = {k: v for k, v in counts.items() if k != 'zones'}
+        if counts['zones']:
+            aggregate['zones'] = {zone: dict(zone_counts) for zone, zone_counts in counts['zones'].items()}
+        return aggregate
+
+    def _publish_loop(self):
+        while not self._stop.wait(self.publish_interval):
+            with self._lock:
+                unseeded = list(self._unseeded)
+            for parking_id in unseeded:
+                self._seed(parking_id)
+            self.publish_changes()
@@ -0,0 +1,120 @@
+import threading
+import time
+import uuid
+from firebase_admin import db
+
+CONSUME_TOKEN_FIELD = 'lastConsumeId'   # written by each PassConsumer transaction
+
+
+class PassRejected(Exception):
+    """Raised by a consume check to abort the transaction without writing; the
+    message is the rejection reason"""
+
+
+class ConsumedPass(dict):
+    """Pass record returned by consume_pass; its access is already recorded in Firebase"""
+
+
+def consume_pass(path, check, record):
+    """Validate a pass and record its use in one RTDB transaction, so two gates
+    can't both admit it and no separate update() follows the validation.
+
+    check(data) returns a rejection reason, or None when the pass is valid;
+    record(data) sets the access fields in place. Both may run again if another
+    writer changes the pass in between. Returns the recorded pass as a
+    ConsumedPass or raises PassRejected; any other exception (usually the
+    database being out of reach) leaves the outcome unknown."""
+    def update(data):
+        reason = check(data)
+        if reason:
+            raise PassRejected(reason)
+        record(data)
+        return data
+
+    return ConsumedPass(db.reference(path).transaction(update))
+
+
+class ConsumeUnavailable(Exception):
+    """The transaction didn't answer in time, or is being skipped after a timeout;
+    its outcome is unknown and the pass has to be validated locally"""
+
+
+class PassConsumer:
+    """consume_pass with a deadline. The SDK's transaction() waits out the full
+    HTTP timeout when the uplink is gone; here it is abandoned after timeout
+    seconds and further transactions are skipped for backoff seconds, so scans
+    drop to local validation straight away instead of stalling the workers.
+
+    Each transaction also writes a token to CONSUME_TOKEN_FIELD. An abandoned
+    transaction stops at its next attempt, but one already sent can still land;
+    abandoned_token() hands its token to whoever records the access instead, so
+    that record can be skipped when the transaction turns out to have landed."""
+
+    def __init__(self, timeout=2.0, backoff=30.0):
+        self.timeout = timeout      # seconds a transaction may take before it's abandoned
+        self.backoff = backoff      # seconds transactions are skipped after a timeout
+        self.consumed = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self._skip_until = 0.0
+        self._abandoned = {}    # path -> token of a timed-out transaction with unknown outcome
+        self._lock = threading.Lock()
+
+    def consume(self, path, check, record):
+        """Like consume_pass; raises ConsumeUnavailable on timeout or while backing off"""
+        if time.monotonic() < self._skip_until:
+            self.skipped += 1
+            raise ConsumeUnavailable("Transaction skipped after a recent Firebase timeout")
+
+        token = uuid.uuid4().hex
+        outcome = {}
+        done = threading.Event()
+        with self._lock:
+            self._abandoned.pop(path, None)
+
+        def checked(data):
+            if outcome.get('abandoned'):
+                # Timed out: don't let a retry write what the caller now records itself
+                return "Transaction abandoned after a timeout"
+            return check(data)
+
+        def recorded(data):
+            record(data)
+            data[CONSUME_TOKEN_FIELD] = token
+
+        def run():
+            try:
+                outcome['value'] = consume_pass(path, checked, recorded)
+            except Exception as e:
+                outcome['error'] = e
+            done.set()
+
+        # A daemon thread, so a transaction stuck on a dead uplink can't hold up shutdown
+        thread = threading.Thread(target=run, name='consume')
+        thread.daemon = True
+        thread.start()
+        if not done.wait(self.timeout):
+            outcome['abandoned'] = True
+            with self._lock:
+                self._abandoned[path] = token
+            self.timeouts += 1
+            self._skip_until = time.monotonic() + self.backoff
+            raise ConsumeUnavailable(f"No answer from Firebase within {self.timeout}s")
+        if 'error' in outcome:
+            raise outcome['error']
+        self.consumed += 1
+        return outcome['value']
+
+    def abandoned_token(self, path):
+        """Token of the timed-out transaction on path, if the last one timed out;
+        returned once. A record of the same access should be skipped if the pass
+        already carries it in CONSUME_TOKEN_FIELD."""
+        with self._lock:
+            return self._abandoned.pop(path, None)
+
+    def stats(self):
+        return {
+            'consumed': self.consumed,
+            'timeouts': self.timeouts,
+            'skipped': self.skipped,
+        }
@@ -0,0 +1,65 @@
+import threading
+import time
+
+PENDING = 'pending'
+ADMITTED = 'admitted'
+REFUSED = 'refused'
+
+
+class PassTracker:
+    """Follows each scanned code from submission to its validation outcome, so the
+    scanner can skip codes still being validated and show outcomes as they arrive
+    from the admission workers"""
+
+    def __init__(self, ttl=10.0, pending_timeout=30.0):
+        self.ttl = ttl                          # seconds an outcome is remembered
+        self.pending_timeout = pending_timeout  # seconds before a pass with no outcome is forgotten
+        self._codes = {}        # code key -> scan
+        self._states = {}       # scan -> (state, time of the last change)
+        self._lock = threading.Lock()
+
+    def submitted(self, code_key, scan):
+        """Mark the pass read from code_key as in flight; call before handing it to a worker"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._codes[code_key] = scan
+            self._states[scan] = (PENDING, now)
+
+    def forget(self, code_key):
+        """Drop a code whose pass was never handed to a worker; the pass stays
+        tracked while other codes for it are still in flight"""
+        with self._lock:
+            scan = self._codes.pop(code_key, None)
+            if scan is not None and scan not in self._codes.values():
+                self._states.pop(scan, None)
+
+    def resolved(self, scan, state):
+        """Record a pass's outcome (ADMITTED or REFUSED); safe to call from any thread"""
+        with self._lock:
+            if scan in self._states:
+                self._states[scan] = (state, time.monotonic())
+
+    def state(self, code_key):
+        """PENDING, ADMITTED, REFUSED or None for a code that isn't tracked"""
+        with self._lock:
+            scan = self._codes.get(code_key)
+            entry = self._states.get(scan) if scan is not None else None
+        if entry is None:
+            return None
+        state, changed_at = entry
+        limit = self.pending_timeout if state == PENDING else self.ttl
+        return state if time.monotonic() - changed_at < limit else None
+
+    def pending(self, code_key):
+        return self.state(code_key) == PENDING
+
+    def _expire(self, now):
+        """Drop passes past their ttl (must hold self._lock)"""
+        for scan, (state, changed_at) in list(self._states.items()):
+            limit = self.pending_timeout if state == PENDING else self.ttl
+            if now - changed_at >= limit:
+                del self._states[scan]
+        for code_key, scan in list(self._codes.items()):
+            if scan not in self._states:
+                del self._codes[code_key]
@@ -0,0 +1,142 @@
+# Typed decoding of the MQTT and QR payloads. Every message type exposes the same
+# attribute names (parking_id, spot_id, user_id) whatever its wire names are, and
+# spot IDs are always strings. With msgspec installed the types are Structs
+# validated while decoding; otherwise slotted classes filled from orjson or json.
+import json
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'msgspec' if msgspec is not None else 'orjson' if orjson is not None else 'json'
+
+# Field kinds
+TEXT = 'text'       # non-empty string
+SPOT = 'spot'       # non-negative integer or non-empty string, decoded to str
+NUMBER = 'number'   # int or float, decoded to float
+
+
+class PayloadError(ValueError):
+    """The payload is not valid JSON or doesn't match its message type"""
+
+
+def _message_type(name, fields, doc):
+    """Build a message type from (attribute, wire name, kind, required) fields;
+    required fields must come first"""
+    spot_attrs = tuple(attr for attr, _, kind, _ in fields if kind == SPOT)
+
+    if msgspec is not None:
+        from typing import Annotated, Optional, Union
+        text = Annotated[str, msgspec.Meta(min_length=1)]
+        kinds = {
+            TEXT: text,
+            SPOT: Union[Annotated[int, msgspec.Meta(ge=0)], text],
+            NUMBER: float,
+        }
+
+        def __post_init__(self):
+            for attr in spot_attrs:
+                value = getattr(self, attr)
+                if value is not None:
+                    setattr(self, attr, str(value))
+
+        struct_fields = [(attr, kinds[kind]) if required else (attr, Optional[kinds[kind]], None)
+                         for attr, _, kind, required in fields]
+        cls = msgspec.defstruct(name, struct_fields,
+                                rename={attr: wire for attr, wire, _, _ in fields},
+                                namespace={'__post_init__': __post_init__, '__doc__': doc})
+        cls._decoder = msgspec.json.Decoder(cls)
+        return cls
+
+    attrs = tuple(attr for attr, _, _, _ in fields)
+
+    def __init__(self, **values):
+        for attr in attrs:
+            setattr(self, attr, values.get(attr))
+
+    def __repr__(self):
+        return f"{name}({', '.join(f'{attr}={getattr(self, attr)!r}' for attr in attrs)})"
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(
+            getattr(self, attr) == getattr(other, attr) for attr in attrs)
+
+    return type(name, (), {'__slots__': attrs, '__init__': __init__, '__repr__': __repr__,
+                           '__eq__': __eq__, '__hash__': None, '__doc__': doc,
+                           '_fields': fields})
+
+
+def _field_value(wire, kind, value):
+    if kind == TEXT:
+        if isinstance(value, str) and value:
+            return value
+        raise PayloadError(f"Expected a non-empty string at `$.{wire}`")
+    if kind == SPOT:
+        if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+            return str(value)
+        if isinstance(value, str) and value:
+            return value
+        raise PayloadError(f"Expected a spot number or ID at `$.{wire}`")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    raise PayloadError(f"Expected a number at `$.{wire}`")
+
+
+def decode(message_type, data):
+    """Decode and validate a JSON payload (bytes or str) into message_type;
+    raises PayloadError for malformed data"""
+    if msgspec is not None:
+        try:
+            return message_type._decoder.decode(data)
+        except (msgspec.ValidationError, msgspec.DecodeError) as e:
+            raise PayloadError(str(e)) from None
+
+    try:
+        obj = orjson.loads(data) if orjson is not None else json.loads(data)
+    except ValueError as e:
+        raise PayloadError(f"Invalid JSON: {e}") from None
+    if not isinstance(obj, dict):
+        raise PayloadError(f"Expected `object`, got `{type(obj).__name__}`")
+
+    values = {}
+    for attr, wire, kind, required in message_type._fields:
+        value = obj.get(wire)
+        if value is None:
+            if required:
+                raise PayloadError(f"Object missing required field `{wire}`")
+            continue
+        values[attr] = _field_value(wire, kind, value)
+    return message_type(**values)
+
+
+EntryScan = _message_type('EntryScan', (
+    ('parking_id', 'parkingId', TEXT, True),
+    ('spot_id', 'spotNumber', SPOT, True),
+    ('user_id', 'userId', TEXT, True),
+), "Entry QR scan relayed by the ESP32 reader")
+
+ExitPass = _message_type('ExitPass', (
+    ('parking_id', 'parkingId', TEXT, True),
+    ('spot_id', 'spotId', SPOT, True),
+    ('user_id', 'userId', TEXT, True),
+    ('type', 'type', TEXT, True),
+), "Exit payment QR code read by the exit camera")
+
+SpotStatus = _message_type('SpotStatus', (
+    ('parking_id', 'parkingId', TEXT, True),
+    ('spot_id', 'spotId', SPOT, True),
+    ('status', 'status', TEXT, True),
+    ('distance', 'distance', NUMBER, False),
+), "Spot sensor reading")
+
+AccessRequest = _message_type('AccessRequest', (
+    ('parking_id', 'parking_id', TEXT, True),
+    ('spot_id', 'spot_id', SPOT, True),
+    ('qrcode_id', 'qrcode_id', TEXT, True),
+), "Spot access check")
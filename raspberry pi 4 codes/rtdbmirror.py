@@ -0,0 +1,194 @@
+import copy
+import threading
+import time
+from firebase_admin import db
+
+
+def _normalize(value):
+    """RTDB hands back lists for integer-like keys; mirror everything as dicts keyed by str"""
+    if isinstance(value, list):
+        return {str(i): _normalize(v) for i, v in enumerate(value) if v is not None}
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    return value
+
+
+class RTDBMirror:
+    """Live in-memory copy of one Realtime Database subtree, kept in sync by a change listener"""
+
+    def __init__(self, path, max_age=300.0, resync_interval=120.0):
+        self.path = path.strip('/')
+        self.max_age = max_age                  # seconds without a sync before the mirror is stale
+        self.resync_interval = resync_interval  # seconds between full snapshot refreshes
+        self.hits = 0
+        self.misses = 0
+        self.fallback_hits = 0
+        self.on_change = None   # callable(changes, replace): changed children after each event
+        self.fallback = None    # callable(key): value to serve while the mirror is cold or stale
+        self.read_stage = None  # metrics stage timing the direct reads (not the in-memory lookups)
+        self._data = {}
+        self._lock = threading.Lock()
+        self._ready = False
+        self._first_sync = threading.Event()
+        self._synced_at = 0.0
+        self._event_seq = 0
+        self._listener = None
+        self._stop = threading.Event()
+        self._resync_thread = None
+
+    def start(self):
+        """Subscribe to the subtree and start the periodic resync thread"""
+        self._stop.clear()
+        self._listen()
+        self._resync_thread = threading.Thread(target=self._resync_loop)
+        self._resync_thread.daemon = True
+        self._resync_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._listener is not None:
+            try:
+                self._listener.close()
+            except Exception as e:
+                print(f"[MIRROR] Error closing listener on {self.path}: {e}")
+            self._listener = None
+
+    def is_fresh(self):
+        """True once the initial snapshot arrived, while the listener is attached and
+        the mirror synced within max_age. Without a listener, changes since the last
+        resync would go unseen, so the mirror doesn't count as fresh."""
+        return (self._listener is not None and self._ready
+                and time.time() - self._synced_at <= self.max_age)
+
+    def wait_ready(self, timeout=None):
+        """Block until the initial snapshot has arrived; False on timeout"""
+        return self._first_sync.wait(timeout)
+
+    def get(self, key):
+        """Return the child at key. While the mirror is cold or stale the fallback is
+        tried first, then a direct read."""
+        key = str(key)
+        if self.is_fresh():
+            with self._lock:
+                value = self._data.get(key)
+            self.hits += 1
+            return dict(value) if isinstance(value, dict) else value
+
+        if self.fallback is not None:
+            value = self.fallback(key)
+            if value is not None:
+                self.fallback_hits += 1
+                return value
+
+        self.misses += 1
+        if self.read_stage is not None:
+            with self.read_stage.time():
+                return _normalize(db.reference(f"{self.path}/{key}").get())
+        return _normalize(db.reference(f"{self.path}/{key}").get())
+
+    def _on_event(self, event):
+        keys = [k for k in (event.path or '/').split('/') if k]
+        changed = set()
+        with self._lock:
+            if event.event_type == 'put':
+                self._apply(keys, event.data)
+                if not keys:
+                    self._ready = True
+                    self._first_sync.set()
+                else:
+                    changed.add(keys[0])
+            elif event.event_type == 'patch':
+                for child, value in (event.data or {}).items():
+                    child_keys = keys + [k for k in str(child).split('/') if k]
+                    self._apply(child_keys, value)
+                    if child_keys:
+                        changed.add(child_keys[0])
+            self._event_seq += 1
+            self._synced_at = time.time()
+
+            replace = event.event_type == 'put' and not keys
+            if self.on_change is not None:
+                if replace:
+                    changes = copy.deepcopy(self._data)
+                else:
+                    changes = {k: copy.deepcopy(self._data.get(k)) for k in changed}
+
+        if self.on_change is not None:
+            self._notify(changes, replace)
+
+    def _notify(self, changes, replace):
+        try:
+            self.on_change(changes, replace)
+        except Exception as e:
+            print(f"[MIRROR] Change handler error on {self.path}: {e}")
+
+    def _apply(self, keys, value):
+        """Apply a put at the path given by keys (must hold self._lock)"""
+        value = _normalize(value)
+        if not keys:
+            self._data = value if isinstance(value, dict) else {}
+            return
+
+        node = self._data
+        for key in keys[:-1]:
+            child = node.get(key)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = {}
+                node[key] = child
+            node = child
+
+        if value is None:
+            node.pop(keys[-1], None)
+        else:
+            node[keys[-1]] = value
+
+    def _listen(self):
+        try:
+            listener = db.reference(self.path).listen(self._on_event)
+        except Exception as e:
+            print(f"[MIRROR] Could not listen on {self.path}: {e}")
+            return False
+        if self._stop.is_set():
+            listener.close()
+            return False
+        self._listener = listener
+        print(f"[MIRROR] Listening on {self.path}")
+        return True
+
+    def _resync_loop(self):
+        while not self._stop.wait(self.resync_interval if self._ready and self._listener is not None else 5.0):
+            if self._listener is None:
+                # The listener's initial snapshot brings the mirror up to date
+                self._listen()
+            else:
+                self.resync()
+
+    def resync(self):
+        """Refresh the whole subtree with one read; skipped if listener events raced the read"""
+        with self._lock:
+            seq = self._event_seq
+        try:
+            snapshot = db.reference(self.path).get()
+        except Exception as e:
+            print(f"[MIRROR] Resync of {self.path} failed: {e}")
+            return False
+
+        replaced = False
+        with self._lock:
+            if self._event_seq == seq:
+                self._apply([], snapshot)
+                replaced = self.on_change is not None
+                changes = copy.deepcopy(self._data) if replaced else None
+            self._ready = True
+            self._first_sync.set()
+            self._synced_at = time.time()
+
+        if replaced:
+            self._notify(changes, True)
+        return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,105 @@
+import collections
+import statistics
+import threading
+import time
+
+OCCUPIED = 'occupied'
+AVAILABLE = 'available'
+
+
+class _SpotState:
+    __slots__ = ('samples', 'status', 'candidate', 'candidate_since', 'distance')
+
+    def __init__(self, window):
+        self.samples = collections.deque(maxlen=window)
+        self.status = None              # confirmed status
+        self.candidate = None           # status waiting out the dwell time
+        self.candidate_since = 0.0
+        self.distance = None            # distance last emitted
+
+
+class SpotFilter:
+    """Per-spot signal stage for ultrasonic readings: a rolling median of the
+    distance, occupancy thresholds with hysteresis, a minimum dwell time before a
+    status change is confirmed, and a distance deadband. Only confirmed status
+    changes and distance moves beyond the deadband are passed on."""
+
+    def __init__(self, window=5, occupied_below=80.0, available_above=120.0,
+                 dwell=2.0, deadband=10.0):
+        self.window = window                    # readings in the rolling median
+        self.occupied_below = occupied_below    # median distance at or below which a spot is occupied
+        self.available_above = available_above  # median distance at or above which it is available
+        self.dwell = dwell                      # seconds a new status must persist before it is confirmed
+        self.deadband = deadband                # distance change that is worth a write on its own
+        self.readings = 0
+        self.emitted = 0
+        self.status_changes = 0
+        self.flaps_suppressed = 0
+        self._spots = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, status, distance, now=None):
+        """Feed one reading for spot key. Returns (status, distance) to write, or
+        None when the reading is noise. Statuses other than occupied/available
+        (e.g. reserved) and readings without a distance pass straight through."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.readings += 1
+            state = self._spots.get(key)
+            if status not in (OCCUPIED, AVAILABLE) or distance is None:
+                if state is not None:
+                    state.status = status
+                    state.candidate = None
+                self.emitted += 1
+                return status, distance
+
+            if state is None:
+                state = self._spots[key] = _SpotState(self.window)
+            state.samples.append(distance)
+            median = statistics.median(state.samples)
+
+            if median <= self.occupied_below:
+                wanted = OCCUPIED
+            elif median >= self.available_above:
+                wanted = AVAILABLE
+            elif state.status in (OCCUPIED, AVAILABLE):
+                wanted = state.status       # inside the hysteresis band: keep the current status
+            else:
+                wanted = status             # no history yet: trust the sensor
+
+            changed = False
+            if state.status not in (OCCUPIED, AVAILABLE):
+                # First reading (or back from another status): nothing to debounce against
+                state.status = wanted
+                changed = True
+            elif wanted != state.status:
+                if state.candidate != wanted:
+                    state.candidate = wanted
+                    state.candidate_since = now
+                if now - state.candidate_since >= self.dwell:
+                    state.status = wanted
+                    state.candidate = None
+                    changed = True
+            elif state.candidate is not None:
+                state.candidate = None
+                self.flaps_suppressed += 1
+
+            moved = state.distance is None or abs(median - state.distance) >= self.deadband
+            if not changed and not moved:
+                return None
+
+            if changed:
+                self.status_changes += 1
+            state.distance = median
+            self.emitted += 1
+            return state.status, round(median, 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'spots': len(self._spots),
+                'readings': self.readings,
+                'emitted': self.emitted,
+                'status_changes': self.status_changes,
+                'flaps_suppressed': self.flaps_suppressed,
+            }
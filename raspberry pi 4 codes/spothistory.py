@@ -0,0 +1,334 @@
+import array
+import collections
+import json
+import math
+import mmap
+import os
+import threading
+import time
+
+DAY = 86400
+STATUS_CODES = {'available': 1, 'occupied': 2, 'reserved': 3}     # 0 = no data, 255 = other
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+STATUS_OTHER = 255
+
+
+class _Ring:
+    """Fixed-size ring of raw readings for one spot, held in typed arrays"""
+    __slots__ = ('times', 'distances', 'statuses', 'head', 'size', 'unflushed')
+
+    def __init__(self, capacity):
+        self.times = array.array('d', bytes(8 * capacity))
+        self.distances = array.array('f', bytes(4 * capacity))
+        self.statuses = array.array('B', bytes(capacity))
+        self.head = 0           # next slot to write
+        self.size = 0           # readings held
+        self.unflushed = 0      # newest readings not yet written to a chunk
+
+    def append(self, timestamp, distance, status):
+        capacity = len(self.times)
+        self.times[self.head] = timestamp
+        self.distances[self.head] = distance
+        self.statuses[self.head] = status
+        self.head = (self.head + 1) % capacity
+        self.size = min(self.size + 1, capacity)
+        self.unflushed += 1
+
+    def newest(self, count):
+        """The newest count readings, oldest first, as (time, distance, status)"""
+        capacity = len(self.times)
+        count = min(count, self.size)
+        start = (self.head - count) % capacity
+        return [(self.times[i], self.distances[i], self.statuses[i])
+                for i in ((start + n) % capacity for n in range(count))]
+
+
+class _Chunk:
+    """One day of downsampled history: three memory-mapped column files (mean
+    distance, last status, reading count) laid out as spot-major slot arrays, so
+    a spot's day is one contiguous slice of each column"""
+
+    COLUMNS = (('distance', 'f'), ('status', 'B'), ('count', 'H'))
+
+    def __init__(self, directory, day, max_spots, slots):
+        self.day = day
+        self.slots = slots
+        self._maps = []
+        self.columns = {}
+        for name, typecode in self.COLUMNS:
+            path = os.path.join(directory, f"{day}.{name}")
+            size = max_spots * slots * array.array(typecode).itemsize
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)  # sparse on ext4, so unused spots cost no disk
+                mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            self._maps.append(mm)
+            self.columns[name] = memoryview(mm).cast(typecode)
+
+    def read(self, spot_index, first_slot, last_slot):
+        """Column slices for slots first_slot..last_slot (inclusive) of one spot"""
+        start = spot_index * self.slots + first_slot
+        end = spot_index * self.slots + last_slot + 1
+        return {name: column[start:end].tolist() for name, column in self.columns.items()}
+
+    def close(self):
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        for mm in self._maps:
+            mm.flush()
+            mm.close()
+        self._maps = []
+
+
+class SpotHistory:
+    """On-device history of spot readings. Raw readings go into per-spot ring
+    buffers in memory; a flush thread downsamples them into fixed time slots in
+    per-day columnar chunk files that are memory-mapped for range queries."""
+
+    MAPPED_CHUNKS = 4   # days kept memory-mapped at once
+
+    def __init__(self, directory, resolution=60, buffer_size=512, max_spots=512,
+                 flush_interval=60.0, retention_days=120):
+        if DAY % resolution:
+            raise ValueError(f"resolution must divide a day evenly, got {resolution}")
+        self.directory = directory
+        self.resolution = resolution        # seconds per stored slot
+        self.buffer_size = buffer_size      # raw readings kept in memory per spot
+        self.max_spots = max_spots          # spots a chunk has room for
+        self.flush_interval = flush_interval  # seconds between flushes to the chunks
+        self.retention_days = retention_days  # chunks older than this are deleted
+        self.slots = DAY // resolution
+        self.recorded = 0
+        self.overwritten = 0
+        self.flushes = 0
+        self.slots_written = 0
+        self._rings = {}
+        self._spot_index = {}
+        self._chunks = collections.OrderedDict()   # day -> _Chunk, least recently used first
+        self._lock = threading.Lock()
+        self._chunk_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+        self._load_spots()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread, flush what's buffered and unmap the chunks"""
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        self.flush()
+        with self._chunk_lock:
+            for chunk in self._chunks.values():
+                chunk.close()
+            self._chunks.clear()
+
+    def record(self, spot, status, distance, timestamp=None):
+        """Buffer one raw reading for spot (any hashable key, e.g. 'parking/spot')"""
+        timestamp = time.time() if timestamp is None else timestamp
+        code = STATUS_CODES.get(status, STATUS_OTHER)
+        distance = math.nan if distance is None else distance
+        with self._lock:
+            ring = self._rings.get(spot)
+            if ring is None:
+                ring = self._rings[spot] = _Ring(self.buffer_size)
+            if ring.unflushed >= self.buffer_size:
+                self.overwritten += 1
+            ring.append(timestamp, distance, code)
+            self.recorded += 1
+
+    def recent(self, spot, start=None, end=None):
+        """Raw readings still in memory for spot as (time, distance, status) tuples"""
+        with self._lock:
+            ring = self._rings.get(spot)
+            readings = ring.newest(ring.size) if ring is not None else []
+        return [(t, None if math.isnan(d) else round(d, 1), STATUS_NAMES.get(s))
+                for t, d, s in readings
+                if (start is None or t >= start) and (end is None or t <= end)]
+
+    def query(self, spot, start, end, step=None):
+        """Stored history of spot between start and end (epoch seconds) as
+        (slot start, mean distance, last status) tuples, one per slot with data.
+        step (a multiple of resolution) downsamples further."""
+        index = self._spot_index.get(spot)
+        if index is None or end < start:
+            return []
+        step = max(self.resolution, step or self.resolution)
+        group = step // self.resolution
+
+        rows = []
+        first_day, last_day = int(start // DAY), int(end // DAY)
+        for day in range(first_day, last_day + 1):
+            chunk = self._chunk(day, create=False)
+            if chunk is None:
+                continue
+            first_slot = int(start % DAY // self.resolution) if day == first_day else 0
+            last_slot = int(end % DAY // self.resolution) if day == last_day else self.slots - 1
+            with self._chunk_lock:
+                if not chunk.columns:
+                    continue
+                columns = chunk.read(index, first_slot, last_slot)
+            base = day * DAY
+            for offset, count in enumerate(columns['count']):
+                if count:
+                    slot = first_slot + offset
+                    rows.append((base + slot * self.resolution, columns['distance'][offset],
+                                 columns['status'][offset], count))
+
+        return [(t, None if math.isnan(d) else round(d, 1), STATUS_NAMES.get(s))
+                for t, d, s in self._downsample(rows, step if group > 1 else None)]
+
+    def flush(self):
+        """Downsample the buffered readings into their slots; returns slots written"""
+        with self._lock:
+            pending = {}
+            for spot, ring in self._rings.items():
+                if ring.unflushed:
+                    pending[spot] = ring.newest(ring.unflushed)
+                    ring.unflushed = 0
+        if not pending:
+            return 0
+
+        # (day, spot index, slot) -> [distance sum, distance count, last status, readings]
+        buckets = {}
+        for spot, readings in pending.items():
+            index = self._index_for(spot)
+            if index is None:
+                continue
+            for t, d, s in readings:
+                key = (int(t // DAY), index, int(t % DAY // self.resolution))
+                bucket = buckets.setdefault(key, [0.0, 0, 0, 0])
+                if not math.isnan(d):
+                    bucket[0] += d
+                    bucket[1] += 1
+                bucket[2] = s
+                bucket[3] += 1
+
+        written = 0
+        with self._chunk_lock:
+            for (day, index, slot), (total, measured, status, readings) in buckets.items():
+                chunk = self._chunk_locked(day, create=True)
+                position = index * self.slots + slot
+                distance = chunk.columns['distance']
+                count = chunk.columns['count']
+                old_count = count[position]
+                old_distance = distance[position] if old_count else math.nan
+                # A slot can be flushed in several parts; keep a running mean
+                if measured:
+                    mean = total / measured
+                    if old_count and not math.isnan(old_distance):
+                        mean = (old_distance * old_count + total) / (old_count + measured)
+                    distance[position] = mean
+                elif not old_count:
+                    distance[position] = math.nan
+                chunk.columns['status'][position] = status
+                count[position] = min(old_count + readings, 0xFFFF)
+                written += 1
+        self.flushes += 1
+        self.slots_written += written
+        return written
+
+    def prune(self, now=None):
+        """Delete chunks older than retention_days; returns the number of days removed"""
+        oldest = int((time.time() if now is None else now) // DAY) - self.retention_days
+        removed = set()
+        for name in os.listdir(self.directory):
+            day, _, column = name.partition('.')
+            if day.isdigit() and int(day) < oldest and column in dict(_Chunk.COLUMNS):
+                with self._chunk_lock:
+                    chunk = self._chunks.pop(int(day), None)
+                    if chunk is not None:
+                        chunk.close()
+                os.remove(os.path.join(self.directory, name))
+                removed.add(day)
+        return len(removed)
+
+    def stats(self):
+        with self._lock:
+            buffered = sum(ring.unflushed for ring in self._rings.values())
+        return {
+            'spots': len(self._spot_index),
+            'recorded': self.recorded,
+            'buffered': buffered,
+            'overwritten': self.overwritten,
+            'flushes': self.flushes,
+            'slots_written': self.slots_written,
+        }
+
+    @staticmethod
+    def _downsample(rows, step):
+        """Merge rows into step-second groups: count-weighted mean distance, last status"""
+        if step is None:
+            return [(t, d, s) for t, d, s, _ in rows]
+        grouped = []
+        for t, d, s, count in rows:
+            start = t - t % step
+            if not grouped or grouped[-1][0] != start:
+                grouped.append([start, 0.0, 0, s])
+            group = grouped[-1]
+            if not math.isnan(d):
+                group[1] += d * count
+                group[2] += count
+            group[3] = s
+        return [(start, total / weight if weight else math.nan, s)
+                for start, total, weight, s in grouped]
+
+    def _index_for(self, spot):
+        index = self._spot_index.get(spot)
+        if index is None:
+            if len(self._spot_index) >= self.max_spots:
+                print(f"[HISTORY] No room for spot {spot} ({self.max_spots} spots max)")
+                return None
+            index = self._spot_index[spot] = len(self._spot_index)
+            self._save_spots()
+        return index
+
+    def _chunk(self, day, create):
+        with self._chunk_lock:
+            return self._chunk_locked(day, create)
+
+    def _chunk_locked(self, day, create):
+        chunk = self._chunks.get(day)
+        if chunk is None:
+            if not create and not os.path.exists(os.path.join(self.directory, f"{day}.count")):
+                return None
+            chunk = self._chunks[day] = _Chunk(self.directory, day, self.max_spots, self.slots)
+            # Keep a few recently used days mapped; others are reopened on demand
+            while len(self._chunks) > self.MAPPED_CHUNKS:
+                self._chunks.popitem(last=False)[1].close()
+        self._chunks.move_to_end(day)
+        return chunk
+
+    def _load_spots(self):
+        try:
+            with open(os.path.join(self.directory, 'spots.json')) as f:
+                self._spot_index = {spot: int(index) for spot, index in json.load(f).items()}
+        except (OSError, ValueError):
+            self._spot_index = {}
+
+    def _save_spots(self):
+        path = os.path.join(self.directory, 'spots.json')
+        try:
+            with open(f"{path}.tmp", 'w') as f:
+                json.dump(self._spot_index, f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            print(f"[HISTORY] Could not save spot index: {e}")
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                self.prune()
+            except Exception as e:
+                print(f"[HISTORY] Flush failed: {e}")
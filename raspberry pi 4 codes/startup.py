@@ -0,0 +1,152 @@
+import threading
+import time
+
+
+class WarmStartup:
+    """Brings a controller's dependencies up concurrently: each step runs on its
+    own thread and is retried until it succeeds. The controller is ready once
+    every required step has, and warm once the optional ones (remote services it
+    can work without) have too; keep-alives then run periodically so connections
+    stay hot through quiet hours."""
+
+    def __init__(self, retry_interval=5.0, keepalive_interval=240.0, name='startup'):
+        self.retry_interval = retry_interval          # seconds between attempts of a failed step
+        self.keepalive_interval = keepalive_interval  # seconds between keep-alive rounds
+        self.name = name
+        self.on_ready = None        # callable() once every required step has succeeded
+        self.on_warm = None         # callable() once every step has succeeded
+        self.keepalives_run = 0
+        self.keepalive_errors = 0
+        self._steps = {}            # step name -> callable, or None when signalled with done()
+        self._optional = set()      # steps readiness doesn't wait for
+        self._keepalives = []
+        self._durations = {}        # step name -> seconds from start() to success
+        self._started_at = 0.0
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._warm = threading.Event()
+        self._stop = threading.Event()
+
+    def step(self, name, func=None, required=True):
+        """Add a startup step. func() succeeds unless it raises or returns False;
+        without func the step completes when done(name) is called. A step that
+        isn't required only holds up warm, not ready."""
+        self._steps[name] = func
+        if not required:
+            self._optional.add(name)
+
+    def keepalive(self, name, func):
+        """Run func every keepalive_interval once the controller is ready"""
+        self._keepalives.append((name, func))
+
+    def start(self):
+        self._stop.clear()
+        self._started_at = time.perf_counter()
+        for name, func in self._steps.items():
+            if func is not None:
+                thread = threading.Thread(target=self._run_step, args=(name, func),
+                                          name=f"{self.name}-{name}")
+                thread.daemon = True
+                thread.start()
+        thread = threading.Thread(target=self._keepalive_loop, name=f"{self.name}-keepalive")
+        thread.daemon = True
+        thread.start()
+        self._check_ready()
+
+    def stop(self):
+        self._stop.set()
+
+    def done(self, name):
+        """Mark a step as succeeded; safe to call from any thread, and again later"""
+        with self._lock:
+            if name in self._durations:
+                return
+            self._durations[name] = time.perf_counter() - self._started_at
+        print(f"[STARTUP] {name} ready after {self._durations[name]:.2f}s")
+        self._check_ready()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @property
+    def warm(self):
+        return self._warm.is_set()
+
+    def wait(self, timeout=None):
+        """Block until every required step has succeeded; False on timeout"""
+        return self._ready.wait(timeout)
+
+    def wait_warm(self, timeout=None):
+        """Block until every step has succeeded; False on timeout"""
+        return self._warm.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            durations = dict(self._durations)
+        required = [durations[name] for name in self._steps
+                    if name not in self._optional and name in durations]
+        return {
+            'ready': self.ready,
+            'warm': self.warm,
+            'steps_ready': len(durations),
+            'steps': len(self._steps),
+            'seconds_to_ready': max(required, default=0.0) if self.ready else None,
+            'seconds_to_warm': max(durations.values(), default=0.0) if self.warm else None,
+            'keepalives': self.keepalives_run,
+            'keepalive_errors': self.keepalive_errors,
+        }
+
+    def _run_step(self, name, func):
+        while not self._stop.is_set():
+            try:
+                if func() is not False:
+                    self.done(name)
+                    return
+                print(f"[STARTUP] {name} not ready yet - retrying in {self.retry_interval}s")
+            except Exception as e:
+                print(f"[STARTUP] {name} failed: {e} - retrying in {self.retry_interval}s")
+            self._stop.wait(self.retry_interval)
+
+    def _check_ready(self):
+        with self._lock:
+            pending = [name for name in self._steps if name not in self._durations]
+            now_ready = not self._ready.is_set() and not any(
+                name not in self._optional for name in pending)
+            now_warm = not self._warm.is_set() and not pending
+            if now_ready:
+                self._ready.set()
+            if now_warm:
+                self._warm.set()
+        elapsed = time.perf_counter() - self._started_at
+        if now_ready:
+            if pending:
+                print(f"[STARTUP] Ready after {elapsed:.2f}s - still warming: {', '.join(pending)}")
+            else:
+                print(f"[STARTUP] Ready after {elapsed:.2f}s")
+            self._callback(self.on_ready, 'Ready')
+        if now_warm:
+            if not now_ready:
+                print(f"[STARTUP] Warm after {elapsed:.2f}s")
+            self._callback(self.on_warm, 'Warm')
+
+    def _callback(self, func, label):
+        if func is not None:
+            try:
+                func()
+            except Exception as e:
+                print(f"[STARTUP] {label} callback error: {e}")
+
+    def _keepalive_loop(self):
+        # Wait for readiness without missing a stop()
+        while not self._ready.wait(0.5):
+            if self._stop.is_set():
+                return
+        while not self._stop.wait(self.keepalive_interval):
+            for name, func in self._keepalives:
+                try:
+                    func()
+                    self.keepalives_run += 1
+                except Exception as e:
+                    self.keepalive_errors += 1
+                    print(f"[STARTUP] Keep-alive {name} failed: {e}")
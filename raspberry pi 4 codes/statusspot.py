@@ -1,67 +1,227 @@
+import collections
+import json
+import threading
 import paho.mqtt.client as mqtt
 import firebase_admin
 from firebase_admin import credentials, db
-import json
+from writecoalescer import WriteCoalescer
+from dispatcher import KeyedDispatcher
+from rtdbmirror import RTDBMirror
+from occupancy import OccupancyTracker
+from spotfilter import SpotFilter
+from spothistory import SpotHistory
+from metrics import MetricsRegistry
+from payloads import SpotStatus, AccessRequest, PayloadError, decode
 
 # MQTT Configuration
 broker = '192.168.137.86'
 port = 8000
 status_topic = "Your status topic here"  # Replace with your actual status topic
 access_topic = "Your access topic here"  # Replace with your actual access topic
+LOG_MESSAGES = False    # print every decoded message (noisy at fleet message rates)
 
 # Firebase Configuration
 firebase_credentials_path = 'Your Firebase Admin SDK JSON file path here'  # Replace with your actual path
 database_url = 'Your Firebase Realtime Database URL here'  # Replace with your actual database URL
 
+# Spot status writes are coalesced per spot and flushed as one multi-path update
+USE_WRITE_COALESCER = True
+COALESCE_INTERVAL = 0.5     # seconds between flushes
+COALESCE_MAX_BATCH = 500    # pending spots that force an early flush
+spot_writer = None
+
+# Sensor readings pass a per-spot filter: rolling median distance, occupancy
+# thresholds with hysteresis and a dwell time. Only confirmed status changes and
+# distance moves beyond the deadband are written.
+USE_SPOT_FILTER = True
+FILTER_WINDOW = 5               # readings in the rolling median
+FILTER_OCCUPIED_BELOW = 80.0    # cm; median at or below this means occupied
+FILTER_AVAILABLE_ABOVE = 120.0  # cm; median at or above this means available
+FILTER_DWELL = 2.0              # seconds a new status must persist
+FILTER_DEADBAND = 10.0          # cm of distance change worth a write
+spot_filter = None
+
+# On-device history of the raw readings: per-spot ring buffers in memory,
+# downsampled every HISTORY_FLUSH_INTERVAL into per-day memory-mapped column
+# files. Query with spot_history.query('parking/spot', start, end, step).
+USE_SPOT_HISTORY = True
+HISTORY_DIR = 'spot_history'
+HISTORY_RESOLUTION = 60         # seconds per stored slot
+HISTORY_FLUSH_INTERVAL = 60     # seconds between flushes to disk
+HISTORY_MAX_SPOTS = 512         # spots the day files have room for
+HISTORY_RETENTION_DAYS = 120    # days kept on disk
+spot_history = None
+
+# Per-parking (and per-zone) spot counts by status, updated on every status
+# transition. Aggregates that changed are published every OCCUPANCY_INTERVAL to
+# occupancy/{parking} in Firebase and as a retained message on OCCUPANCY_TOPIC,
+# so displays read one small node instead of the whole spots subtree.
+USE_OCCUPANCY = True
+OCCUPANCY_INTERVAL = 1.0        # seconds between publishes of changed aggregates
+OCCUPANCY_TOPIC = "parking/{parking_id}/occupancy"
+OCCUPANCY_STATUSES = ('available', 'occupied', 'reserved')   # statuses counted (they become node keys)
+OCCUPANCY_ZONES = {}            # parking ID -> {spot ID: zone name}; spots not listed count only per parking
+occupancy = None
+mqtt_client = None
+
+# Access checks are answered from a live mirror of access_control/{parking}. A
+# parking is mirrored from startup if listed, otherwise from its first access
+# message, keeping the ACCESS_MIRROR_MAX_PARKINGS most recently used of those; a
+# mirror that hasn't synced within ACCESS_MIRROR_MAX_AGE falls back to direct reads.
+USE_ACCESS_MIRROR = True
+ACCESS_MIRROR_PARKINGS = []     # parking IDs to mirror from startup (never evicted)
+ACCESS_MIRROR_MAX_PARKINGS = 16  # mirrors started on demand at most; the least recently used is stopped
+ACCESS_MIRROR_MAX_AGE = 60      # seconds without a sync before falling back to direct reads
+ACCESS_MIRROR_RESYNC = 120      # seconds between full snapshot refreshes
+access_mirrors = collections.OrderedDict()   # parking ID -> RTDBMirror, least recently used first
+access_mirrors_lock = threading.Lock()
+
+# Dispatch stage between paho's network thread and the Firebase handlers
+DISPATCH_WORKERS = 4
+DISPATCH_QUEUE_SIZE = 1000
+DISPATCH_OVERFLOW = 'drop_oldest'   # 'block', 'drop_oldest' or 'drop_newest'
+dispatcher = None
+
+# Local metrics endpoint (Prometheus text) at http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9103     # 0 disables the endpoint
+metrics = MetricsRegistry('statusspot')
+json_decode_time = metrics.stage('json_decode')
+firebase_get_time = metrics.stage('firebase_get')
+firebase_update_time = metrics.stage('firebase_update')
+messages_received = metrics.counter('messages_total', 'MQTT messages received')
+messages_dropped = metrics.counter('drops_total', 'Messages dropped by the full dispatch queue')
+readings_filtered = metrics.counter('filtered_total', 'Sensor readings dropped as noise by the spot filter')
+messages_rejected = metrics.counter('rejects_total', 'Malformed payloads rejected before dispatch')
+message_errors = metrics.counter('errors_total', 'Messages that failed to apply')
+access_mirror_evictions = metrics.counter('access_mirror_evictions_total',
+                                          'On-demand access mirrors stopped to stay under the limit')
+metrics.register_stats('dispatcher', lambda: dispatcher.stats() if dispatcher else None,
+                       'Dispatch stage counters')
+metrics.register_stats('writer', lambda: spot_writer.stats() if spot_writer else None,
+                       'Spot write coalescer counters')
+metrics.register_stats('spot_filter', lambda: spot_filter.stats() if spot_filter else None,
+                       'Spot filter counters')
+metrics.register_stats('history', lambda: spot_history.stats() if spot_history else None,
+                       'Spot history counters')
+metrics.register_stats('occupancy', lambda: occupancy.stats() if occupancy else None,
+                       'Occupancy aggregate counters')
+metrics.register_stats('access_mirror', lambda: access_mirror_stats(), 'Access control mirror counters')
+
 # Initialize Firebase
 cred = credentials.Certificate(firebase_credentials_path)
 firebase_admin.initialize_app(cred, {
     'databaseURL': database_url
 })
 
-def handle_status_message(payload):
+def handle_status_message(message):
     try:
-        spot_id = payload.get('spotId')
-        status = payload.get('status')
-        distance = payload.get('distance')
-        parking_id = payload.get('parkingId')
-
-        if spot_id and status and parking_id:
-            ref_path = f"spots/{parking_id}/{spot_id}"
-            ref = db.reference(ref_path)
+        ref_path = f"spots/{message.parking_id}/{message.spot_id}"
+        status, distance = message.status, message.distance
+        if spot_history is not None:
+            spot_history.record(f"{message.parking_id}/{message.spot_id}", status, distance)
+        if spot_filter is not None:
+            filtered = spot_filter.update(ref_path, status, distance)
+            if filtered is None:
+                readings_filtered.inc()
+                return
+            status, distance = filtered
+        
+        if occupancy is not None and status in OCCUPANCY_STATUSES:
+            occupancy.update(message.parking_id, message.spot_id, status)
+        
+        if spot_writer is not None:
+            # Queued and skipped writes are counted in the writer stats
+            spot_writer.submit(ref_path, {'status': status, 'distance': distance})
+            return
+
+        ref = db.reference(ref_path)
+        with firebase_update_time.time():
             ref.update({
                 'status': status,
                 'distance': distance
             })
-            print(f"[STATUS] Updated Firebase at {ref_path}")
+        print(f"[STATUS] Updated Firebase at {ref_path}")
     except Exception as e:
+        message_errors.inc()
         print(f"[STATUS] Error: {e}")
 
-def handle_access_message(payload):
+def handle_access_message(message):
     try:
-        qrcode_id = payload.get('qrcode_id')
-        parking_id = payload.get('parking_id')
-        spot_id = payload.get('spot_id')
-
-        if qrcode_id and parking_id and spot_id:
-            ref_path = f"access_control/{parking_id}/{spot_id}"
-            ref = db.reference(ref_path)
-            data = ref.get()
-
-            if data:
-                stored_qr = data.get('qrcode_id')
-                is_granted = data.get('is_access_granted', False)
-
-                if stored_qr == qrcode_id and is_granted:
-                    print(f"[ACCESS] Access granted for QR ID {qrcode_id}")
-                    # Optionally, trigger GPIO or other hardware here
-                else:
-                    print(f"[ACCESS] Access denied for QR ID {qrcode_id}")
+        qrcode_id = message.qrcode_id
+        ref_path = f"access_control/{message.parking_id}/{message.spot_id}"
+        mirror = access_mirror(message.parking_id)
+        # The mirror times its own direct reads
+        if mirror is not None:
+            data = mirror.get(message.spot_id)
+        else:
+            with firebase_get_time.time():
+                data = db.reference(ref_path).get()
+
+        if data:
+            stored_qr = data.get('qrcode_id')
+            is_granted = data.get('is_access_granted', False)
+
+            if stored_qr == qrcode_id and is_granted:
+                print(f"[ACCESS] Access granted for QR ID {qrcode_id}")
+                # Optionally, trigger GPIO or other hardware here
             else:
-                print(f"[ACCESS] No access data found for {ref_path}")
+                print(f"[ACCESS] Access denied for QR ID {qrcode_id}")
+        else:
+            print(f"[ACCESS] No access data found for {ref_path}")
     except Exception as e:
+        message_errors.inc()
         print(f"[ACCESS] Error: {e}")
 
+def access_mirror(parking_id):
+    """The parking's access_control mirror, started on first use; None when disabled"""
+    if not USE_ACCESS_MIRROR:
+        return None
+    if not ACCESS_MIRROR_MAX_PARKINGS and parking_id not in ACCESS_MIRROR_PARKINGS:
+        return None
+    with access_mirrors_lock:
+        mirror = access_mirrors.get(parking_id)
+        if mirror is not None:
+            access_mirrors.move_to_end(parking_id)
+            return mirror
+
+    # Started outside the lock: listen() blocks until Firebase attaches, and
+    # access checks for other parkings shouldn't wait on it
+    mirror = RTDBMirror(f"access_control/{parking_id}",
+                        max_age=ACCESS_MIRROR_MAX_AGE,
+                        resync_interval=ACCESS_MIRROR_RESYNC)
+    mirror.read_stage = firebase_get_time
+    mirror.start()
+
+    unused = []
+    with access_mirrors_lock:
+        existing = access_mirrors.get(parking_id)
+        if existing is not None:
+            # Another worker started this parking's mirror meanwhile
+            unused.append(mirror)
+            mirror = existing
+        else:
+            access_mirrors[parking_id] = mirror
+            on_demand = [p for p in access_mirrors if p not in ACCESS_MIRROR_PARKINGS]
+            for evicted in on_demand[:max(0, len(on_demand) - ACCESS_MIRROR_MAX_PARKINGS)]:
+                unused.append(access_mirrors.pop(evicted))
+                access_mirror_evictions.inc()
+    for stale in unused:
+        stale.stop()
+    return mirror
+
+def access_mirror_stats():
+    with access_mirrors_lock:
+        mirrors = list(access_mirrors.values())
+    if not mirrors:
+        return None
+    return {
+        'parkings': len(mirrors),
+        'hits': sum(m.hits for m in mirrors),
+        'misses': sum(m.misses for m in mirrors),
+        'records': sum(len(m) for m in mirrors),
+    }
+
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
         print("Connected to MQTT Broker!")
@@ -70,24 +230,184 @@ def on_connect(client, userdata, flags, rc):
     else:
         print(f"Failed to connect, return code {rc}")
 
+def message_type_for(topic):
+    if topic == status_topic:
+        return SpotStatus
+    if topic == access_topic:
+        return AccessRequest
+    return None
+
+def dispatch_message(item):
+    topic, message = item
+    if topic == status_topic:
+        handle_status_message(message)
+    elif topic == access_topic:
+        handle_access_message(message)
+
+def dispatch_key(topic, message):
+    """Messages for the same spot share a key so they are applied in order"""
+    return f"{message.parking_id}/{message.spot_id}"
+
 def on_message(client, userdata, msg):
+    message_type = message_type_for(msg.topic)
+    if message_type is None:
+        return
+    
+    messages_received.inc()
     try:
-        payload = json.loads(msg.payload.decode())
-        print(f"\nReceived message on topic {msg.topic}: {payload}")
+        # Malformed payloads are rejected here, before any handler runs
+        with json_decode_time.time():
+            message = decode(message_type, msg.payload)
+    except PayloadError as e:
+        messages_rejected.inc()
+        print(f"[MQTT] Rejected payload on {msg.topic}: {e}")
+        return
+    
+    try:
+        if LOG_MESSAGES:
+            print(f"\nReceived message on topic {msg.topic}: {message}")
 
-        if msg.topic == status_topic:
-            handle_status_message(payload)
-        elif msg.topic == access_topic:
-            handle_access_message(payload)
+        if dispatcher is not None:
+            if not dispatcher.submit(dispatch_key(msg.topic, message), (msg.topic, message)):
+                messages_dropped.inc()
+                print(f"[MQTT] Dispatch queue full - dropped message on {msg.topic}")
+        else:
+            dispatch_message((msg.topic, message))
     except Exception as e:
+        message_errors.inc()
         print(f"[MQTT] Message error: {e}")
 
+def start_dispatcher():
+    global dispatcher
+    
+    if DISPATCH_WORKERS > 0:
+        dispatcher = KeyedDispatcher(dispatch_message, workers=DISPATCH_WORKERS,
+                                     maxsize=DISPATCH_QUEUE_SIZE,
+                                     overflow=DISPATCH_OVERFLOW, name='statusspot')
+        dispatcher.start()
+
+def stop_dispatcher():
+    if dispatcher is not None:
+        dispatcher.stop()
+        print(f"[MQTT] Dispatcher stats: {dispatcher.stats()}")
+
+def start_spot_writer():
+    global spot_writer
+    
+    if USE_WRITE_COALESCER:
+        spot_writer = WriteCoalescer(flush_interval=COALESCE_INTERVAL,
+                                     max_batch=COALESCE_MAX_BATCH)
+        spot_writer.on_flush = lambda nodes, seconds: firebase_update_time.observe(seconds)
+        spot_writer.start()
+
+def stop_spot_writer():
+    if spot_writer is not None:
+        spot_writer.stop()
+        print(f"[STATUS] Writer stats: {spot_writer.submitted} submitted, "
+              f"{spot_writer.skipped} unchanged, {spot_writer.flushes} flushes, "
+              f"{spot_writer.nodes_written} spot writes")
+
+def spot_zone(parking_id, spot_id):
+    return OCCUPANCY_ZONES.get(parking_id, {}).get(spot_id)
+
+def load_spot_statuses(parking_id):
+    """Current status of every spot in the parking, read once when the parking is first seen"""
+    with firebase_get_time.time():
+        spots = db.reference(f"spots/{parking_id}").get()
+    if isinstance(spots, list):
+        spots = {str(i): spot for i, spot in enumerate(spots)}
+    return {spot_id: spot.get('status') for spot_id, spot in (spots or {}).items()
+            if isinstance(spot, dict) and spot.get('status') in OCCUPANCY_STATUSES}
+
+def publish_occupancy(parking_id, aggregate):
+    if spot_writer is not None:
+        spot_writer.submit(f"occupancy/{parking_id}", aggregate)
+    else:
+        with firebase_update_time.time():
+            db.reference(f"occupancy/{parking_id}").update(aggregate)
+    if mqtt_client is not None:
+        mqtt_client.publish(OCCUPANCY_TOPIC.format(parking_id=parking_id),
+                            json.dumps(aggregate), qos=1, retain=True)
+    print(f"[OCCUPANCY] {parking_id}: {aggregate}")
+
+def start_spot_filter():
+    global spot_filter
+    
+    if USE_SPOT_FILTER:
+        spot_filter = SpotFilter(window=FILTER_WINDOW,
+                                 occupied_below=FILTER_OCCUPIED_BELOW,
+                                 available_above=FILTER_AVAILABLE_ABOVE,
+                                 dwell=FILTER_DWELL, deadband=FILTER_DEADBAND)
+
+def start_spot_history():
+    global spot_history
+    
+    if USE_SPOT_HISTORY:
+        spot_history = SpotHistory(HISTORY_DIR, resolution=HISTORY_RESOLUTION,
+                                   max_spots=HISTORY_MAX_SPOTS,
+                                   flush_interval=HISTORY_FLUSH_INTERVAL,
+                                   retention_days=HISTORY_RETENTION_DAYS)
+        spot_history.start()
+
+def stop_spot_history():
+    if spot_history is not None:
+        spot_history.stop()
+        print(f"[HISTORY] Stats: {spot_history.stats()}")
+
+def start_occupancy():
+    global occupancy
+    
+    if USE_OCCUPANCY:
+        occupancy = OccupancyTracker(publish_occupancy, load=load_spot_statuses,
+                                     zone_of=spot_zone, publish_interval=OCCUPANCY_INTERVAL)
+        occupancy.start()
+
+def stop_occupancy():
+    if occupancy is not None:
+        occupancy.stop()
+        print(f"[OCCUPANCY] Stats: {occupancy.stats()}")
+
+def start_access_mirrors():
+    for parking_id in ACCESS_MIRROR_PARKINGS:
+        access_mirror(parking_id)
+
+def stop_access_mirrors():
+    with access_mirrors_lock:
+        mirrors = list(access_mirrors.values())
+        access_mirrors.clear()
+    for mirror in mirrors:
+        mirror.stop()
+
+def start_metrics():
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT, METRICS_HOST)
+
 def main():
+    global mqtt_client
+    
     client = mqtt.Client()
+    mqtt_client = client
     client.on_connect = on_connect
     client.on_message = on_message
-    client.connect(broker, port, 60)
-    client.loop_forever()
+    start_metrics()
+    start_spot_writer()
+    start_spot_filter()
+    start_spot_history()
+    start_occupancy()
+    start_access_mirrors()
+    start_dispatcher()
+    try:
+        client.connect(broker, port, 60)
+        client.loop_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        stop_dispatcher()
+        stop_occupancy()
+        stop_spot_history()
+        stop_spot_writer()
+        stop_access_mirrors()
+        metrics.stop()
 
 if __name__ == "__main__":
     main()
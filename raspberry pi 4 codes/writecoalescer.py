@@ -0,0 +1,122 @@
+import threading
+import time
+from firebase_admin import db
+
+
+class WriteCoalescer:
+    """Keeps the latest fields per node and flushes them as one multi-path update()"""
+
+    def __init__(self, flush_interval=0.5, max_batch=500, root='/'):
+        self.flush_interval = flush_interval  # seconds between flushes
+        self.max_batch = max_batch            # pending nodes that trigger an early flush
+        self.root = root
+        self.submitted = 0
+        self.skipped = 0
+        self.flushes = 0
+        self.nodes_written = 0
+        self.errors = 0
+        self.on_flush = None    # callable(nodes, seconds) after each successful update()
+        self._pending = {}
+        self._written = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write whatever is still pending"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        self.flush()
+
+    def submit(self, path, fields):
+        """Queue fields for path; returns False when they match what is already written"""
+        path = path.strip('/')
+        fields = {k: v for k, v in fields.items() if v is not None}
+        if not fields:
+            return False
+
+        with self._lock:
+            self.submitted += 1
+            merged = dict(self._pending.get(path) or {})
+            merged.update(fields)
+
+            written = self._written.get(path)
+            if written is not None and all(written.get(k) == v for k, v in merged.items()):
+                self._pending.pop(path, None)
+                self.skipped += 1
+                return False
+
+            self._pending[path] = merged
+            if len(self._pending) >= self.max_batch:
+                self._wake.set()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write all pending nodes in one update(); returns the number of nodes written"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = {}
+                # Record the batch as written up front so repeats submitted while
+                # it is in flight are compared against the newest values
+                for path, fields in batch.items():
+                    self._written.setdefault(path, {}).update(fields)
+
+            if not batch:
+                return 0
+
+            updates = {}
+            for path, fields in batch.items():
+                for field, value in fields.items():
+                    updates[f"{path}/{field}"] = value
+
+            started = time.perf_counter()
+            try:
+                db.reference(self.root).update(updates)
+            except Exception as e:
+                self.errors += 1
+                print(f"[WRITER] Flush of {len(batch)} node(s) failed: {e}")
+                with self._lock:
+                    for path, fields in batch.items():
+                        self._written.pop(path, None)
+                        merged = dict(fields)
+                        merged.update(self._pending.get(path) or {})
+                        self._pending[path] = merged
+                return 0
+
+            self.flushes += 1
+            self.nodes_written += len(batch)
+            if self.on_flush is not None:
+                self.on_flush(len(batch), time.perf_counter() - started)
+            return len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'skipped': self.skipped,
+                'flushes': self.flushes,
+                'nodes_written': self.nodes_written,
+                'errors': self.errors,
+                'pending': len(self._pending),
+            }
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()